@@ -0,0 +1 @@
+# Load tests and benchmarks. Run from the `tier 2` directory, e.g. `python -m benchmarks.ingestion_under_llm_load`
@@ -0,0 +1,131 @@
+"""
+Load test: ingestion fairness with one noisy neighbour.
+
+One misbehaving node (farmer 1) floods POST /api/soil-data at --noisy-rate while --quiet
+well-behaved farmers each send one reading a second. The same open-loop traffic is replayed
+against the in-process ASGI app under three admission settings:
+
+    off              no admission control (the default deployment)
+    global only      INGEST_RATE_GLOBAL alone: the noisy node spends most of the shared budget
+    per-farmer       INGEST_RATE_PER_FARMER + INGEST_RATE_GLOBAL: the noisy node is shed at its
+                     own rate and the quiet farmers keep theirs
+
+and reports, per class of farmer, the status codes and latency. Fails if a quiet farmer's
+reading is turned away under the per-farmer setting more often than --min-quiet-success allows.
+
+    python -m benchmarks.admission_fairness [--duration 5] [--noisy-rate 400] [--quiet 50] [--global-rate 300] [--farmer-rate 5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+# Point the app at a throwaway SQLite database before main.py is imported
+_db_dir = tempfile.mkdtemp(prefix="agrisphere-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ["SOIL_DATA_MAINTENANCE_INTERVAL"] = "0"
+os.environ.pop("GEMINI_API_KEY", None)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.ingestion_under_llm_load import percentile  # noqa: E402
+from services.admission import AdmissionController, LocalBuckets  # noqa: E402
+
+NOISY_FARMER = 1
+_BASE_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def reading(farmer_id: int, n: int) -> dict:
+    # Distinct timestamps so no reading is dropped as a retry of another
+    return {
+        "farmer_id": farmer_id,
+        "moisture": 40.0 + n % 20,
+        "temp": 24.0,
+        "humidity": 60.0,
+        "ph": 6.5,
+        "timestamp": (_BASE_TIME + timedelta(milliseconds=n)).isoformat(),
+    }
+
+
+def schedule(args):
+    """(send offset in s, farmer_id) for every request of one run, in send order."""
+    sends = [(i / args.noisy_rate, NOISY_FARMER) for i in range(int(args.duration * args.noisy_rate))]
+    for q in range(args.quiet):
+        phase = q / args.quiet  # spread the quiet farmers over each second
+        sends += [(phase + second, 100 + q) for second in range(int(args.duration))]
+    return sorted(sends)
+
+
+async def run_traffic(client, sends, epoch: int):
+    results = {"noisy": [], "quiet": []}  # (status, latency ms)
+    t0 = time.perf_counter()
+
+    async def one(n, offset, farmer_id):
+        scheduled = t0 + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = await client.post("/api/soil-data", json=reading(farmer_id, epoch + n))
+        kind = "noisy" if farmer_id == NOISY_FARMER else "quiet"
+        results[kind].append((response.status_code, (time.perf_counter() - scheduled) * 1000))
+
+    await asyncio.gather(*(one(n, offset, farmer_id) for n, (offset, farmer_id) in enumerate(sends)))
+    return results
+
+
+def summarize(label, results):
+    for kind, samples in results.items():
+        codes = Counter(status for status, _ in samples)
+        latencies = [latency for _, latency in samples]
+        ok = sum(count for status, count in codes.items() if status < 300)
+        print(
+            f"{label:<12} {kind:<6} n={len(samples):<6} ok={ok / len(samples):6.1%}  "
+            f"codes={dict(sorted(codes.items()))!s:<26} p50={percentile(latencies, 50):7.2f} ms  p99={percentile(latencies, 99):7.2f} ms"
+        )
+
+
+async def main_async(args):
+    settings = {
+        "off": None,
+        "global only": LocalBuckets(0, 0, args.global_rate, args.global_rate),
+        "per-farmer": LocalBuckets(args.farmer_rate, args.farmer_rate * 2, args.global_rate, args.global_rate),
+    }
+    sends = schedule(args)
+    transport = httpx.ASGITransport(app=main.app)
+    outcome = {}
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for run, (label, buckets) in enumerate(settings.items()):
+                main.admission = AdmissionController(buckets, main.write_reading) if buckets is not None else None
+                results = await run_traffic(client, sends, run * len(sends))
+                summarize(label, results)
+                outcome[label] = results
+        main.admission = None
+
+    quiet = outcome["per-farmer"]["quiet"]
+    success = sum(1 for status, _ in quiet if status < 300) / len(quiet)
+    if success < args.min_quiet_success:
+        print(f"FAIL: quiet farmers got {success:.1%} of their readings in with per-farmer limits (min {args.min_quiet_success:.0%})")
+        return 1
+    print(f"OK: quiet farmers got {success:.1%} of their readings in with per-farmer limits")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of traffic per setting")
+    parser.add_argument("--noisy-rate", type=float, default=400.0, help="requests per second from the noisy node")
+    parser.add_argument("--quiet", type=int, default=50, help="well-behaved farmers, one reading per second each")
+    parser.add_argument("--global-rate", type=float, default=300.0, help="INGEST_RATE_GLOBAL (burst: one second's worth)")
+    parser.add_argument("--farmer-rate", type=float, default=5.0, help="INGEST_RATE_PER_FARMER (burst: two seconds' worth)")
+    parser.add_argument("--min-quiet-success", type=float, default=0.99, help="required share of quiet readings admitted")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async(parse_args())))
@@ -0,0 +1,196 @@
+"""
+Benchmark: JSON over HTTP vs MessagePack frames over UDP for node telemetry.
+
+1. Bytes per reading: the simulator's JSON body and full HTTP request/response vs a binary
+   frame (single, and --batch readings per frame), plus IPv4/TCP or IPv4/UDP headers.
+2. Server-side decode + SoilData validation cost per reading, in-process.
+3. Readings/sec into a real server: the app runs under Uvicorn in a subprocess (throwaway
+   SQLite, BINARY_INGEST_UDP_PORT set) and receives --readings readings as
+   - JSON, a new HTTP connection per reading (what the firmware's HTTPClient does)
+   - JSON over pooled keep-alive connections
+   - binary frames over UDP (--batch readings per datagram)
+
+    python -m benchmarks.binary_ingest [--readings 5000] [--concurrency 1] [--batch 1] [--udp-rate 20000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from services.telemetry_codec import decode_frame, encode_frame
+
+IPV4_TCP = 40
+IPV4_UDP = 28
+TCP_SETUP_TEARDOWN = 7  # SYN, SYN-ACK, ACK, then FIN/ACK both ways, header-only packets
+
+
+def reading(farmer_id: int) -> dict:
+    # Same shape and rounding as simulate_esp32.generate_telemetry()
+    temp = 25.0 + random.uniform(-2.0, 2.0)
+    return {
+        "farmer_id": farmer_id,
+        "moisture": round(50.0 + random.uniform(-10.0, 10.0), 2),
+        "temp": round(temp, 2),
+        "humidity": round(60.0 + random.uniform(-5.0, 5.0), 2),
+        "ph": round(6.5 + random.uniform(-0.5, 0.5), 2),
+        "nitrogen": round(100.0 + random.uniform(-20.0, 20.0), 2),
+        "phosphorus": round(50.0 + random.uniform(-10.0, 10.0), 2),
+        "potassium": round(80.0 + random.uniform(-15.0, 15.0), 2),
+        "rainfall": round(max(0.0, random.uniform(-5.0, 10.0)), 2),
+        "soil_temp": round(temp - random.uniform(2.0, 5.0), 2),
+        "soil_ec": round(random.uniform(1.2, 1.8), 2),
+        "air_pressure": round(random.uniform(1010.0, 1015.0), 2),
+        "light_intensity": float(round(random.uniform(40000.0, 60000.0), 0)),
+        "water_level": round(random.uniform(60.0, 95.0), 2),
+        "flow_rate": round(random.uniform(0.0, 2.5), 2),
+        "battery_voltage": round(random.uniform(3.8, 4.2), 2),
+        "timestamp": datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z"),
+    }
+
+
+def free_port(kind=socket.SOCK_STREAM) -> int:
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bytes_per_reading(batch: int):
+    import main
+
+    sample = reading(1)
+    body = json.dumps(sample).encode()
+    # What `requests.post(API_URL, json=payload)` puts on the wire
+    import requests
+    prepared = requests.Session().prepare_request(requests.Request("POST", "http://192.168.1.10:8000/api/soil-data", json=sample))
+    request_bytes = len(f"POST {prepared.path_url} HTTP/1.1\r\nHost: 192.168.1.10:8000\r\n".encode()) + sum(
+        len(f"{k}: {v}\r\n".encode()) for k, v in prepared.headers.items()) + 2 + len(prepared.body)
+    response_body = json.dumps({"status": "success", "message": "Soil data queued for Database"}).encode()
+    response_bytes = len(b"HTTP/1.1 201 Created\r\ndate: Mon, 01 Jan 2024 00:00:00 GMT\r\nserver: uvicorn\r\n"
+                         b"content-length: 62\r\ncontent-type: application/json\r\n\r\n") + len(response_body)
+    single = len(encode_frame([sample]))
+    batched = len(encode_frame([reading(1) for _ in range(batch)])) / batch
+
+    http_fresh = request_bytes + response_bytes + 2 * IPV4_TCP + TCP_SETUP_TEARDOWN * IPV4_TCP
+    print("Bytes per reading")
+    print(f"  JSON body                         {len(body):6d}")
+    print(f"  HTTP request + response           {request_bytes + response_bytes:6d}   (+ headers/handshake on a fresh connection: ~{http_fresh})")
+    print(f"  MessagePack frame                 {single:6d}   ({single + IPV4_UDP} as a UDP datagram)")
+    if batch > 1:
+        print(f"  MessagePack, {batch} per frame       {batched:8.1f}   ({batched + IPV4_UDP / batch:.1f} as UDP datagrams)")
+
+    # Decode + validate cost, server side
+    rows = [reading(i) for i in range(20000)]
+    json_bodies = [json.dumps(r).encode() for r in rows]
+    frames = [encode_frame([r]) for r in rows]
+    started = time.perf_counter()
+    for raw in json_bodies:
+        main.SoilData(**json.loads(raw))
+    json_us = (time.perf_counter() - started) / len(rows) * 1e6
+    started = time.perf_counter()
+    for frame in frames:
+        for record in decode_frame(frame):
+            main.SoilData(**record)
+    frame_us = (time.perf_counter() - started) / len(rows) * 1e6
+    print(f"\nDecode + SoilData validation      JSON {json_us:.1f} us   MessagePack {frame_us:.1f} us per reading")
+
+
+def start_server(http_port: int, udp_port: int) -> subprocess.Popen:
+    db_dir = tempfile.mkdtemp(prefix="agrisphere-bench-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'bench.db')}", BINARY_INGEST_UDP_PORT=str(udp_port),
+               BINARY_INGEST_UDP_HOST="127.0.0.1", INGEST_BUFFER_SIZE="1000000", BINARY_INGEST_MAX_PENDING="1000000")
+    env.pop("GEMINI_API_KEY", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(http_port), "--log-level", "error"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{http_port}/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not start")
+
+
+async def post_readings(base_url: str, count: int, concurrency: int, pooled: bool) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency if pooled else 0)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def one(i):
+            async with semaphore:
+                response = await client.post("/api/soil-data", json=reading(i % 1000), headers={} if pooled else {"Connection": "close"})
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(count)))
+        return time.perf_counter() - started
+
+
+def send_frames(http_port: int, udp_port: int, count: int, batch: int, rate: float) -> float:
+    stats_url = f"http://127.0.0.1:{http_port}/api/binary-ingest/stats"
+    before = httpx.get(stats_url).json()["accepted"]
+    frames = [encode_frame([reading(i % 1000) for i in range(n, min(n + batch, count))]) for n in range(0, count, batch)]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    interval = batch / rate
+    started = time.perf_counter()
+    for i, frame in enumerate(frames):
+        sock.sendto(frame, ("127.0.0.1", udp_port))
+        time.sleep(max(0.0, started + (i + 1) * interval - time.perf_counter()))
+
+    # Wait until the gateway has worked through everything it received
+    accepted, last_change = -1, time.perf_counter()
+    while time.perf_counter() - last_change < 1.0:
+        now = httpx.get(stats_url).json()["accepted"] - before
+        if now != accepted:
+            accepted, last_change = now, time.perf_counter()
+        if accepted >= count:
+            break
+        time.sleep(0.01)
+    elapsed = last_change - started
+    if accepted < count:
+        print(f"  ({count - accepted} readings lost in the socket buffers or dropped)")
+    return accepted / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=1, help="HTTP requests in flight (client and server share the CPU on small machines)")
+    parser.add_argument("--batch", type=int, default=1, help="readings per binary frame")
+    parser.add_argument("--udp-rate", type=float, default=20000, help="readings/s the UDP sender is paced at")
+    args = parser.parse_args()
+    random.seed(42)
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='agrisphere-bench-'), 'bench.db')}"
+    os.environ.pop("GEMINI_API_KEY", None)
+    bytes_per_reading(max(args.batch, 10))
+
+    http_port, udp_port = free_port(), free_port(socket.SOCK_DGRAM)
+    server = start_server(http_port, udp_port)
+    try:
+        base_url = f"http://127.0.0.1:{http_port}"
+        print(f"\nIngesting {args.readings:,} readings into a Uvicorn subprocess")
+        elapsed = asyncio.run(post_readings(base_url, args.readings, args.concurrency, pooled=False))
+        print(f"  JSON, new connection per reading  {args.readings / elapsed:9,.0f} readings/s")
+        elapsed = asyncio.run(post_readings(base_url, args.readings, args.concurrency, pooled=True))
+        print(f"  JSON, keep-alive pool             {args.readings / elapsed:9,.0f} readings/s")
+        rate = send_frames(http_port, udp_port, args.readings, args.batch, args.udp_rate)
+        print(f"  MessagePack over UDP ({args.batch}/frame)    {rate:9,.0f} readings/s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
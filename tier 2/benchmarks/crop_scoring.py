@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: crop suitability scoring, one reading at a time vs the batched NumPy path.
+
+Times three ways of scoring --readings synthetic readings against a crop table:
+the original per-reading Python loop (kept here as the baseline), the single-reading
+predict_crop_suitability() wrapper called in a loop, and one rank_crops() call over the
+whole (readings x features) matrix. --crops pads the registry's table with synthetic crops to show
+how each path scales with the size of the crop table.
+
+    python -m benchmarks.crop_scoring [--readings 100000] [--crops 4] [--top-k 3]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from services import crop_prediction, crop_registry
+from services.crop_prediction import FEATURES, CropMatrix, rank_crops
+
+
+def legacy_predict(crops, nitrogen, phosphorus, potassium, ph, temp, humidity, rainfall):
+    # The pre-matrix implementation: rebuilds a list of dicts and loops over every crop
+    available_crops = [
+        {"name": crop["name"], "ideal_ph": crop["ideal"]["ph"], "ideal_temp": crop["ideal"]["temp"], "base_score": crop["base_score"]}
+        for crop in crops
+    ]
+    predictions = []
+    for crop in available_crops:
+        ph_penalty = 0 if crop["ideal_ph"][0] <= ph <= crop["ideal_ph"][1] else 15
+        temp_penalty = 0 if crop["ideal_temp"][0] <= temp <= crop["ideal_temp"][1] else 10
+        suitability_score = max(0, crop["base_score"] - ph_penalty - temp_penalty)
+        predictions.append({"crop": crop["name"], "suitability_score": suitability_score})
+    return sorted(predictions, key=lambda x: x["suitability_score"], reverse=True)
+
+
+def synthetic_crops(count, rng):
+    source = crop_registry.load_source()
+    crops = list(source)
+    for i in range(len(crops), count):
+        template = source[i % len(source)]
+        ideal = {}
+        for feature, (low, high) in template["ideal"].items():
+            shift = (high - low) * rng.uniform(-0.3, 0.3)
+            ideal[feature] = (low + shift, high + shift)
+        crops.append({"name": f"Crop{i}", "base_score": rng.randint(70, 95), "ideal": ideal})
+    return crops
+
+
+def timed(label, fn, count):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed * 1000:10.1f} ms  {count / elapsed:14,.0f} readings/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=100_000)
+    parser.add_argument("--crops", type=int, default=len(crop_registry.get_registry()))
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    crops = synthetic_crops(args.crops, rng)
+    matrix = CropMatrix(crops)
+    readings = np.random.default_rng(42).uniform(
+        [60, 20, 40, 5.0, 12, 35, 0],
+        [160, 90, 200, 8.0, 32, 95, 30],
+        size=(args.readings, len(FEATURES)),
+    )
+    rows = readings.tolist()
+
+    print(f"Scoring {args.readings:,} readings against {len(matrix)} crops (top {args.top_k})\n")
+    legacy = timed("legacy loop (pH/temp only)", lambda: [legacy_predict(crops, *row) for row in rows], args.readings)
+
+    # The wrapper always scores the registry's crop table, so it is only comparable at the default size
+    if args.crops == len(crop_registry.get_registry()):
+        timed("predict_crop_suitability() loop", lambda: [crop_prediction.predict_crop_suitability(*row) for row in rows], args.readings)
+
+    batched = timed("rank_crops() batched", lambda: rank_crops(readings, args.top_k, matrix), args.readings)
+    print(f"\nbatched speed-up over the legacy loop: {legacy / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Load test: ingestion latency while Gemini calls are in flight.
+
+Drives POST /api/soil-data against the in-process ASGI app twice — once idle and once
+while a batch of /api/dss-insight requests are waiting on a slow (stubbed) LLM — and
+checks that ingestion p99 stays flat. Pass --blocking-llm to stub the model with a
+synchronous sleep, which reproduces the old behaviour of a frozen event loop.
+
+    python -m benchmarks.ingestion_under_llm_load [--requests 500] [--rate 500] [--llm-calls 20] [--llm-latency 2.0]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Point the app at a throwaway SQLite database before main.py is imported
+_db_dir = tempfile.mkdtemp(prefix="agrisphere-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.pop("GEMINI_API_KEY", None)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from services.llm_gateway import LLMGateway  # noqa: E402
+
+READING = {
+    "farmer_id": 1,
+    "moisture": 45.0,
+    "temp": 24.0,
+    "humidity": 60.0,
+    "ph": 6.5,
+    "nitrogen": 100.0,
+    "phosphorus": 50.0,
+    "potassium": 80.0,
+    "rainfall": 5.0,
+    "timestamp": "2024-01-01T00:00:00Z",
+}
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Stands in for genai.GenerativeModel with a fixed latency."""
+
+    def __init__(self, latency: float, blocking: bool = False):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def generate_content_async(self, prompt):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return _FakeResponse("Stubbed agronomist explanation.")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_ingestion(client, total, rate):
+    # Open-loop arrivals: latency is measured from each request's scheduled send time,
+    # so time spent waiting on a stalled event loop is counted too.
+    latencies = []
+    t0 = time.perf_counter()
+
+    async def one(i):
+        scheduled = t0 + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = await client.post("/api/soil-data", json=READING)
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        if response.status_code != 201:
+            raise RuntimeError(f"Ingestion failed: HTTP {response.status_code} {response.text}")
+
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies
+
+
+def summarize(label, latencies):
+    print(
+        f"{label:<22} n={len(latencies):<5} p50={percentile(latencies, 50):7.2f} ms  "
+        f"p99={percentile(latencies, 99):7.2f} ms  max={max(latencies):7.2f} ms  mean={statistics.mean(latencies):7.2f} ms"
+    )
+
+
+async def main_async(args):
+    main.llm_gateway = LLMGateway(FakeGeminiModel(args.llm_latency, blocking=args.blocking_llm), timeout=args.llm_latency * 2)
+    transport = httpx.ASGITransport(app=main.app)
+    # The app's own startup: schema creation, ingestion buffer and the other background workers
+    async with main.app.router.lifespan_context(main.app):
+        await main.ingestion_buffer.write_batch([READING])  # dss-insight needs a reading to work on
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await run_ingestion(client, 50, args.rate)  # warm-up
+            idle = await run_ingestion(client, args.requests, args.rate)
+
+            llm_calls = [
+                asyncio.create_task(client.get("/api/dss-insight", params={"farmer_id": 1}, timeout=None))
+                for _ in range(args.llm_calls)
+            ]
+            loaded = await run_ingestion(client, args.requests, args.rate)
+            in_flight = sum(1 for task in llm_calls if not task.done())
+            await asyncio.gather(*llm_calls)
+
+    summarize("idle", idle)
+    summarize(f"{args.llm_calls} LLM calls", loaded)
+    print(f"LLM calls still in flight when the loaded run finished: {in_flight}/{args.llm_calls}")
+
+    idle_p99 = percentile(idle, 99)
+    loaded_p99 = percentile(loaded, 99)
+    budget = max(idle_p99 * args.max_ratio, idle_p99 + args.max_extra_ms)
+    if loaded_p99 > budget:
+        print(f"FAIL: p99 under LLM load {loaded_p99:.2f} ms exceeds budget {budget:.2f} ms")
+        return 1
+    print(f"OK: p99 under LLM load {loaded_p99:.2f} ms within budget {budget:.2f} ms")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="ingestion requests per phase")
+    parser.add_argument("--rate", type=float, default=500.0, help="ingestion requests per second")
+    parser.add_argument("--llm-calls", type=int, default=20, help="concurrent /api/dss-insight requests")
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="stubbed Gemini latency (s)")
+    parser.add_argument("--blocking-llm", action="store_true", help="stub Gemini with a blocking sleep")
+    parser.add_argument("--max-ratio", type=float, default=3.0, help="allowed loaded/idle p99 ratio")
+    parser.add_argument("--max-extra-ms", type=float, default=50.0, help="allowed absolute p99 increase")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async(parse_args())))
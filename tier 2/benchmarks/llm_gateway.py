@@ -0,0 +1,99 @@
+"""
+Load test: the LLM gateway against a local fake Gemini with injected latency and failures.
+
+Sends --calls concurrent explain_decision() prompts (distinct inputs, no response cache)
+through an LLMGateway wrapping FakeGeminiModel, for each scenario:
+
+    healthy    fast model, no errors
+    flaky      30% transient errors: retries should still get nearly every answer in
+    slow       model slower than the deadline: the first calls time out, then the circuit opens
+    outage     every call fails: the circuit opens and the remaining calls fall back at once
+    overload   many more calls than --max-concurrency slots at once: the excess waits half the
+               deadline for a slot, then falls back
+
+and reports answered / fallback (by reason) counts, latency and how many calls reached the model.
+Fails if any call outlives its deadline (plus --slack-ms), or if the circuit did not cut the
+outage short.
+
+    python -m benchmarks.llm_gateway [--calls 200] [--max-concurrency 8] [--timeout 1.0]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from benchmarks.ingestion_under_llm_load import percentile
+from services.gemini_client import FakeGeminiModel
+from services.llm_gateway import LLMGateway
+from services.reasoning_engine import explain_decision
+
+SCENARIOS = {
+    # name: (latency s, failure rate)
+    "healthy": (0.05, 0.0),
+    "flaky": (0.05, 0.3),
+    "slow": (3.0, 0.0),
+    "outage": (0.05, 1.0),
+    "overload": (0.3, 0.0),
+}
+
+
+def prompt_inputs(n: int) -> dict:
+    return {"crop": "Tomato", "suitability": n % 100, "N": 10.0, "P": 5.0, "K": 0.0,
+            "recommendation": "Apply urea", "market_saturation": "Low"}
+
+
+async def run_scenario(name, args):
+    latency, failure_rate = SCENARIOS[name]
+    model = FakeGeminiModel(latency=latency, jitter=latency / 5, failure_rate=failure_rate, seed=42)
+    gateway = LLMGateway(model, max_concurrency=args.max_concurrency, timeout=args.timeout, retries=2, backoff=0.05,
+                         failure_threshold=5, reset_timeout=30)
+    # overload: everything at once; the others: spread over --spread seconds
+    spread = 0 if name == "overload" else args.spread
+    latencies = []
+
+    async def one(n):
+        await asyncio.sleep(spread * n / args.calls)
+        started = time.perf_counter()
+        await explain_decision(prompt_inputs(n), gateway)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one(n) for n in range(args.calls)))
+    stats = gateway.stats()
+    fallbacks = {reason: count for reason, count in stats["fallbacks"].items() if count}
+    print(
+        f"{name:<9} answered={stats['succeeded']:<4} fallbacks={str(fallbacks):<40} model calls={model.calls:<4} "
+        f"retried={stats['retried']:<4} circuit={stats['circuit']:<9} p50={percentile(latencies, 50):7.1f} ms  p99={percentile(latencies, 99):7.1f} ms"
+    )
+    return stats, model.calls, latencies
+
+
+async def main_async(args):
+    failures = []
+    for name in SCENARIOS:
+        stats, model_calls, latencies = await run_scenario(name, args)
+        if max(latencies) > args.timeout * 1000 + args.slack_ms:
+            failures.append(f"{name}: slowest call took {max(latencies):.0f} ms, deadline is {args.timeout * 1000:.0f} ms")
+        # Before it opens, at most failure_threshold + max_concurrency calls can reach the model, 1 + retries times each
+        if name == "outage" and model_calls > (5 + args.max_concurrency) * 3:
+            failures.append(f"outage: {model_calls} model calls, the circuit should have stopped them")
+        if name == "healthy" and stats["succeeded"] != args.calls:
+            failures.append(f"healthy: only {stats['succeeded']}/{args.calls} calls answered")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: every call answered or fell back within its deadline")
+    return 1 if failures else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="prompts per scenario")
+    parser.add_argument("--spread", type=float, default=5.0, help="seconds the prompts are spread over (except for overload)")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="LLM_MAX_CONCURRENCY")
+    parser.add_argument("--timeout", type=float, default=1.0, help="LLM_TIMEOUT (per-call deadline, s)")
+    parser.add_argument("--slack-ms", type=float, default=100.0, help="allowed overrun of the deadline")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async(parse_args())))
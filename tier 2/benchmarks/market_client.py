@@ -0,0 +1,105 @@
+"""
+Benchmark: market forecast lookups per DSS request, naive vs pooled vs pooled + cached.
+
+Starts benchmarks/market_stub.py on a local port (with --latency per request) and issues
+--requests concurrent lookups (--concurrency at a time) for random crops over a few regions:
+
+    naive           a new httpx.AsyncClient (fresh TCP connection) and one GET per lookup
+    pooled          one shared MarketDataClient with caching disabled (ttl=0)
+    pooled+cached   one shared MarketDataClient with its cache, fetching only the ranked crop as main.py does
+
+    python -m benchmarks.market_client [--requests 2000] [--concurrency 50] [--latency 0.05] [--failure-rate 0.0]
+"""
+import argparse
+import asyncio
+import random
+import socket
+import statistics
+import threading
+import time
+from urllib.parse import quote
+
+import httpx
+import uvicorn
+
+from benchmarks.market_stub import create_app
+from services.crop_registry import get_registry
+from services.market_client import MarketDataClient
+
+REGIONS = ("Central", "North", "South", "East", "West")
+MONTH = 6
+
+
+def start_stub(latency: float, failure_rate: float) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(latency, failure_rate), host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run(label, lookup, requests: int, concurrency: int, seed: int = 42):
+    rng = random.Random(seed)
+    names = get_registry().names
+    work = [(rng.choice(names), rng.choice(REGIONS)) for _ in range(requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(crop, region):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await lookup(crop, region)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(crop, region) for crop, region in work))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(
+        f"{label:<15} {requests / elapsed:9,.0f} lookups/s   p50 {statistics.median(latencies) * 1000:7.1f} ms"
+        f"   p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.1f} ms   failed {failures}"
+    )
+
+
+async def main_async(args):
+    base_url = start_stub(args.latency, args.failure_rate)
+    print(f"Stub at {base_url}: {args.latency * 1000:.0f} ms latency, {args.failure_rate:.0%} failures; "
+          f"{args.requests:,} lookups, {args.concurrency} concurrent\n")
+
+    async def naive(crop, region):
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as http:
+            response = await http.get(f"/v1/crops/{quote(crop, safe='')}/forecast", params={"region": region, "month": MONTH})
+            response.raise_for_status()
+            return response.json()
+
+    await run("naive", naive, args.requests, args.concurrency)
+
+    pooled = MarketDataClient(base_url, timeout=args.timeout, ttl=0, max_stale=0, max_connections=args.concurrency)
+    await run("pooled", lambda crop, region: pooled.get_forecast(crop, region, MONTH), args.requests, args.concurrency)
+    await pooled.aclose()
+
+    cached = MarketDataClient(base_url, timeout=args.timeout, max_connections=args.concurrency)
+    await run("pooled+cached", lambda crop, region: cached.get_forecast(crop, region, MONTH), args.requests, args.concurrency)
+    print(f"\npooled+cached client: {cached.stats()}")
+    await cached.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency per request, seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of stub requests answered with 503")
+    parser.add_argument("--timeout", type=float, default=0.5)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Local stand-in for the market forecast API, for offline development, tests and benchmarks.
+
+Serves the two endpoints MarketDataClient calls, answering from the crop registry's mock
+market data. --latency adds a per-request delay and --failure-rate makes a share of the
+requests answer 503, to exercise the client's cache, timeouts and fallback.
+
+    python -m benchmarks.market_stub [--port 8090] [--latency 0.05] [--failure-rate 0.0]
+    MARKET_API_URL=http://127.0.0.1:8090 uvicorn main:app
+"""
+import argparse
+import asyncio
+import random
+
+from fastapi import FastAPI, HTTPException
+
+from services.market_api import MarketAnalyzer
+
+
+def create_app(latency: float = 0.05, failure_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Market forecast stub")
+    app.state.requests = 0
+
+    async def simulate():
+        app.state.requests += 1
+        if latency > 0:
+            await asyncio.sleep(latency)
+        if failure_rate > 0 and random.random() < failure_rate:
+            raise HTTPException(status_code=503, detail="Stubbed upstream failure")
+
+    def forecast(crop: str, region: str, month: int) -> dict:
+        return {"crop": crop, "region": region, "month": month, **MarketAnalyzer.mock_forecast(crop, month)}
+
+    @app.get("/v1/crops/{crop}/forecast")
+    async def get_forecast(crop: str, region: str, month: int):
+        await simulate()
+        return forecast(crop, region, month)
+
+    @app.get("/v1/forecasts")
+    async def get_forecasts(crops: str, region: str, month: int):
+        await simulate()
+        return {"forecasts": [forecast(crop, region, month) for crop in crops.split(",") if crop]}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests answered with 503")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.failure_rate), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: GET /api/soil-data read paths, latency and peak memory by number of readings.
+
+    orm+pydantic      the previous endpoint: full SoilDataDB ORM objects, reversed in Python,
+                      validated through List[SoilDataResponse] and rendered by JSONResponse
+    projection rows   telemetry_reads: selected columns as tuples, ordered in SQL, orjson
+    columnar          the same rows as {"fields": [...], "columns": {field: [values]}}
+
+Loads --rows readings for one farmer into a throwaway SQLite file (or --url), then for each
+--limits value times the whole read (query + encode to response bytes) and, in a separate
+run under tracemalloc, records the peak Python memory it allocated.
+
+    python -m benchmarks.soil_data_read [--rows 500000] [--limits 50,5000,500000] [--url postgresql://...]
+
+With a Postgres URL the soil_data table in that database is emptied first, so point it at a
+scratch database.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+FARMER_ID = 1
+
+
+async def legacy_read(database, models, response_field, farmer_id: int, limit: int) -> bytes:
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    def query(db):
+        return db.query(models.SoilDataDB).filter(models.SoilDataDB.farmer_id == farmer_id, models.SoilDataDB.ts.isnot(None)).order_by(models.SoilDataDB.ts.desc(), models.SoilDataDB.id.desc()).limit(limit).all()[::-1]
+
+    db = database.SessionLocal()
+    try:
+        readings = await database.run_db(query, db)
+        content = await serialize_response(field=response_field, response_content=readings)
+        return JSONResponse(content).body
+    finally:
+        db.close()
+
+
+async def projection_read(database, telemetry_reads, farmer_id: int, limit: int, layout: str) -> bytes:
+    db = database.SessionLocal()
+    try:
+        return await database.run_db(telemetry_reads.read_recent, db, farmer_id, limit, None, layout)
+    finally:
+        db.close()
+
+
+async def time_calls(call, repeat: int) -> List[float]:
+    await call()  # warm up statement caches and the executor
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def peak_memory(call) -> int:
+    tracemalloc.start()
+    try:
+        await call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+async def run(args):
+    from sqlalchemy import text
+
+    import database
+    import main
+    import models
+    import telemetry_reads
+    from benchmarks.suite import load_rows
+
+    route = next(route for route in main.app.routes if getattr(route, "path", None) == "/api/soil-data" and "GET" in route.methods)
+    engine = database.engine
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM soil_data"))
+    load_rows(engine, models.SoilDataDB.__table__, 0, args.rows, 1, datetime.now(timezone.utc) - timedelta(days=1))
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE soil_data" if engine.dialect.name == "postgresql" else "ANALYZE"))
+
+    paths = {
+        "orm+pydantic": lambda limit: legacy_read(database, models, route.response_field, FARMER_ID, limit),
+        "projection rows": lambda limit: projection_read(database, telemetry_reads, FARMER_ID, limit, "rows"),
+        "columnar": lambda limit: projection_read(database, telemetry_reads, FARMER_ID, limit, "columnar"),
+    }
+
+    print(f"\nsoil_data: {args.rows:,} readings for one farmer ({engine.dialect.name})")
+    print(f"{'limit':>8}  {'path':<16} {'p50':>11} {'min':>11} {'peak mem':>10} {'bytes':>12} {'vs orm':>8}")
+    for limit in sorted(int(limit) for limit in args.limits.split(",")):
+        repeat = args.repeat or max(3, min(200, 200_000 // limit))
+        baseline = None
+        for name, read in paths.items():
+            samples = await time_calls(lambda: read(limit), repeat)
+            peak = await peak_memory(lambda: read(limit))
+            size = len(await read(limit))
+            p50 = statistics.median(samples)
+            baseline = baseline or p50
+            print(f"{limit:>8,}  {name:<16} {p50:>8.2f} ms {min(samples):>8.2f} ms {peak / 2 ** 20:>7.1f} MB {size:>12,} {baseline / p50:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000, help="readings to load for the benchmark farmer")
+    parser.add_argument("--limits", default="50,5000,500000", help="comma-separated numbers of readings to read")
+    parser.add_argument("--repeat", type=int, default=0, help="timed reads per limit (default: scaled to the limit)")
+    parser.add_argument("--url", default=None, help="database URL (default: throwaway SQLite file)")
+    args = parser.parse_args()
+
+    # Point the app at the benchmark database before main.py is imported
+    os.environ["DATABASE_URL"] = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='agrisphere-bench-'), 'bench.db')}"
+    os.environ["SOIL_DATA_MAINTENANCE_INTERVAL"] = "0"
+    os.environ.pop("GEMINI_API_KEY", None)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: per-farmer telemetry queries on the legacy schema vs the typed `ts` column
+with the (farmer_id, ts DESC, id DESC) index.
+
+Loads --rows synthetic readings (one node per farmer, one reading every 10 s) into a fresh
+soil_data table, times the legacy queries with only the id / farmer_id indexes, then builds
+ix_soil_data_farmer_id_ts and times the ts-based queries used by main.py.
+
+    python -m benchmarks.soil_data_ts_index [--rows 10000000] [--farmers 1000] [--url sqlite:///...]
+
+--url defaults to a throwaway SQLite file; pass a Postgres URL to benchmark there (the
+soil_data table in that database is dropped and recreated).
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import DateTime, bindparam, create_engine, insert, text
+
+import models
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+INTERVAL = timedelta(seconds=10)
+
+LEGACY_QUERIES = {
+    "latest reading": "SELECT * FROM soil_data WHERE farmer_id = :farmer_id ORDER BY id DESC LIMIT 1",
+    "latest 50 by time": "SELECT * FROM soil_data WHERE farmer_id = :farmer_id ORDER BY timestamp DESC LIMIT 50",
+    "time window": "SELECT * FROM soil_data WHERE farmer_id = :farmer_id AND timestamp >= :from_str AND timestamp < :to_str",
+}
+TS_QUERIES = {
+    "latest reading": "SELECT * FROM soil_data WHERE farmer_id = :farmer_id AND ts IS NOT NULL ORDER BY ts DESC, id DESC LIMIT 1",
+    "latest 50 by time": "SELECT * FROM soil_data WHERE farmer_id = :farmer_id AND ts IS NOT NULL ORDER BY ts DESC, id DESC LIMIT 50",
+    "time window": "SELECT * FROM soil_data WHERE farmer_id = :farmer_id AND ts >= :from_ts AND ts < :to_ts",
+}
+
+
+def load_rows(engine, total, farmers, chunk=20000):
+    table = models.SoilDataDB.__table__
+    table.drop(engine, checkfirst=True)
+    table.create(engine)
+    with engine.begin() as conn:
+        # Load without the composite index, like a database that predates the migration
+        conn.execute(text("DROP INDEX ix_soil_data_farmer_id_ts"))
+
+    started = time.perf_counter()
+    for offset in range(0, total, chunk):
+        rows = []
+        for i in range(offset, min(offset + chunk, total)):
+            reading_time = START + INTERVAL * (i // farmers)
+            rows.append({
+                "farmer_id": i % farmers + 1,
+                "moisture": 50.0,
+                "temp": 25.0,
+                "humidity": 60.0,
+                "timestamp": reading_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "ts": reading_time,
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(table), rows)
+        print(f"\r  loaded {offset + len(rows):,}/{total:,} rows", end="", flush=True)
+    print(f"\n  load took {time.perf_counter() - started:.1f}s")
+
+    last_time = START + INTERVAL * ((total - 1) // farmers)
+    return last_time
+
+
+def time_queries(engine, queries, params_list):
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in queries.items():
+            statement = text(sql)
+            if ":from_ts" in sql:
+                # Typed binds so SQLite compares against the same string format the ORM stores
+                statement = statement.bindparams(
+                    bindparam("from_ts", type_=DateTime(timezone=True)),
+                    bindparam("to_ts", type_=DateTime(timezone=True)),
+                )
+            conn.execute(statement, params_list[0]).fetchall()  # warm-up
+            samples = []
+            for params in params_list:
+                started = time.perf_counter()
+                conn.execute(statement, params).fetchall()
+                samples.append((time.perf_counter() - started) * 1000)
+            results[name] = samples
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--farmers", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per shape (random farmers)")
+    parser.add_argument("--window-hours", type=float, default=1.0, help="time-window query span")
+    parser.add_argument("--url", default=None, help="database URL (default: throwaway SQLite file)")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='agrisphere-bench-'), 'bench.db')}"
+    engine = create_engine(url)
+    print(f"Loading {args.rows:,} rows for {args.farmers} farmers into {engine.dialect.name}...")
+    last_time = load_rows(engine, args.rows, args.farmers)
+
+    window_end = last_time
+    window_start = window_end - timedelta(hours=args.window_hours)
+    rng = random.Random(42)
+    params_list = [
+        {
+            "farmer_id": rng.randint(1, args.farmers),
+            "from_str": window_start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "to_str": window_end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "from_ts": window_start,
+            "to_ts": window_end,
+        }
+        for _ in range(args.queries)
+    ]
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE soil_data" if engine.dialect.name == "postgresql" else "ANALYZE"))
+    legacy = time_queries(engine, LEGACY_QUERIES, params_list)
+
+    print("Building ix_soil_data_farmer_id_ts...")
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_soil_data_farmer_id_ts ON soil_data (farmer_id, ts DESC, id DESC)"))
+        conn.execute(text("ANALYZE soil_data" if engine.dialect.name == "postgresql" else "ANALYZE"))
+    print(f"  index build took {time.perf_counter() - started:.1f}s")
+    typed = time_queries(engine, TS_QUERIES, params_list)
+
+    print(f"\n{'query':<20} {'legacy mean':>12} {'legacy p95':>11} {'ts mean':>10} {'ts p95':>10} {'speed-up':>9}")
+    for name in LEGACY_QUERIES:
+        old, new = legacy[name], typed[name]
+        old_p95 = statistics.quantiles(old, n=20)[-1]
+        new_p95 = statistics.quantiles(new, n=20)[-1]
+        speedup = statistics.mean(old) / max(statistics.mean(new), 1e-9)
+        print(f"{name:<20} {statistics.mean(old):10.3f}ms {old_p95:9.3f}ms {statistics.mean(new):8.3f}ms {new_p95:8.3f}ms {speedup:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Startup budget: how fast a fresh worker can import the app and serve its first request.
+
+Each run is a new interpreter, like a preforked or autoscaled Uvicorn worker:
+
+1. `import main` with GEMINI_API_KEY set and DATABASE_URL pointing at a database that cannot
+   be opened. The import must succeed, must not load google.generativeai, and is timed.
+2. `uvicorn main:app` on a throwaway SQLite file, timed from process spawn until GET /
+   answers (schema creation in the lifespan included).
+
+Exits with status 1 if either median is over budget, or if the import touched the DB or Gemini.
+
+    python -m benchmarks.startup [--runs 5] [--max-import 2.0] [--max-first-request 3.0]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+print(json.dumps({"seconds": time.perf_counter() - started, "genai_loaded": "google.generativeai" in sys.modules}))
+"""
+
+
+def base_env(**overrides) -> dict:
+    env = dict(os.environ, SOIL_DATA_MAINTENANCE_INTERVAL="0")
+    env.pop("GEMINI_API_KEY", None)
+    env.update(overrides)
+    return env
+
+
+def time_import() -> dict:
+    # The directory doesn't exist, so any connection attempt during import would raise
+    env = base_env(DATABASE_URL="sqlite:////nonexistent-agrisphere-dir/unreachable.db", GEMINI_API_KEY="startup-check")
+    result = subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import main failed without a reachable database:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def time_first_request() -> float:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    db_path = os.path.join(tempfile.mkdtemp(prefix="agrisphere-startup-"), "startup.db")
+    # One client for every poll: a new client per attempt burns CPU the starting server needs
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0)
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "error"],
+        env=base_env(DATABASE_URL=f"sqlite:///{db_path}"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while True:
+            try:
+                if client.get("/").status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited during startup:\n{server.stderr.read().decode().strip()}")
+            if time.perf_counter() - started > 60:
+                raise RuntimeError("uvicorn did not answer within 60 s")
+            time.sleep(0.01)
+    finally:
+        client.close()
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import", type=float, default=2.0, help="budget for the median `import main` (s)")
+    parser.add_argument("--max-first-request", type=float, default=3.0, help="budget for the median spawn-to-first-response (s)")
+    args = parser.parse_args()
+
+    imports, first_requests, failures = [], [], []
+    for _ in range(args.runs):
+        probe = time_import()
+        imports.append(probe["seconds"])
+        if probe["genai_loaded"]:
+            failures.append("google.generativeai was imported at module import time")
+        first_requests.append(time_first_request())
+
+    import_median = statistics.median(imports)
+    first_median = statistics.median(first_requests)
+    print(f"import main          median {import_median:.3f} s   min {min(imports):.3f} s   max {max(imports):.3f} s   (budget {args.max_import:.1f} s)")
+    print(f"spawn -> first 200   median {first_median:.3f} s   min {min(first_requests):.3f} s   max {max(first_requests):.3f} s   (budget {args.max_first_request:.1f} s)")
+
+    if import_median > args.max_import:
+        failures.append(f"import main took {import_median:.3f} s")
+    if first_median > args.max_first_request:
+        failures.append(f"first request took {first_median:.3f} s")
+    for failure in sorted(set(failures)):
+        print(f"FAIL: {failure}")
+    if failures:
+        return 1
+    print("OK: startup within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
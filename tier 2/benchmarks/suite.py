@@ -0,0 +1,300 @@
+"""
+Benchmark suite for the API and DSS services, with JSON baselines and regression checks.
+
+`run` loads soil_data up to each --rows size in turn (rows are appended, so 1k -> 10M only
+loads the table once) and at every size times, through the in-process ASGI app:
+
+    receive_soil_data   POST /api/soil-data (validation, buffer submit, alerts, live push)
+    ingest_flush        writing a queued batch of INGEST_BATCH_SIZE readings to soil_data
+    get_soil_data       GET /api/soil-data for a random farmer (last 50 readings)
+
+and once, as plain function calls:
+
+    generate_decision               Stage-1 scoring + fertilizer + market + prompt, Gemini stubbed
+    predict_crop_suitability
+    calculate_fertilizer_deficit
+
+Results are written as JSON (per benchmark: n, mean/p50/p95/p99 in ms, ops/s, plus the
+machine, database and git commit they came from). Keep one as a baseline and `compare`
+later runs against it: a benchmark regresses when its p50 is more than --threshold slower
+(and at least --min-delta-ms, so sub-microsecond jitter doesn't count). `compare` exits
+with status 1 on any regression, so it can gate CI.
+
+    python -m benchmarks.suite run [--rows 1000,100000] [--url postgresql://...] [--output FILE] [--baseline FILE]
+    python -m benchmarks.suite compare benchmarks/baselines/sqlite.json benchmarks/results/sqlite-20240601-120000.json
+
+--url defaults to a throwaway SQLite file. With a Postgres URL the soil_data table in that
+database is emptied first, so point it at a scratch database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+INTERVAL = timedelta(seconds=10)
+
+
+class _StubResponse:
+    text = "Stubbed agronomist explanation."
+
+
+class StubGeminiModel:
+    """Answers instantly, so generate_decision measures our code and not the LLM."""
+
+    async def generate_content_async(self, prompt):
+        return _StubResponse()
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+    mean = statistics.mean(ordered)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(mean, 4),
+        "p50_ms": round(pick(50), 4),
+        "p95_ms": round(pick(95), 4),
+        "p99_ms": round(pick(99), 4),
+        "ops_per_s": round(1000 / mean, 1) if mean else None,
+    }
+
+
+async def measure(fn, iterations: int, warmup: int = 10):
+    """Time `iterations` calls of the (sync or async) zero-argument `fn`, in ms."""
+    for _ in range(warmup):
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def reading(farmer_id: int, when: datetime) -> dict:
+    return {
+        "farmer_id": farmer_id,
+        "moisture": round(random.uniform(35.0, 55.0), 1),
+        "temp": round(random.uniform(22.0, 28.0), 1),
+        "humidity": round(random.uniform(45.0, 65.0), 1),
+        "ph": round(random.uniform(6.2, 7.1), 1),
+        "nitrogen": round(random.uniform(80.0, 140.0), 1),
+        "phosphorus": round(random.uniform(30.0, 70.0), 1),
+        "potassium": round(random.uniform(40.0, 100.0), 1),
+        "rainfall": round(random.uniform(0.0, 15.0), 1),
+        "timestamp": when.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+
+
+def load_rows(engine, table, start: int, total: int, farmers: int, end_time: datetime, chunk: int = 20000):
+    """Append rows start..total-1: row i is farmer i % farmers, (i // farmers) readings of 10 s before end_time."""
+    from sqlalchemy import insert
+
+    for offset in range(start, total, chunk):
+        rows = []
+        for i in range(offset, min(offset + chunk, total)):
+            when = end_time - INTERVAL * (i // farmers)
+            row = reading(i % farmers + 1, when)
+            row["ts"] = when
+            rows.append(row)
+        with engine.begin() as conn:
+            conn.execute(insert(table), rows)
+        print(f"\r  loaded {offset + len(rows):,}/{total:,} rows", end="", flush=True, file=sys.stderr)
+    print(file=sys.stderr)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_suite(args):
+    from sqlalchemy import delete, text
+
+    import httpx
+
+    import database
+    import main
+    import models
+    from services.crop_prediction import predict_crop_suitability
+    from services.fertilizer_optimizer import calculate_fertilizer_deficit
+    from services.llm_gateway import LLMGateway
+    from services.reasoning_engine import generate_decision
+
+    engine = database.engine
+    table = models.SoilDataDB.__table__
+    sizes = sorted(int(size) for size in args.rows.split(","))
+    results = {}
+    random.seed(42)
+
+    def record(name, samples):
+        results[name] = summarize(samples)
+        stats = results[name]
+        print(f"  {name:<44} p50 {stats['p50_ms']:9.3f} ms   p95 {stats['p95_ms']:9.3f} ms   {stats['ops_per_s'] or 0:>10,.0f} ops/s")
+
+    # DSS services: pure CPU, independent of table size
+    soil = SimpleNamespace(**reading(1, datetime.now(timezone.utc)))
+    llm = LLMGateway(StubGeminiModel())
+    print("DSS services")
+    record("generate_decision", await measure(lambda: generate_decision(soil, "Central", 6, llm), args.iterations))
+    record("predict_crop_suitability", await measure(
+        lambda: predict_crop_suitability(soil.nitrogen, soil.phosphorus, soil.potassium, soil.ph, soil.temp, soil.humidity, soil.rainfall),
+        args.iterations))
+    record("calculate_fertilizer_deficit", await measure(
+        lambda: calculate_fertilizer_deficit("Tomato", soil.nitrogen, soil.phosphorus, soil.potassium), args.iterations))
+
+    models.Base.metadata.create_all(bind=engine)  # the app only creates tables in its lifespan
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM soil_data"))
+    end_time = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=1)  # live POSTs land after the loaded history
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for size in sizes:
+                print(f"\nsoil_data at {size:,} rows ({engine.dialect.name})")
+                with engine.begin() as conn:
+                    loaded = conn.execute(text("SELECT COUNT(*) FROM soil_data")).scalar()
+                if loaded < size:
+                    load_rows(engine, table, loaded, size, args.farmers, end_time)
+                    with engine.begin() as conn:
+                        conn.execute(text("ANALYZE soil_data" if engine.dialect.name == "postgresql" else "ANALYZE"))
+
+                farmers = min(args.farmers, size)
+                now = datetime.now(timezone.utc)
+
+                async def post():
+                    response = await client.post("/api/soil-data", json=reading(random.randint(1, farmers), now))
+                    assert response.status_code == 201, response.text
+
+                record(f"receive_soil_data[rows={size}]", await measure(post, args.iterations))
+                await main.ingestion_buffer.flush()
+
+                batch_size = main.ingestion_buffer.batch_size
+                flush_samples = []
+                for _ in range(max(5, args.iterations // 100)):
+                    for _ in range(batch_size):
+                        main.ingestion_buffer.submit({**reading(random.randint(1, farmers), now), "ts": now})
+                    started = time.perf_counter()
+                    await main.ingestion_buffer.flush()
+                    flush_samples.append((time.perf_counter() - started) * 1000)
+                record(f"ingest_flush[rows={size}]", flush_samples)
+
+                async def get():
+                    response = await client.get("/api/soil-data", params={"farmer_id": random.randint(1, farmers)})
+                    assert response.status_code == 200, response.text
+
+                record(f"get_soil_data[rows={size}]", await measure(get, args.iterations))
+
+                # Drop what the benchmarks wrote, so the next size starts from exactly its row count
+                with engine.begin() as conn:
+                    conn.execute(delete(table).where(table.c.ts > end_time))
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rows": sizes,
+            "farmers": args.farmers,
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float, metric: str = "p50_ms") -> bool:
+    """Print a side-by-side table; returns True if any benchmark regressed."""
+    base_meta, cur_meta = baseline.get("meta", {}), current.get("meta", {})
+    print(f"baseline {base_meta.get('git_commit')} ({base_meta.get('database')}, {base_meta.get('created', '')[:19]})"
+          f"  vs  current {cur_meta.get('git_commit')} ({cur_meta.get('database')}, {cur_meta.get('created', '')[:19]})")
+    if base_meta.get("database") != cur_meta.get("database") or base_meta.get("platform") != cur_meta.get("platform"):
+        print("warning: results come from different databases or machines")
+
+    regressed = False
+    print(f"\n{'benchmark':<44} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(set(baseline["results"]) | set(current["results"])):
+        base, cur = baseline["results"].get(name), current["results"].get(name)
+        if base is None or cur is None:
+            print(f"{name:<44} {'-' if base is None else f'{base[metric]:.3f} ms':>12} {'-' if cur is None else f'{cur[metric]:.3f} ms':>12}")
+            continue
+        change = (cur[metric] - base[metric]) / base[metric] if base[metric] else 0.0
+        flag = ""
+        if change > threshold and cur[metric] - base[metric] >= min_delta_ms:
+            flag, regressed = "  REGRESSION", True
+        elif change < -threshold and base[metric] - cur[metric] >= min_delta_ms:
+            flag = "  faster"
+        print(f"{name:<44} {base[metric]:>9.3f} ms {cur[metric]:>9.3f} ms {change:>+8.1%}{flag}")
+    return regressed
+
+
+def load_json(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite and write a JSON result file")
+    run.add_argument("--rows", default="1000,100000", help="comma-separated soil_data sizes, e.g. 1000,100000,1000000,10000000")
+    run.add_argument("--farmers", type=int, default=1000)
+    run.add_argument("--iterations", type=int, default=1000, help="timed calls per benchmark")
+    run.add_argument("--url", default=None, help="database URL (default: throwaway SQLite file)")
+    run.add_argument("--output", default=None, help=f"result file (default: {os.path.relpath(RESULTS_DIR)}/<database>-<time>.json)")
+    run.add_argument("--baseline", default=None, help="compare against this result file after the run")
+
+    for command in (run, commands.add_parser("compare", help="compare two result files")):
+        command.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown as a fraction")
+        command.add_argument("--min-delta-ms", type=float, default=0.01, help="ignore slowdowns smaller than this")
+        command.add_argument("--metric", default="p50_ms", choices=("mean_ms", "p50_ms", "p95_ms", "p99_ms"))
+    commands.choices["compare"].add_argument("baseline_file")
+    commands.choices["compare"].add_argument("current_file")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        regressed = compare(load_json(args.baseline_file), load_json(args.current_file), args.threshold, args.min_delta_ms, args.metric)
+        sys.exit(1 if regressed else 0)
+
+    # Point the app at the benchmark database before main.py is imported
+    os.environ["DATABASE_URL"] = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='agrisphere-bench-'), 'bench.db')}"
+    os.environ["SOIL_DATA_MAINTENANCE_INTERVAL"] = "0"
+    os.environ["INGEST_BUFFER_SIZE"] = str(10 ** 7)
+    os.environ.pop("GEMINI_API_KEY", None)
+    report = asyncio.run(run_suite(args))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{report['meta']['database']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        print()
+        sys.exit(1 if compare(load_json(args.baseline), report, args.threshold, args.min_delta_ms, args.metric) else 0)
+
+
+if __name__ == "__main__":
+    main()
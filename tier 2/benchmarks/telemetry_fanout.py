@@ -0,0 +1,173 @@
+"""
+Load test: live telemetry fan-out to many concurrent dashboard subscribers.
+
+--transport hub (default) subscribes --subscribers consumers directly on a TelemetryHub and
+publishes --readings readings spread over --farmers farmers, measuring publish cost,
+publish-to-receive latency and drops. --slow makes that share of consumers take
+--slow-delay seconds per message, to show the per-connection queue absorbing them
+(drop-oldest + "lagged" notice) without slowing anyone else down.
+
+--transport websocket runs the full app under Uvicorn on a local port with a throwaway
+SQLite database, opens real /ws/telemetry connections and ingests through POST
+/api/soil-data. Raise the open-files limit first (`ulimit -n 65536`) for 10k sockets.
+
+    python -m benchmarks.telemetry_fanout [--subscribers 10000] [--farmers 100] [--readings 5000] [--slow 0.05]
+    python -m benchmarks.telemetry_fanout --transport websocket --subscribers 2000 --readings 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def reading(farmer_id: int) -> dict:
+    # The node timestamp carries the send time, so subscribers can measure end-to-end latency
+    return {
+        "farmer_id": farmer_id, "moisture": round(random.uniform(35, 55), 1), "temp": 25.0, "humidity": 60.0,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class Consumer:
+    def __init__(self, slow_delay: float = 0.0):
+        self.slow_delay = slow_delay
+        self.latencies = []
+        self.lagged = 0
+
+    def receive(self, message: str):
+        data = json.loads(message)
+        if data["type"] == "lagged":
+            self.lagged += data["dropped"]
+        elif data["type"] == "reading":
+            sent = datetime.fromisoformat(data["reading"]["timestamp"])
+            self.latencies.append((datetime.now(timezone.utc) - sent).total_seconds())
+
+
+def report(consumers, elapsed: float, readings: int, publish_us=None):
+    delivered = sum(len(c.latencies) for c in consumers)
+    latencies = sorted(l for c in consumers if not c.slow_delay for l in c.latencies)
+    print(f"readings published  {readings:,} in {elapsed:.2f} s ({readings / elapsed:,.0f}/s)")
+    if publish_us:
+        print(f"publish() cost      p50 {statistics.median(publish_us):.1f} us   max {max(publish_us):.1f} us")
+    print(f"messages delivered  {delivered:,} ({delivered / elapsed:,.0f}/s)")
+    if latencies:
+        p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+        print(f"latency (fast subs) p50 {p(0.5):.1f} ms   p99 {p(0.99):.1f} ms   max {latencies[-1] * 1000:.1f} ms")
+    slow = [c for c in consumers if c.slow_delay]
+    if slow:
+        print(f"slow consumers      {len(slow):,}, {sum(c.lagged for c in slow):,} messages dropped for them "
+              f"({sum(c.lagged for c in consumers if not c.slow_delay):,} for the rest)")
+
+
+async def run_hub(args):
+    from services.telemetry_pubsub import TelemetryHub
+
+    hub = TelemetryHub(max_queue=args.queue)
+    consumers, tasks = [], []
+    for i in range(args.subscribers):
+        consumer = Consumer(args.slow_delay if random.random() < args.slow else 0.0)
+        subscription = hub.subscribe(i % args.farmers)
+
+        async def consume(consumer=consumer, subscription=subscription):
+            while True:
+                consumer.receive(await subscription.get())
+                if consumer.slow_delay:
+                    await asyncio.sleep(consumer.slow_delay)
+
+        consumers.append(consumer)
+        tasks.append(asyncio.create_task(consume()))
+
+    publish_us = []
+    interval = 1 / args.rate
+    started = time.perf_counter()
+    for n in range(args.readings):
+        message = {"type": "reading", "reading": reading(n % args.farmers)}
+        t = time.perf_counter()
+        hub.publish(message["reading"]["farmer_id"], message)
+        publish_us.append((time.perf_counter() - t) * 1e6)
+        await asyncio.sleep(max(0.0, started + (n + 1) * interval - time.perf_counter()))
+    await asyncio.sleep(0.5)  # let the fast consumers drain
+    elapsed = time.perf_counter() - started
+    for task in tasks:
+        task.cancel()
+    report(consumers, elapsed, args.readings, publish_us)
+    print(f"hub stats           {hub.stats()}")
+
+
+def start_app() -> int:
+    _db_dir = tempfile.mkdtemp(prefix="agrisphere-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+    os.environ.pop("GEMINI_API_KEY", None)
+    import uvicorn
+
+    import main
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="error", backlog=4096))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return port
+
+
+async def run_websocket(args):
+    import httpx
+    import websockets
+
+    port = start_app()
+    consumers, sockets, tasks = [], [], []
+    for i in range(args.subscribers):
+        consumer = Consumer(args.slow_delay if random.random() < args.slow else 0.0)
+        sockets.append(await websockets.connect(f"ws://127.0.0.1:{port}/ws/telemetry?farmer_id={i % args.farmers}", max_queue=1))
+
+        async def consume(consumer=consumer, ws=sockets[-1]):
+            async for message in ws:
+                consumer.receive(message)
+                if consumer.slow_delay:
+                    await asyncio.sleep(consumer.slow_delay)
+
+        consumers.append(consumer)
+        tasks.append(asyncio.create_task(consume()))
+    print(f"{len(sockets):,} websocket subscribers connected")
+
+    interval = 1 / args.rate
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        for n in range(args.readings):
+            await client.post("/api/soil-data", json=reading(n % args.farmers))
+            await asyncio.sleep(max(0.0, started + (n + 1) * interval - time.perf_counter()))
+        await asyncio.sleep(1.0)
+        elapsed = time.perf_counter() - started
+        print(f"server stats        {(await client.get('/api/telemetry-stream/stats')).json()}")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+    report(consumers, elapsed, args.readings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=("hub", "websocket"), default="hub")
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--farmers", type=int, default=100, help="subscribers are spread evenly over this many farmers")
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=1000, help="readings published per second")
+    parser.add_argument("--queue", type=int, default=20, help="per-subscriber queue, hub transport (the server uses TELEMETRY_SUBSCRIBER_QUEUE)")
+    parser.add_argument("--slow", type=float, default=0.05, help="share of subscribers that consume slowly")
+    parser.add_argument("--slow-delay", type=float, default=1.0, help="seconds a slow subscriber spends per message")
+    args = parser.parse_args()
+    random.seed(42)
+    asyncio.run(run_hub(args) if args.transport == "hub" else run_websocket(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 import os
-from sqlalchemy import create_engine
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 # Use DATABASE_URL from environment, fallback to SQLite for local dev if not set
@@ -13,6 +17,54 @@ if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
 else:
     engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
 
+from services import metrics
+
+if metrics.METRICS_ENABLED:
+    # Query time per statement type and pool checkout/hold time, exported at /metrics
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _observe_query(conn, cursor, statement, parameters, context, executemany):
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        metrics.db_queries.observe(time.perf_counter() - context._metrics_started, keyword)
+
+    @event.listens_for(engine, "checkout")
+    def _observe_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.db_checkouts.inc()
+        connection_record.info["metrics_checked_out"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _observe_checkin(dbapi_connection, connection_record):
+        checked_out = connection_record.info.pop("metrics_checked_out", None)
+        if checked_out is not None:
+            metrics.db_connection_held.observe(time.perf_counter() - checked_out)
+
+    metrics.REGISTRY.gauge(
+        "agrisphere_db_connections_checked_out", "Connections currently checked out of the SQLAlchemy pool.",
+        function=lambda: {(): engine.pool.checkedout()} if hasattr(engine.pool, "checkedout") else {},
+    )
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+# Bounded pool for blocking Session work, so async route handlers never stall the event loop.
+# Sized to SQLAlchemy's default connection pool (5 + 10 overflow) so threads don't queue on checkout.
+DB_THREADS = int(os.getenv("DB_THREADS", "15"))
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    if not metrics.METRICS_ENABLED:
+        return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+    submitted = time.perf_counter()
+
+    def timed():
+        # How long the call queued for a free executor thread
+        metrics.db_executor_wait.observe(time.perf_counter() - submitted)
+        return fn(*args, **kwargs)
+
+    return await loop.run_in_executor(db_executor, timed)
@@ -0,0 +1,231 @@
+"""
+Fleet-wide precompute of the DSS Stage-1 recommendations into dss_recommendations.
+
+    python dss_precompute.py [--region Central] [--month 6] [--chunk-size 2000] [--workers 4]
+
+Run nightly (cron / a scheduled container) ahead of the morning rush. Farmers are walked by
+id in chunks; for each chunk the job reads every farmer's latest reading, skips farmers whose
+stored recommendation was computed from that same reading, scores the rest across a process
+pool and upserts the results. /api/dss-insight serves these rows and only recomputes when a
+farmer has newer telemetry.
+
+Because unchanged farmers are skipped, re-running after an interrupt resumes the work: only
+farmers that were not written yet (or got new readings since) are computed again.
+
+With MARKET_API_URL set, each chunk's readings are ranked first and only the forecasts of the
+crops that come out on top are fetched (one bulk request for the ones not fetched earlier in
+the run), not the whole registry.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+from services.crop_prediction import FEATURES
+from services.market_api import REGION_PATTERN, canonical_region
+from services.market_client import build_market_client
+from services.reasoning_engine import build_decision, market_candidates
+
+logger = logging.getLogger(__name__)
+
+READING_COLUMNS = ("id", "farmer_id", "ts") + FEATURES
+
+
+def stale_readings(conn, farmer_ids: List[int], region: str, month: int, force: bool = False) -> List[Dict]:
+    """Latest reading of each farmer in `farmer_ids` that has no recommendation computed from it yet."""
+    raw_table = models.SoilDataDB.__table__
+    farmers_table = models.FarmerDB.__table__
+    farmers = farmers_table.c
+    recs_table = models.DssRecommendationDB.__table__
+    recs = recs_table.c
+    # One probe of ix_soil_data_farmer_id_ts (farmer_id, ts DESC, id DESC) per farmer, instead of ranking every reading
+    raw = raw_table.alias("newest").c
+    newest = (
+        select(*[raw[name] for name in READING_COLUMNS])
+        .where(raw.farmer_id == farmers.id, raw.ts.isnot(None))
+        .order_by(raw.ts.desc(), raw.id.desc())
+        .limit(1)
+        .correlate(farmers_table)
+    )
+    if conn.dialect.name == "postgresql":
+        latest = newest.lateral("latest")
+        source = farmers_table.join(latest, true())
+    else:  # SQLite has no LATERAL: the same probe as a correlated subquery for the reading's id
+        latest = raw_table
+        source = farmers_table.join(raw_table, raw_table.c.id == newest.with_only_columns(raw.id).scalar_subquery())
+    statement = (
+        select(*[latest.c[name] for name in READING_COLUMNS])
+        .select_from(source.outerjoin(recs_table, and_(
+            recs.farmer_id == farmers.id,
+            recs.region == region,
+            recs.month == month,
+        )))
+        .where(farmers.id.in_(farmer_ids))
+    )
+    if not force:
+        statement = statement.where(or_(recs.reading_id.is_(None), recs.reading_id != latest.c.id))
+    return [dict(row._mapping) for row in conn.execute(statement)]
+
+
+class MarketPrefetch:
+    """Forecasts fetched so far in this run, by crop; one market client and event loop for the whole run."""
+
+    def __init__(self, region: str, month: int):
+        self.region = region
+        self.month = month
+        self.client = build_market_client()
+        self.details: Dict[str, Dict] = {}
+        self._loop = asyncio.new_event_loop() if self.client is not None else None
+
+    def for_readings(self, readings: List[Dict]) -> Optional[Dict[str, Dict]]:
+        """Forecasts covering the best-ranked crop of every reading (None without MARKET_API_URL)."""
+        if self.client is None:
+            return None
+        missing = [crop for crop in market_candidates(readings) if crop not in self.details] if readings else []
+        if missing:
+            self.details.update(self._loop.run_until_complete(self.client.get_forecasts(missing, self.region, self.month)))
+        return self.details
+
+    def close(self):
+        if self.client is not None:
+            self._loop.run_until_complete(self.client.aclose())
+            self._loop.close()
+
+
+def compute_chunk(readings: List[Dict], region: str, month: int, market_details: Optional[Dict[str, Dict]] = None):
+    """Runs in a pool process: Stage-1 for each reading. Returns (rows to upsert, error count)."""
+    computed_at = datetime.now(timezone.utc)
+    rows, errors = [], 0
+    for reading in readings:
+        try:
+            decision, prompt_inputs = build_decision(SimpleNamespace(**reading), region, month, market_details)
+        except Exception:
+            errors += 1  # e.g. a legacy reading without N/P/K
+            continue
+        rows.append({
+            "farmer_id": reading["farmer_id"],
+            "region": region,
+            "month": month,
+            "reading_id": reading["id"],
+            "reading_ts": reading["ts"],
+            "decision": decision,
+            "prompt_inputs": prompt_inputs,
+            "computed_at": computed_at,
+        })
+    return rows, errors
+
+
+def upsert_recommendations(engine, rows: List[Dict]):
+    if not rows:
+        return
+    table = models.DssRecommendationDB.__table__
+    insert_fn = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert_fn(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["farmer_id", "region", "month"],
+        set_={name: stmt.excluded[name] for name in ("reading_id", "reading_ts", "decision", "prompt_inputs", "computed_at")},
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt, rows)
+
+
+def precompute(engine, region: str, month: int, chunk_size: int = 2000, workers: Optional[int] = None,
+               start_after: int = 0, force: bool = False) -> Dict:
+    """
+    Walk all farmers and refresh their recommendations. workers=0 computes in-process.
+    Database reads and writes stay in this process; pool processes only run build_decision().
+    """
+    region = canonical_region(region)
+    farmers = models.FarmerDB.__table__.c
+    summary = {"farmers": 0, "computed": 0, "skipped": 0, "errors": 0, "last_farmer_id": start_after}
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+    pending = {}
+    max_pending = (workers or os.cpu_count() or 1) * 2
+    market = MarketPrefetch(region, month)
+
+    def collect(futures):
+        for future in futures:
+            rows, errors = future.result()
+            upsert_recommendations(engine, rows)
+            summary["computed"] += len(rows)
+            summary["errors"] += errors
+            pending.pop(future)
+
+    try:
+        last_id = start_after
+        while True:
+            with engine.connect() as conn:
+                farmer_ids = conn.execute(
+                    select(farmers.id).where(farmers.id > last_id).order_by(farmers.id).limit(chunk_size)
+                ).scalars().all()
+                if not farmer_ids:
+                    break
+                readings = stale_readings(conn, farmer_ids, region, month, force)
+            last_id = farmer_ids[-1]
+            summary["farmers"] += len(farmer_ids)
+            summary["skipped"] += len(farmer_ids) - len(readings)
+            market_details = market.for_readings(readings)
+
+            if pool is None:
+                rows, errors = compute_chunk(readings, region, month, market_details)
+                upsert_recommendations(engine, rows)
+                summary["computed"] += len(rows)
+                summary["errors"] += errors
+            elif readings:
+                # Keep a bounded number of chunks in flight so reading the next chunk overlaps the scoring
+                pending[pool.submit(compute_chunk, readings, region, month, market_details)] = last_id
+                if len(pending) >= max_pending:
+                    wait(pending, return_when=FIRST_COMPLETED)
+                collect([future for future in pending if future.done()])
+
+            elapsed = time.perf_counter() - started
+            logger.info(
+                "farmers %d (up to id %d): %d computed, %d unchanged, %.0f rows/s",
+                summary["farmers"], last_id, summary["computed"], summary["skipped"], summary["computed"] / elapsed if elapsed else 0,
+            )
+        collect(list(pending))
+        summary["last_farmer_id"] = last_id
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        market.close()
+
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = round(elapsed, 2)
+    summary["rows_per_sec"] = round(summary["computed"] / elapsed, 1) if elapsed else 0.0
+    return summary
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Precompute DSS Stage-1 recommendations for every farmer")
+    parser.add_argument("--region", default="Central")
+    parser.add_argument("--month", type=int, default=datetime.now(timezone.utc).month)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None, help="pool processes (default: one per CPU; 0 computes in-process)")
+    parser.add_argument("--start-after", type=int, default=0, help="skip farmers up to this id")
+    parser.add_argument("--force", action="store_true", help="recompute farmers whose recommendation is current")
+    args = parser.parse_args()
+    if not re.match(REGION_PATTERN, args.region):
+        parser.error(f"invalid --region {args.region!r}")
+
+    models.Base.metadata.create_all(bind=engine, tables=[models.DssRecommendationDB.__table__])
+    try:
+        print(precompute(engine, args.region, args.month, args.chunk_size, args.workers, args.start_after, args.force))
+    except KeyboardInterrupt:
+        print("Interrupted; re-run the same command to resume (finished farmers are skipped).")
+        raise SystemExit(130)
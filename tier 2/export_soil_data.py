@@ -0,0 +1,109 @@
+"""
+Bulk telemetry export for model training, and re-scoring of an export with the DSS services.
+
+    python export_soil_data.py export -o soil.parquet [--farmers 1,2,3] [--from 2024-01-01] [--to 2024-07-01] [--fields ...]
+    python export_soil_data.py rescore soil.parquet -o scores.csv [--top-k 3] [--crop Tomato]
+
+`export` streams soil_data straight from the database (DATABASE_URL) to a CSV, Parquet or
+Arrow IPC file, picked by the file extension or --format, in constant memory (see
+telemetry_export.py). GET /api/soil-data/export serves the same bytes over HTTP.
+
+`rescore` reads an export back chunk by chunk and ranks crops for every reading with
+rank_crops() (the same scoring as /api/predict-crop), plus the fertilizer deficit of the
+reading for --crop. The output is CSV.
+"""
+import argparse
+import csv
+import time
+from datetime import datetime, timezone
+
+import telemetry_export
+
+
+def _parse_time(value):
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed
+
+
+def export(args):
+    from database import engine
+
+    fmt = args.format or telemetry_export.format_for_path(args.output)
+    telemetry_export.check_format(fmt)
+    farmer_ids = [int(farmer) for farmer in args.farmers.split(",")] if args.farmers else None
+    fields = [field.strip() for field in args.fields.split(",")] if args.fields else None
+    unknown = [field for field in fields or () if field not in telemetry_export.FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    written = 0
+    with open(args.output, "wb") as f:
+        for data in telemetry_export.stream_export(engine, fmt, farmer_ids, _parse_time(args.start), _parse_time(args.end), fields, args.chunk_rows):
+            f.write(data)
+            written += len(data)
+    print(f"Wrote {written:,} bytes of {fmt} to {args.output} in {time.perf_counter() - started:.1f} s")
+
+
+def rescore(args):
+    from services.crop_prediction import rank_crops, readings_matrix
+    from services.crop_registry import get_registry
+    from services.fertilizer_optimizer import calculate_fertilizer_deficit
+
+    names = get_registry().names
+    rows = 0
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        header = ["id", "farmer_id", "ts"]
+        for rank in range(1, args.top_k + 1):
+            header += [f"crop_{rank}", f"score_{rank}"]
+        writer.writerow(header + [f"{args.crop.lower()}_fertilizer"])
+
+        for chunk in telemetry_export.read_chunks(args.input, args.format, args.chunk_rows):
+            order, scores = rank_crops(readings_matrix(chunk), args.top_k)  # one vectorized pass per chunk
+            for reading, crops, crop_scores in zip(chunk, order.tolist(), scores.tolist()):
+                ts = reading.get("ts")
+                line = [reading.get("id"), reading.get("farmer_id"), ts.isoformat() if ts is not None else None]
+                for crop, score in zip(crops, crop_scores):
+                    line += [names[crop], int(score)]
+                npk = (reading.get("nitrogen"), reading.get("phosphorus"), reading.get("potassium"))
+                if None in npk:
+                    writer.writerow(line + [None])  # older firmware: no NPK probe
+                    continue
+                fertilizer = calculate_fertilizer_deficit(args.crop, *npk)
+                writer.writerow(line + [fertilizer.get("recommendation", fertilizer.get("error"))])
+            rows += len(chunk)
+    print(f"Re-scored {rows:,} readings into {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subcommands.add_parser("export", help="stream soil_data to a CSV, Parquet or Arrow file")
+    export_parser.add_argument("-o", "--output", required=True, help="file to write; .csv, .parquet or .arrow")
+    export_parser.add_argument("--format", choices=tuple(telemetry_export.FORMATS), help="default: from the file extension")
+    export_parser.add_argument("--farmers", help="comma-separated farmer ids (default: all farmers)")
+    export_parser.add_argument("--from", dest="start", help="ISO date/time, inclusive (UTC unless an offset is given)")
+    export_parser.add_argument("--to", dest="end", help="ISO date/time, exclusive")
+    export_parser.add_argument("--fields", help=f"comma-separated columns (default: {','.join(telemetry_export.DEFAULT_FIELDS)})")
+    export_parser.add_argument("--chunk-rows", type=int, default=telemetry_export.DEFAULT_CHUNK_ROWS, help="rows per fetch / row group")
+    export_parser.set_defaults(handler=export)
+
+    rescore_parser = subcommands.add_parser("rescore", help="rank crops for every reading of an export")
+    rescore_parser.add_argument("input", help="a file written by `export` (or by GET /api/soil-data/export)")
+    rescore_parser.add_argument("-o", "--output", required=True, help="CSV file to write")
+    rescore_parser.add_argument("--format", choices=tuple(telemetry_export.FORMATS), help="default: from the file extension")
+    rescore_parser.add_argument("--top-k", type=int, default=3)
+    rescore_parser.add_argument("--crop", default="Tomato", help="crop for the fertilizer recommendation column")
+    rescore_parser.add_argument("--chunk-rows", type=int, default=telemetry_export.DEFAULT_CHUNK_ROWS)
+    rescore_parser.set_defaults(handler=rescore)
+
+    args = parser.parse_args()
+    try:
+        args.handler(args)
+    except Exception as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
@@ -7,6 +7,14 @@ export const getSoilData = async (farmerId) => {
     return response.data;
 };
 
+// Live push of new readings and alerts for one farmer; returns the WebSocket (call .close() to stop)
+export const openTelemetrySocket = (farmerId, onMessage) => {
+    const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${scheme}://${window.location.hostname}:8000/ws/telemetry?farmer_id=${farmerId}`);
+    socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+    return socket;
+};
+
 export const getPredictCrop = async (farmerId) => {
     const response = await axios.get(`${API_BASE}/predict-crop?farmer_id=${farmerId}`);
     return response.data;
@@ -27,6 +35,16 @@ export const getDssInsight = async (farmerId) => {
     return response.data;
 };
 
+export const createDssInsightJob = async (farmerId) => {
+    const response = await axios.post(`${API_BASE}/dss-insight/jobs?farmer_id=${farmerId}`);
+    return response.data;
+};
+
+export const getDssInsightJob = async (jobId) => {
+    const response = await axios.get(`${API_BASE}/dss-insight/jobs/${jobId}`);
+    return response.data;
+};
+
 export const getDssCustomCropInsight = async (farmerId, targetCrop) => {
     const response = await axios.get(`${API_BASE}/dss-custom-crop-insight?farmer_id=${farmerId}&target_crop=${targetCrop}`);
     return response.data;
@@ -1,5 +1,5 @@
 import { useEffect, useState } from 'react';
-import { getSoilData, getDisasterAlerts, getDssInsight, getDssCustomCropInsight } from '../api';
+import { getSoilData, getDisasterAlerts, openTelemetrySocket, createDssInsightJob, getDssInsightJob, getDssCustomCropInsight } from '../api';
 import { Droplets, Thermometer, CloudRain, Activity, AlertTriangle, LineChart as ChartIcon, Leaf, Beaker, Zap, CloudDrizzle, BrainCircuit, MapPin, Sun, Wind, Waves, Battery, Target } from 'lucide-react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 
@@ -31,8 +31,14 @@ function Dashboard({ farmerId, farmerName }) {
         if (!farmerId) return;
         setIsGettingInsight(true);
         try {
-            const data = await getDssInsight(farmerId);
-            setDssInsight(data);
+            // Job mode: the scores come back immediately, the AI narrative is polled for
+            let job = await createDssInsightJob(farmerId);
+            setDssInsight({ ...job.result, explanation: job.result.explanation || "Generating AI explanation..." });
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise((resolve) => setTimeout(resolve, 1000));
+                job = await getDssInsightJob(job.job_id);
+            }
+            setDssInsight({ ...job.result, explanation: job.status === 'done' ? job.result.explanation : `AI explanation unavailable: ${job.error}` });
         } catch (err) {
             setDssInsight({ explanation: "Failed to load Decision Support Insight.", crop_scores: [], recommended_crop: 'N/A', fertilizer_plan: 'Error loading plan' });
         } finally {
@@ -53,11 +59,41 @@ function Dashboard({ farmerId, farmerName }) {
         }
     };
 
+    const applyTelemetryMessage = (message) => {
+        if (message.type === 'reading') {
+            setSoilData((rows) => [...rows, message.reading].slice(-50));
+        } else if (message.type === 'alert') {
+            const { action, ...alert } = message.alert;
+            setAlerts((current) => {
+                const others = current.filter((a) => a.rule !== alert.rule);
+                return action === 'fire' ? [alert, ...others] : others;
+            });
+        } else if (message.type === 'lagged') {
+            fetchTelemetry(); // missed some deltas, re-sync from the API
+        }
+    };
+
     useEffect(() => {
-        fetchTelemetry(); // Initial poll
-        const interval = setInterval(fetchTelemetry, 28800000);
-        return () => clearInterval(interval);
-    }, []);
+        fetchTelemetry(); // Initial snapshot, then live deltas over the socket
+        let socket = null;
+        let retryTimer = null;
+        let closed = false;
+        const connect = (delay) => {
+            socket = openTelemetrySocket(farmerId, applyTelemetryMessage);
+            socket.onopen = () => { delay = 1000; };
+            socket.onclose = () => {
+                if (closed) return;
+                // Reconnect with backoff and re-sync whatever arrived while disconnected
+                retryTimer = setTimeout(() => { fetchTelemetry(); connect(Math.min(delay * 2, 30000)); }, delay);
+            };
+        };
+        if (farmerId) connect(1000);
+        return () => {
+            closed = true;
+            clearTimeout(retryTimer);
+            if (socket) socket.close();
+        };
+    }, [farmerId]);
 
     const latestData = soilData.length > 0 ? soilData[soilData.length - 1] : {
         moisture: 0, temp: 0, humidity: 0, ph: 0,
@@ -12,11 +12,45 @@ const char *API_URL =
     "http://YOUR_BACKEND_IP:8000/api/soil-data"; // Replace with actual server
                                                  // IP mapped for your Farm
 
+// Uncomment to send compact MessagePack frames over UDP to the backend's binary
+// ingestion gateway (BINARY_INGEST_UDP_PORT) instead of JSON over HTTP
+// #define USE_BINARY_UDP
+#ifdef USE_BINARY_UDP
+#include <WiFiUdp.h>
+const char *GATEWAY_HOST = "YOUR_BACKEND_IP";
+const uint16_t GATEWAY_PORT = 5684;
+WiFiUDP udp;
+
+// Minimal MessagePack writer for the {field id: scaled integer} frame described
+// in services/telemetry_codec.py
+static size_t packInt(uint8_t *out, int32_t v) {
+  if (v >= 0 && v < 128) { // positive fixint
+    out[0] = (uint8_t)v;
+    return 1;
+  }
+  out[0] = 0xd2; // int32, big-endian
+  out[1] = (uint8_t)(v >> 24);
+  out[2] = (uint8_t)(v >> 16);
+  out[3] = (uint8_t)(v >> 8);
+  out[4] = (uint8_t)v;
+  return 5;
+}
+
+static size_t packField(uint8_t *out, uint8_t fieldId, float value, int scale) {
+  out[0] = fieldId; // field ids < 128 are one-byte fixints
+  return 1 + packInt(out + 1, (int32_t)lroundf(value * scale));
+}
+#endif
+
 // Hardware Multi-Tenancy Identity
 // This aligns the physical node with a specific registered farmer in the
 // PostgreSQL database.
 const int FARMER_ID = 1;
 
+// Sent with every reading so the backend can drop retried uploads of it.
+// Seeded randomly at boot, so numbers used before a reset aren't reused.
+int32_t readingSeq = 0;
+
 // DHT22 Pin & Type
 #define DHTPIN 4
 #define DHTTYPE DHT22
@@ -48,6 +82,8 @@ void setup() {
   // Set ADC resolution (ESP32 default is 12-bit: 0-4095)
   analogReadResolution(12);
 
+  readingSeq = (int32_t)(esp_random() & 0x3FFFFFFF);
+
   // Connect to WiFi network
   WiFi.begin(ssid, password);
   Serial.print("Connecting to WiFi");
@@ -94,6 +130,32 @@ void loop() {
   Serial.printf("Soil Moisture: %d %% (Analog: %d)\n", moisturePercent,
                 soilAnalog);
   Serial.printf("Soil pH: %.2f (Voltage: %.2fV)\n", soilPH, phVoltage);
+  readingSeq++;
+
+#ifdef USE_BINARY_UDP
+  // --- Send Binary Frame --- (~25 bytes instead of a full HTTP request)
+  // No timestamp field until the node syncs NTP: the gateway uses the receive time.
+  uint8_t frame[40];
+  size_t len = 0;
+  frame[len++] = 0x80 | 6; // fixmap with 6 entries
+  len += packField(frame + len, 1, FARMER_ID, 1);
+  len += packField(frame + len, 3, moisturePercent, 100);
+  len += packField(frame + len, 4, temp, 100);
+  len += packField(frame + len, 5, humidity, 100);
+  len += packField(frame + len, 6, soilPH, 100);
+  frame[len++] = 18; // seq
+  len += packInt(frame + len, readingSeq);
+
+  if (WiFi.status() == WL_CONNECTED) {
+    udp.beginPacket(GATEWAY_HOST, GATEWAY_PORT);
+    udp.write(frame, len);
+    udp.endPacket();
+    Serial.printf("UDP frame sent (%u bytes)\n", (unsigned)len);
+  } else {
+    Serial.println("WiFi Disconnected. Cannot send data.");
+  }
+  return;
+#endif
 
   // --- Create JSON Payload ---
   // Add the node's hardcoded owner ID so the backend correctly assigns this
@@ -104,6 +166,7 @@ void loop() {
   requestBody += "\"temp\": " + String(temp) + ",";
   requestBody += "\"humidity\": " + String(humidity) + ",";
   requestBody += "\"ph\": " + String(soilPH) + ",";
+  requestBody += "\"seq\": " + String(readingSeq) + ",";
   requestBody +=
       "\"timestamp\": \"2023-10-27T10:00:00Z\""; // Placeholder, real app would
                                                  // sync NTP
@@ -115,7 +178,16 @@ void loop() {
     http.begin(serverUrl);
     http.addHeader("Content-Type", "application/json");
 
-    int httpResponseCode = http.POST(requestBody);
+    // Retry transient failures with the same body (same seq); the backend
+    // stores a reading once however many copies arrive
+    int httpResponseCode = -1;
+    for (int attempt = 0; attempt < 3; attempt++) {
+      httpResponseCode = http.POST(requestBody);
+      if (httpResponseCode > 0 && httpResponseCode < 500 && httpResponseCode != 429) {
+        break;
+      }
+      delay(500 << attempt);
+    }
 
     if (httpResponseCode > 0) {
       Serial.printf("HTTP Response code: %d\n", httpResponseCode);
@@ -1,35 +1,167 @@
-from fastapi import FastAPI, HTTPException, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request, Query, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 import database
 import models
+import telemetry_storage
+import telemetry_history
+import telemetry_reads
+import telemetry_export
 import os
+import asyncio
+import anyio
+import logging
+import json
 import random
-from datetime import datetime, timedelta
-import google.generativeai as genai
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 from dotenv import load_dotenv
 
 from services.crop_prediction import predict_crop_suitability
 from services.fertilizer_optimizer import calculate_fertilizer_deficit
-from services.reasoning_engine import generate_decision
+from services.reasoning_engine import generate_cached, build_decision, explain_decision, market_candidates
+from services.ingestion import IngestionBuffer, BufferFullError, DuplicateReadingError, dedup_key
+from services.latest_cache import build_latest_cache, reading_epoch
+from services.llm_cache import build_llm_cache, cache_key
+from services.insight_jobs import InsightJobQueue, JobQueueFullError
+from services.market_client import build_market_client
+from services.market_api import REGION_PATTERN, canonical_region
+from services.crop_registry import get_registry
+from services.alert_engine import build_alert_engine, event_to_dict
+from services.telemetry_pubsub import build_telemetry_hub
+from services.binary_ingest import build_binary_gateway
+from services.admission import RateLimitedError, build_admission_controller, retry_after_header
+from services import metrics
+from services.gemini_client import LazyGeminiModel, build_gemini_model
+from services.llm_gateway import LLMUnavailableError, build_llm_gateway
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-# Configure Gemini
-api_key = os.environ.get("GEMINI_API_KEY", "")
-if api_key:
-    genai.configure(api_key=api_key)
-    # Using 'gemini-2.5-flash-lite' as the new API key doesn't support 1.5 versions
-    gemini_model = genai.GenerativeModel("gemini-2.5-flash-lite")
-else:
-    gemini_model = None
+# Gemini client, built on first use / warmed after startup (None without GEMINI_API_KEY; GEMINI_MODEL=fake for load tests)
+gemini_model = build_gemini_model()
+# Every prompt goes through the gateway: concurrency cap, deadline, retries, circuit breaker (None without a model)
+llm_gateway = build_llm_gateway(gemini_model)
+
+# Nothing above touches the database: importing main must work before the DB is reachable.
+# Tables are created at startup (SCHEMA_AUTO_CREATE=1, the dev default), or by the explicit
+# `python manage_soil_data.py setup` step when deploying with SCHEMA_AUTO_CREATE=0.
+SCHEMA_AUTO_CREATE = os.getenv("SCHEMA_AUTO_CREATE", "1").lower() not in ("0", "false", "no")
+
+ROLLUP_LOOKBACK_HOURS = telemetry_storage.maintenance_settings()["lookback_hours"]
+
+# Telemetry is queued in-process and flushed to soil_data in bulk (size-or-time thresholds)
+ingestion_buffer = IngestionBuffer(
+    database.engine,
+    models.SoilDataDB.__table__,
+    max_size=int(os.getenv("INGEST_BUFFER_SIZE", "10000")),
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0")),
+    executor=database.db_executor,
+    dedup_cache_size=int(os.getenv("INGEST_DEDUP_CACHE_SIZE", "100000")),
+    max_attempts=int(os.getenv("INGEST_MAX_ATTEMPTS", "8")),
+    seq_window=float(os.getenv("INGEST_SEQ_DEDUP_WINDOW", "3600")),
+    # Late readings (older than the rollup lookback) mark their hour for the next maintenance run
+    on_insert=lambda conn, rows: telemetry_storage.mark_late_hours(conn, rows, ROLLUP_LOOKBACK_HOURS),
+)
+MAX_BATCH_ROWS = int(os.getenv("INGEST_MAX_BATCH_ROWS", "5000"))
+# A node's clock is only trusted this close to the receive time; placeholder timestamps and RTCs that lost
+# their time fall back to the receive time, so ordering and retention never depend on them
+MAX_CLOCK_AHEAD = timedelta(hours=float(os.getenv("INGEST_MAX_CLOCK_AHEAD_HOURS", "24")))
+MAX_READING_AGE = timedelta(days=float(os.getenv("INGEST_MAX_READING_AGE_DAYS", "30")))
+RAW_RETENTION_DAYS = telemetry_storage.maintenance_settings()["raw_days"]
+if RAW_RETENTION_DAYS:
+    # Never older than raw retention either, or the next maintenance pass would delete a reading as soon as it lands
+    MAX_READING_AGE = min(MAX_READING_AGE, timedelta(days=RAW_RETENTION_DAYS))
+
+# Disaster-alert rules evaluated on every ingested reading; fired / cleared alerts are persisted to `alerts`
+alert_engine = build_alert_engine(database.engine, models.AlertDB.__table__)
+
+# Live push of new readings and alerts to dashboards (/ws/telemetry, /api/soil-data/stream); Redis relay via TELEMETRY_PUBSUB_REDIS_URL
+telemetry_hub = build_telemetry_hub()
+
+# Compact MessagePack frames over UDP / MQTT (BINARY_INGEST_UDP_PORT, BINARY_INGEST_MQTT_URL), same path as POST /api/soil-data
+binary_gateway = build_binary_gateway(lambda record: ingest_binary_reading(record))
+
+# Per-farmer and global token buckets in front of single-reading ingestion (INGEST_RATE_PER_FARMER / INGEST_RATE_GLOBAL; None when both are 0)
+admission = build_admission_controller(lambda row: write_reading(row))
+
+# Latest reading per farmer, written through by ingestion (in-process LRU, or Redis via LATEST_CACHE_REDIS_URL)
+latest_cache = build_latest_cache()
+
+# Gemini answers keyed on the normalized prompt inputs (TTL + LRU, single-flight, stale-while-revalidate); LLM_CACHE_TTL=0 disables
+llm_cache = build_llm_cache()
+
+# Pooled, cached client for the market forecast API (MARKET_API_URL); None keeps the mock forecasts
+market_client = build_market_client()
+
+# Job mode for /api/dss-insight: scores are returned at once, the Gemini narrative is produced by a bounded worker pool
+insight_jobs = InsightJobQueue(
+    workers=int(os.getenv("INSIGHT_JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("INSIGHT_JOB_MAX_PENDING", "1000")),
+    retention=float(os.getenv("INSIGHT_JOB_RETENTION", "600")),
+)
+
+# soil_data partitions / rollups / retention (see telemetry_storage.py); 0 disables the in-app schedule
+SOIL_DATA_MAINTENANCE_INTERVAL = float(os.getenv("SOIL_DATA_MAINTENANCE_INTERVAL", "3600"))
 
-# Create all DB tables
-models.Base.metadata.create_all(bind=database.engine)
+async def soil_data_maintenance_loop():
+    settings = telemetry_storage.maintenance_settings()
+    while True:
+        try:
+            summary = await database.run_db(telemetry_storage.run_maintenance, database.engine, **settings)
+            if summary:
+                logger.info("soil_data maintenance: %s", summary)
+        except Exception:
+            logger.exception("soil_data maintenance failed")
+        await asyncio.sleep(SOIL_DATA_MAINTENANCE_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SCHEMA_AUTO_CREATE:
+        await database.run_db(models.Base.metadata.create_all, bind=database.engine)
+    # create_all never alters an existing soil_data: refuse to start rather than fail (and dead-letter) every flush
+    missing = await database.run_db(telemetry_storage.schema_problems, database.engine)
+    if missing:
+        raise RuntimeError(f"soil_data is missing {', '.join(missing)}; run `python manage_soil_data.py setup` first")
+    # Load the crop registry through Starlette's threadpool: the first request then pays neither for
+    # the registry nor for anyio's lazily imported thread backend (used by sync dependencies like get_db)
+    await anyio.to_thread.run_sync(get_registry)
+    await ingestion_buffer.start()
+    await alert_engine.start()
+    await telemetry_hub.start()
+    await insight_jobs.start()
+    if admission is not None:
+        await admission.start()
+    if binary_gateway is not None:
+        await binary_gateway.start()
+    maintenance_task = asyncio.create_task(soil_data_maintenance_loop()) if SOIL_DATA_MAINTENANCE_INTERVAL > 0 else None
+    # Import google.generativeai off the request path, without delaying readiness
+    gemini_preload = asyncio.create_task(gemini_model.preload()) if isinstance(gemini_model, LazyGeminiModel) else None
+    yield
+    if gemini_preload is not None:
+        gemini_preload.cancel()
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+    if binary_gateway is not None:
+        await binary_gateway.stop()
+    if admission is not None:
+        # Pending coalesced readings go into the buffer before it is drained
+        await admission.stop()
+    await insight_jobs.stop()
+    await alert_engine.stop()
+    await telemetry_hub.stop()
+    if market_client is not None:
+        await market_client.aclose()
+    # Durable shutdown: everything still queued is written before the worker exits
+    await ingestion_buffer.stop()
 
-app = FastAPI(title="AgriSphere API")
+app = FastAPI(title="AgriSphere API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -40,6 +172,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency and in-flight requests for GET /metrics (METRICS_ENABLED=0 turns all instrumentation off)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.REGISTRY.gauge("agrisphere_ingestion_queue_depth", "Readings waiting in the ingestion buffer.",
+                           function=lambda: {(): ingestion_buffer.stats()["queue_depth"]})
+    metrics.REGISTRY.gauge("agrisphere_telemetry_subscribers", "Open live telemetry connections.",
+                           function=lambda: {(): telemetry_hub.stats()["subscribers"]})
+    metrics.REGISTRY.gauge("agrisphere_llm_in_flight", "Gemini calls in flight through the LLM gateway.",
+                           function=lambda: {(): llm_gateway.in_flight} if llm_gateway is not None else {})
+    metrics.REGISTRY.gauge("agrisphere_llm_circuit_open", "1 while the LLM gateway's circuit breaker is open or half-open.",
+                           function=lambda: {(): int(llm_gateway.state != "closed")} if llm_gateway is not None else {})
+
 # Dependency to get DB session
 def get_db():
     db = database.SessionLocal()
@@ -48,6 +192,46 @@ def get_db():
     finally:
         db.close()
 
+# Blocking queries, always called through database.run_db so they execute off the event loop
+# Both are range scans on ix_soil_data_farmer_id_ts (farmer_id, ts DESC, id DESC)
+def query_latest_reading(db: Session, farmer_id: int):
+    return db.query(models.SoilDataDB).filter(models.SoilDataDB.farmer_id == farmer_id, models.SoilDataDB.ts.isnot(None)).order_by(models.SoilDataDB.ts.desc(), models.SoilDataDB.id.desc()).first()
+
+async def get_latest_reading(db: Session, farmer_id: int):
+    # Served from the latest-reading cache; the database is only hit on a miss
+    cached = await latest_cache.get(farmer_id)
+    if cached is not None:
+        return SimpleNamespace(**cached)
+
+    latest = await database.run_db(query_latest_reading, db, farmer_id)
+    if latest is not None:
+        await latest_cache.fill(farmer_id, {c.name: getattr(latest, c.name) for c in models.SoilDataDB.__table__.columns})
+    return latest
+
+def query_farmer_by_phone(db: Session, phone: str):
+    return db.query(models.FarmerDB).filter(models.FarmerDB.phone == phone).first()
+
+def query_recommendation(db: Session, farmer_id: int, region: str, month: int):
+    return db.get(models.DssRecommendationDB, (farmer_id, region, month))
+
+async def compute_stage1_decision(latest, region: str, current_month: int):
+    market_details = None
+    if market_client is not None:
+        # Only the crops ranked first are fetched (one request, or none when cached), not the whole registry
+        market_details = await market_client.get_forecasts(market_candidates([latest]), region, current_month)
+    return build_decision(latest, region, current_month, market_details)
+
+async def get_stage1_decision(db: Session, latest, region: str, current_month: int):
+    # Served from the nightly dss_recommendations table (dss_precompute.py) unless the farmer has newer telemetry.
+    # Matched on the reading's ts rather than its id: a reading written through to the latest cache has no id yet.
+    latest_ts = getattr(latest, "ts", None)
+    if latest_ts is None:
+        return await compute_stage1_decision(latest, region, current_month)
+    precomputed = await database.run_db(query_recommendation, db, latest.farmer_id, region, current_month)
+    if precomputed is not None and precomputed.reading_ts is not None and reading_epoch({"ts": precomputed.reading_ts}) == reading_epoch({"ts": latest_ts}):
+        return dict(precomputed.decision), precomputed.prompt_inputs
+    return await compute_stage1_decision(latest, region, current_month)
+
 # Pydantic Schemas
 class SoilData(BaseModel):
     farmer_id: int
@@ -70,6 +254,7 @@ class SoilData(BaseModel):
     battery_voltage: Optional[float] = None
 
     timestamp: str
+    seq: Optional[int] = None  # Per-node sequence number; makes retries idempotent even without a clock
     
 class SoilDataResponse(SoilData):
     id: int
@@ -84,25 +269,372 @@ class FarmerRegistration(BaseModel):
 class FarmerLogin(BaseModel):
     phone: str
 
-@app.post("/api/soil-data", status_code=201)
-async def receive_soil_data(data: SoilData, db: Session = Depends(get_db)):
+def check_reading_bounds(data: SoilData) -> Optional[str]:
+    # Sanity checks applied to every reading, single or batched
     if data.moisture < 0 or data.moisture > 100:
-        raise HTTPException(status_code=400, detail="Moisture out of bounds (0-100%)")
+        return "Moisture out of bounds (0-100%)"
+    return None
+
+def reading_time(timestamp: str, received: datetime) -> datetime:
+    # The node's time if it parses and is plausible (not over MAX_CLOCK_AHEAD ahead, not over MAX_READING_AGE old), else the receive time
+    device_ts = models.parse_iso_timestamp(timestamp)
+    if device_ts is None or not received - MAX_READING_AGE <= device_ts <= received + MAX_CLOCK_AHEAD:
+        return received
+    return device_ts
+
+def reading_to_row(data: SoilData) -> dict:
+    row = data.dict()
+    seq = row.pop("seq")
+    # Typed timestamp for the (farmer_id, ts) index; the raw string the node sent stays in `timestamp`
+    row["ts"] = reading_time(data.timestamp, datetime.now(timezone.utc))
+    # Idempotency key: a retried upload of this reading is dropped (recent-key filter, then the unique index)
+    row["dedup_key"] = dedup_key(row, seq)
+    if seq is not None:
+        row["seq"] = seq  # not stored; a resend is matched on (farmer_id, seq) whatever its receive time
+    return row
+
+def parse_batch_body(body: bytes) -> List:
+    # Accepts either a JSON array or newline-delimited JSON (one record per line).
+    # Unparseable NDJSON lines are kept as exceptions so they can be rejected per row.
+    try:
+        text = body.decode("utf-8").strip()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Batch body must be UTF-8 encoded JSON")
+    if text.startswith("["):
+        try:
+            records = json.loads(text)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON array: {e}")
+        return records
+
+    records = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError as e:
+            records.append(e)
+    return records
+
+def publish_reading(row: dict):
+    # Evaluate the alert rules, then push the reading and any alert it fired or cleared to live subscribers
+    farmer_id = row["farmer_id"]
+    events = alert_engine.observe(row)
+    # dedup_key and seq are ingestion bookkeeping; subscribers get the same fields as GET /api/soil-data
+    reading = {key: value for key, value in row.items() if key not in ("dedup_key", "seq")}
+    reading["ts"] = row["ts"].isoformat()
+    telemetry_hub.publish(farmer_id, {"type": "reading", "reading": reading})
+    for event in events:
+        telemetry_hub.publish(farmer_id, {"type": "alert", "alert": event_to_dict(event)})
+
+async def write_reading(row: dict):
+    # Queue an admitted reading and fan it out; raises BufferFullError / DuplicateReadingError
+    ingestion_buffer.submit(row)
+    metrics.ingested_readings.inc(str(row["farmer_id"]))
+    publish_reading(row)
+    await latest_cache.put(row["farmer_id"], row)
+
+async def ingest_reading(data: SoilData) -> bool:
+    # Single-reading ingestion shared by POST /api/soil-data and the binary gateway.
+    # Returns False when the reading was coalesced (held as the farmer's latest, written once the rate allows);
+    # raises DuplicateReadingError / RateLimitedError / BufferFullError
+    row = reading_to_row(data)
+    if ingestion_buffer.is_duplicate(row):
+        # Checked before admission so device retries don't spend the farmer's tokens
+        raise DuplicateReadingError(f"Reading {data.timestamp} from farmer {data.farmer_id} was already accepted")
+    if admission is not None and not await admission.admit(row):
+        return False
+    await write_reading(row)
+    return True
+
+@app.post("/api/soil-data", status_code=201)
+async def receive_soil_data(data: SoilData):
+    error = check_reading_bounds(data)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     
-    db_soil = models.SoilDataDB(**data.dict())
-    db.add(db_soil)
-    db.commit()
-    db.refresh(db_soil)
-    return {"status": "success", "message": "Soil data recorded to Database"}
+    try:
+        written = await ingest_reading(data)
+    except DuplicateReadingError:
+        # A retry of a reading we already have: same answer as the first time, so the node stops retrying
+        return {"status": "success", "message": "Duplicate reading ignored"}
+    except RateLimitedError as e:
+        # Over this farmer's (or the global) rate: shed, with the time until the bucket has a token again
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": retry_after_header(e.retry_after)})
+    except BufferFullError:
+        # Backpressure: tell the node to back off instead of growing the queue unbounded
+        raise HTTPException(status_code=429, detail="Ingestion buffer full, retry later", headers={"Retry-After": "1"})
+    if not written:
+        # 2xx so the node doesn't retry: a newer reading from it may still replace this one before it is written
+        return JSONResponse(status_code=202, content={"status": "accepted", "message": "Over the ingestion rate; coalesced into the farmer's latest reading"})
+    return {"status": "success", "message": "Soil data queued for Database"}
+
+async def ingest_binary_reading(record: dict):
+    # Decoded binary frame: same SoilData schema and bounds as the JSON endpoint (ValueError on a bad reading)
+    data = SoilData(**record)
+    error = check_reading_bounds(data)
+    if error:
+        raise ValueError(error)
+    return await ingest_reading(data)
+
+@app.get("/api/binary-ingest/stats")
+async def get_binary_ingest_stats():
+    return binary_gateway.stats() if binary_gateway is not None else {"enabled": False}
+
+@app.post("/api/soil-data/batch")
+async def receive_soil_data_batch(request: Request):
+    records = parse_batch_body(await request.body())
+    if len(records) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_ROWS} readings per call)")
+
+    # Validate every row in one pass; bad rows are reported without failing the upload
+    results = []
+    rows = []
+    duplicates = 0
+    for index, record in enumerate(records):
+        if isinstance(record, Exception):
+            results.append({"index": index, "status": "rejected", "error": f"Invalid JSON: {record}"})
+            continue
+        if not isinstance(record, dict):
+            results.append({"index": index, "status": "rejected", "error": "Expected a JSON object"})
+            continue
+        try:
+            data = SoilData(**record)
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors())
+            results.append({"index": index, "status": "rejected", "error": error})
+            continue
+
+        error = check_reading_bounds(data)
+        if error:
+            results.append({"index": index, "status": "rejected", "error": error})
+            continue
+
+        row = reading_to_row(data)
+        if ingestion_buffer.is_duplicate(row):
+            duplicates += 1
+            results.append({"index": index, "status": "duplicate"})
+            continue
+        rows.append(row)
+        results.append({"index": index, "status": "accepted"})
+
+    rejected = len(results) - len(rows) - duplicates
+    inserted = []
+    if rows and admission is not None:
+        # Every new row counts against the global write budget (with a larger burst for backlog replay)
+        try:
+            await admission.admit_batch(len(rows))
+        except RateLimitedError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": retry_after_header(e.retry_after)})
+    if rows:
+        try:
+            inserted = await ingestion_buffer.write_batch(rows)
+        except Exception:
+            raise HTTPException(status_code=503, detail="Batch could not be written to Database, retry later")
+        # Rows the unique index skipped (already stored, or repeated in this upload) are duplicates
+        inserted_ids = {id(row) for row in inserted}
+        queued = iter(rows)
+        for result in results:
+            if result["status"] == "accepted" and id(next(queued)) not in inserted_ids:
+                result["status"] = "duplicate"
+        for row in inserted:
+            metrics.ingested_readings.inc(str(row["farmer_id"]))
+            publish_reading(row)
+
+        # Write-through: each farmer's newest row in the batch (put() keeps a newer cached reading)
+        latest_per_farmer = {}
+        for row in inserted:
+            if row["farmer_id"] not in latest_per_farmer or row["ts"] >= latest_per_farmer[row["farmer_id"]]["ts"]:
+                latest_per_farmer[row["farmer_id"]] = row
+        for farmer_id, row in latest_per_farmer.items():
+            await latest_cache.put(farmer_id, row)
+
+    return {
+        "status": "success",
+        "accepted": len(inserted),
+        "rejected": rejected,
+        # Includes rows the database already had (or that appeared twice in this upload)
+        "duplicates": duplicates + len(rows) - len(inserted),
+        "results": results,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=0)")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/ingestion/stats")
+async def get_ingestion_stats():
+    return ingestion_buffer.stats()
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    return admission.stats() if admission is not None else {"enabled": False}
+
+@app.get("/api/latest-cache/stats")
+async def get_latest_cache_stats():
+    return latest_cache.stats()
+
+@app.get("/api/llm-cache/stats")
+async def get_llm_cache_stats():
+    return llm_cache.stats() if llm_cache is not None else {"enabled": False}
+
+@app.get("/api/llm-gateway/stats")
+async def get_llm_gateway_stats():
+    return llm_gateway.stats() if llm_gateway is not None else {"enabled": False}
 
-@app.get("/api/soil-data", response_model=List[SoilDataResponse])
-async def get_soil_data(farmer_id: int, db: Session = Depends(get_db)):
-    # Return last 50 readings for this specific farmer
-    return db.query(models.SoilDataDB).filter(models.SoilDataDB.farmer_id == farmer_id).order_by(models.SoilDataDB.id.desc()).limit(50).all()[::-1]
+@app.get("/api/market-client/stats")
+async def get_market_client_stats():
+    return market_client.stats() if market_client is not None else {"enabled": False}
+
+@app.get("/api/telemetry-stream/stats")
+async def get_telemetry_stream_stats():
+    return telemetry_hub.stats()
+
+@app.websocket("/ws/telemetry")
+async def telemetry_socket(websocket: WebSocket, farmer_id: int):
+    # Pushes {"type": "reading" | "alert" | "lagged", ...} deltas for one farmer as they are ingested
+    await websocket.accept()
+    subscription = telemetry_hub.subscribe(farmer_id)
+
+    async def pump():
+        while True:
+            await websocket.send_text(await subscription.get())
+
+    sender = asyncio.create_task(pump())
+    try:
+        # Clients send nothing; receiving only notices the disconnect
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+        telemetry_hub.unsubscribe(subscription)
+
+@app.get("/api/soil-data/stream")
+async def stream_soil_data(farmer_id: int):
+    # Server-sent events alternative to /ws/telemetry, same messages
+    subscription = telemetry_hub.subscribe(farmer_id)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+        finally:
+            telemetry_hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+MAX_READ_ROWS = int(os.getenv("SOIL_DATA_MAX_ROWS", "500000"))
+
+@app.get("/api/soil-data")
+async def get_soil_data(
+    farmer_id: int,
+    limit: int = Query(50, ge=1),
+    fields: Optional[str] = None,
+    format: str = "rows",
+    db: Session = Depends(get_db),
+):
+    # Latest readings for this farmer, oldest first. Column projection + orjson: no ORM objects or per-row validation.
+    # format=rows: a list of SoilDataResponse-shaped objects; format=columnar: {"fields": [...], "columns": {field: [values]}}
+    if format not in telemetry_reads.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(telemetry_reads.FORMATS)}")
+
+    field_list = None
+    if fields:
+        field_list = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = telemetry_reads.unknown_fields(field_list)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    body = await database.run_db(telemetry_reads.read_recent, db, farmer_id, min(limit, MAX_READ_ROWS), field_list, format)
+    return Response(content=body, media_type="application/json")
+
+MAX_HISTORY_BUCKETS = int(os.getenv("HISTORY_MAX_BUCKETS", "5000"))
+
+@app.get("/api/soil-data/history")
+async def get_soil_data_history(
+    farmer_id: int,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    resolution: str = "1h",
+    fields: Optional[str] = None,
+    limit: int = Query(10000, ge=1, le=10000),
+    db: Session = Depends(get_db),
+):
+    # Chart history aggregated server-side into min/avg/max buckets (raw rows only when asked for)
+    if resolution not in telemetry_history.RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(telemetry_history.RESOLUTIONS)}")
+
+    end = to or datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    start = from_ or end - timedelta(days=7)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    bucket_seconds = telemetry_history.RESOLUTIONS[resolution]
+    if bucket_seconds and (end - start).total_seconds() / bucket_seconds > MAX_HISTORY_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range too large for resolution {resolution} (max {MAX_HISTORY_BUCKETS} buckets); use a coarser resolution")
+
+    field_list = None
+    if fields:
+        field_list = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in field_list if field not in models.ROLLUP_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    return await database.run_db(telemetry_history.query_history, db, farmer_id, start, end, resolution, field_list, limit)
+
+@app.get("/api/soil-data/export")
+async def export_soil_data(
+    farmer_ids: Optional[str] = None,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    format: str = "csv",
+    fields: Optional[str] = None,
+):
+    # Bulk raw export for model training, streamed from a server-side cursor in constant memory
+    try:
+        telemetry_export.check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    try:
+        farmer_list = [int(farmer) for farmer in farmer_ids.split(",") if farmer.strip()] if farmer_ids else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="farmer_ids must be a comma-separated list of integers")
+
+    field_list = None
+    if fields:
+        field_list = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in field_list if field not in telemetry_export.FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    start = from_.replace(tzinfo=timezone.utc) if from_ is not None and from_.tzinfo is None else from_
+    end = to.replace(tzinfo=timezone.utc) if to is not None and to.tzinfo is None else to
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    media_type, extension = telemetry_export.FORMATS[format]
+    # A plain generator: StreamingResponse pulls each chunk in a worker thread, never on the event loop
+    chunks = telemetry_export.stream_export(database.engine, format, farmer_list, start, end, field_list)
+    return StreamingResponse(chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="soil_data.{extension}"'})
 
 @app.get("/api/predict-crop")
 async def predict_crop(farmer_id: int, db: Session = Depends(get_db)):
-    latest = db.query(models.SoilDataDB).filter(models.SoilDataDB.farmer_id == farmer_id).order_by(models.SoilDataDB.id.desc()).first()
+    latest = await get_latest_reading(db, farmer_id)
     
     if not latest:
         return {"prediction": "Waiting for sensor data..."}
@@ -114,7 +646,8 @@ async def predict_crop(farmer_id: int, db: Session = Depends(get_db)):
         ph=latest.ph,
         temp=latest.temp,
         humidity=latest.humidity,
-        rainfall=latest.rainfall
+        rainfall=latest.rainfall,
+        top_k=1,
     )
     
     if not predictions:
@@ -124,7 +657,7 @@ async def predict_crop(farmer_id: int, db: Session = Depends(get_db)):
 
 @app.get("/api/fertilizer")
 async def recommend_fertilizer(farmer_id: int, crop_name: str = "Tomato", db: Session = Depends(get_db)):
-    latest = db.query(models.SoilDataDB).filter(models.SoilDataDB.farmer_id == farmer_id).order_by(models.SoilDataDB.id.desc()).first()
+    latest = await get_latest_reading(db, farmer_id)
     if not latest:
         return {"recommendation": "Waiting for sensor data..."}
         
@@ -141,78 +674,185 @@ async def recommend_fertilizer(farmer_id: int, crop_name: str = "Tomato", db: Se
     return {"recommendation": fert_data["recommendation"]}
 
 @app.get("/api/dss-insight")
-async def get_dss_insight(farmer_id: int, region: str = "Central", current_month: int = datetime.utcnow().month, db: Session = Depends(get_db)):
-    latest = db.query(models.SoilDataDB).filter(models.SoilDataDB.farmer_id == farmer_id).order_by(models.SoilDataDB.id.desc()).first()
+async def get_dss_insight(farmer_id: int, region: str = Query("Central", pattern=REGION_PATTERN), current_month: int = datetime.utcnow().month, db: Session = Depends(get_db)):
+    region = canonical_region(region)
+    latest = await get_latest_reading(db, farmer_id)
     
     if not latest:
         raise HTTPException(status_code=404, detail="No sensor data available to generate insights.")
         
-    insight = generate_decision(
-        farmer_soil_data=latest,
-        region=region,
-        current_month=current_month,
-        gemini_model=gemini_model
-    )
+    insight, prompt_inputs = await get_stage1_decision(db, latest, region, current_month)
+    if prompt_inputs is not None:
+        insight["explanation"] = await explain_decision(prompt_inputs, llm_gateway, llm_cache)
     
     return insight
 
+@app.post("/api/dss-insight/jobs", status_code=202)
+async def create_dss_insight_job(farmer_id: int, region: str = Query("Central", pattern=REGION_PATTERN), current_month: int = datetime.utcnow().month, db: Session = Depends(get_db)):
+    region = canonical_region(region)
+    latest = await get_latest_reading(db, farmer_id)
+    
+    if not latest:
+        raise HTTPException(status_code=404, detail="No sensor data available to generate insights.")
+        
+    # Stage-1 is precomputed or cheap to derive: the scores go back in this response, only the narrative is deferred
+    decision, prompt_inputs = await get_stage1_decision(db, latest, region, current_month)
+    if prompt_inputs is None:
+        raise HTTPException(status_code=422, detail=decision["error"])
+        
+    try:
+        job = insight_jobs.submit(
+            (farmer_id, region, current_month),
+            farmer_id,
+            decision,
+            lambda: explain_decision(prompt_inputs, llm_gateway, llm_cache),
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return job.to_dict()
+
+@app.get("/api/dss-insight/jobs/stats")
+async def get_insight_job_stats():
+    return insight_jobs.stats()
+
+def get_insight_job(job_id: str):
+    job = insight_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Insight job not found or expired.")
+    return job
+
+@app.get("/api/dss-insight/jobs/{job_id}")
+async def poll_dss_insight_job(job_id: str):
+    return get_insight_job(job_id).to_dict()
+
+@app.get("/api/dss-insight/jobs/{job_id}/events")
+async def stream_dss_insight_job(job_id: str):
+    job = get_insight_job(job_id)
+
+    async def events():
+        # Server-sent events: the scores straight away, then the finished job once the narrative is in
+        yield f"event: scores\ndata: {json.dumps(job.to_dict())}\n\n"
+        while not job.finished.is_set():
+            try:
+                await asyncio.wait_for(job.finished.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+        yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def custom_crop_fallback(prompt_inputs: dict) -> str:
+    # Served when Gemini is down, slow or shedding load: the live readings plus the deterministic fertilizer plan
+    crop = prompt_inputs["crop"]
+    explanation = (
+        f"Live conditions for {crop}: N={prompt_inputs['nitrogen']}, P={prompt_inputs['phosphorus']}, "
+        f"K={prompt_inputs['potassium']} mg/kg, pH {prompt_inputs['ph']}, moisture {prompt_inputs['moisture']}%, "
+        f"soil {prompt_inputs['soil_temp']}°C, air {prompt_inputs['temp']}°C at {prompt_inputs['humidity']}% humidity."
+    )
+    if None not in (prompt_inputs["nitrogen"], prompt_inputs["phosphorus"], prompt_inputs["potassium"]):
+        fertilizer = calculate_fertilizer_deficit(crop, prompt_inputs["nitrogen"], prompt_inputs["phosphorus"], prompt_inputs["potassium"])
+        if "recommendation" in fertilizer:
+            explanation += f" {fertilizer['recommendation']}"
+    return explanation + " (AI explanation temporarily unavailable)"
+
 @app.get("/api/dss-custom-crop-insight")
 async def get_dss_custom_crop_insight(farmer_id: int, target_crop: str, db: Session = Depends(get_db)):
-    latest = db.query(models.SoilDataDB).filter(models.SoilDataDB.farmer_id == farmer_id).order_by(models.SoilDataDB.id.desc()).first()
+    latest = await get_latest_reading(db, farmer_id)
     
     if not latest:
         raise HTTPException(status_code=404, detail="No sensor data available to generate insights.")
         
     explanation = "Data synthesis complete. (No AI Model Provided)"
-    if gemini_model:
+    if llm_gateway:
+        # Telemetry rounded to agronomically meaningful precision, so near-identical readings share a cached answer
+        prompt_inputs = {
+            "crop": target_crop.strip().title(),
+            "nitrogen": round(latest.nitrogen) if latest.nitrogen is not None else None,
+            "phosphorus": round(latest.phosphorus) if latest.phosphorus is not None else None,
+            "potassium": round(latest.potassium) if latest.potassium is not None else None,
+            "ph": round(latest.ph, 1) if latest.ph is not None else None,
+            "moisture": round(latest.moisture),
+            "soil_temp": round(latest.soil_temp or latest.temp),
+            "temp": round(latest.temp),
+            "humidity": round(latest.humidity),
+            "light": round(latest.light_intensity, -2) if latest.light_intensity else 'Unknown',
+        }
         synthesis_prompt = f"""
         Act as an Expert Agronomist providing custom precision agriculture advice. 
-        The farmer wants to know if their current soil and environment are optimal for **{target_crop}** (whether they are planning to plant it, or it is already growing).
+        The farmer wants to know if their current soil and environment are optimal for **{prompt_inputs['crop']}** (whether they are planning to plant it, or it is already growing).
         
         Here is the farmer's LIVE soil and environmental telemetry:
-        - Soil Nitrogen: {latest.nitrogen} mg/kg
-        - Soil Phosphorus: {latest.phosphorus} mg/kg
-        - Soil Potassium: {latest.potassium} mg/kg
-        - Soil pH: {latest.ph}
-        - Soil Moisture: {latest.moisture}%
-        - Soil Temp: {latest.soil_temp or latest.temp}°C
-        - Ambient Temp: {latest.temp}°C
-        - Ambient Humidity: {latest.humidity}%
-        - Light Intensity: {latest.light_intensity or 'Unknown'} Lux
+        - Soil Nitrogen: {prompt_inputs['nitrogen']} mg/kg
+        - Soil Phosphorus: {prompt_inputs['phosphorus']} mg/kg
+        - Soil Potassium: {prompt_inputs['potassium']} mg/kg
+        - Soil pH: {prompt_inputs['ph']}
+        - Soil Moisture: {prompt_inputs['moisture']}%
+        - Soil Temp: {prompt_inputs['soil_temp']}°C
+        - Ambient Temp: {prompt_inputs['temp']}°C
+        - Ambient Humidity: {prompt_inputs['humidity']}%
+        - Light Intensity: {prompt_inputs['light']} Lux
         
-        Analyze these exact metrics against the ideal growing conditions for {target_crop}. 
+        Analyze these exact metrics against the ideal growing conditions for {prompt_inputs['crop']}. 
         Provide a concise, 3-to-4 sentence response covering:
-        1. A clear assessment of whether the current conditions are healthy for {target_crop}.
+        1. A clear assessment of whether the current conditions are healthy for {prompt_inputs['crop']}.
         2. The primary limiting factor(s) or stressors in their current soil/environment.
-        3. A specific, actionable fertilizer, water, or cultivation modification plan to optimize the yield for {target_crop}.
+        3. A specific, actionable fertilizer, water, or cultivation modification plan to optimize the yield for {prompt_inputs['crop']}.
         """
         
         try:
-            explanation = gemini_model.generate_content(synthesis_prompt).text.strip()
-        except Exception as e:
-            explanation = f"AI Error evaluating custom crop decision: {str(e)}"
+            explanation = await generate_cached(llm_gateway, llm_cache, cache_key("custom-crop", prompt_inputs), synthesis_prompt)
+        except LLMUnavailableError:
+            explanation = custom_crop_fallback(prompt_inputs)
             
     return {
         "target_crop": target_crop,
         "explanation": explanation
     }
 
+def query_active_alerts(db: Session, farmer_id: int):
+    return (
+        db.query(models.AlertDB)
+        .filter(models.AlertDB.farmer_id == farmer_id, models.AlertDB.cleared_at.is_(None))
+        .order_by(models.AlertDB.started_at.desc())
+        .all()
+    )
+
+def query_alert_history(db: Session, farmer_id: int, limit: int):
+    return (
+        db.query(models.AlertDB)
+        .filter(models.AlertDB.farmer_id == farmer_id)
+        .order_by(models.AlertDB.started_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+def alert_to_dict(alert) -> dict:
+    return {
+        "type": alert.type,
+        "severity": alert.severity,
+        "message": alert.message,
+        "rule": alert.rule,
+        "value": alert.value,
+        "started_at": alert.started_at.isoformat() if alert.started_at else None,
+        "cleared_at": alert.cleared_at.isoformat() if alert.cleared_at else None,
+    }
+
 @app.get("/api/disaster-alerts")
 async def get_disaster_alerts(farmer_id: int, db: Session = Depends(get_db)):
-    latest = db.query(models.SoilDataDB).filter(models.SoilDataDB.farmer_id == farmer_id).order_by(models.SoilDataDB.id.desc()).first()
-    if not latest:
-        return {"alerts": []}
-        
-    alerts = []
-    if latest.temp > 40:
-        alerts.append({"type": "Heatwave", "severity": "HIGH", "message": "Extreme heat detected. Increase irrigation."})
-    if latest.moisture > 90:
-        alerts.append({"type": "Flood", "severity": "MEDIUM", "message": "Soil saturation approaching 100%. Check drainage."})
-        
-    return {"alerts": alerts}
+    # Raised at ingestion time by the alert engine; this only reads the farmer's active alerts
+    alerts = await database.run_db(query_active_alerts, db, farmer_id)
+    return {"alerts": [alert_to_dict(alert) for alert in alerts]}
 
-@app.post("/api/farmer-register", status_code=201)
-async def register_farmer(farmer: FarmerRegistration, db: Session = Depends(get_db)):
+@app.get("/api/disaster-alerts/history")
+async def get_disaster_alert_history(farmer_id: int, limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+    alerts = await database.run_db(query_alert_history, db, farmer_id, limit)
+    return {"alerts": [alert_to_dict(alert) for alert in alerts]}
+
+@app.get("/api/alerts/stats")
+async def get_alert_stats():
+    return alert_engine.stats()
+
+def create_farmer_with_seed_data(db: Session, farmer: FarmerRegistration):
     # 1. Register the Farmer
     db_farmer = models.FarmerDB(**farmer.dict())
     db.add(db_farmer)
@@ -248,7 +888,8 @@ async def register_farmer(farmer: FarmerRegistration, db: Session = Depends(get_
             flow_rate=float(round(random.uniform(0.0, 2.5), 2)),      # Water flow (L/min)
             battery_voltage=float(round(random.uniform(3.8, 4.2), 2)),# Battery (V)
             
-            timestamp=past_time.isoformat() + "Z" # Append Z for UTC conformity
+            timestamp=past_time.isoformat() + "Z", # Append Z for UTC conformity
+            ts=past_time.replace(tzinfo=timezone.utc)
         )
         seed_records.append(soil)
         
@@ -256,11 +897,14 @@ async def register_farmer(farmer: FarmerRegistration, db: Session = Depends(get_
     db.add_all(seed_records)
     db.commit()
 
+@app.post("/api/farmer-register", status_code=201)
+async def register_farmer(farmer: FarmerRegistration, db: Session = Depends(get_db)):
+    await database.run_db(create_farmer_with_seed_data, db, farmer)
     return {"status": "success", "message": f"Farmer {farmer.name} registered and dashboard auto-seeded with 15 records."}
 
 @app.post("/api/login")
 async def login_farmer(login: FarmerLogin, db: Session = Depends(get_db)):
-    farmer = db.query(models.FarmerDB).filter(models.FarmerDB.phone == login.phone).first()
+    farmer = await database.run_db(query_farmer_by_phone, db, login.phone)
     if not farmer:
         raise HTTPException(status_code=404, detail="Farmer not found with that phone number")
     return {"status": "success", "farmer_id": farmer.id, "name": farmer.name}
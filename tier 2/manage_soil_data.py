@@ -0,0 +1,129 @@
+"""
+Schema and lifecycle tool for the soil_data telemetry table (see telemetry_storage.py).
+
+    python manage_soil_data.py setup       # bring soil_data up to the current schema; partition it on Postgres
+    python manage_soil_data.py maintain    # pre-create partitions, refresh rollups, apply retention
+    python manage_soil_data.py rollup --from 2024-01-01 --to 2024-02-01
+    python manage_soil_data.py status
+
+`setup` replaces the old migrate_postgres_*.py scripts: it adds any missing columns,
+backfills the typed ts column in small batches and builds the (farmer_id, ts) index, then
+(on Postgres) converts the table to monthly range partitions, and finally builds the unique
+(farmer_id, ts, dedup_key) index that makes ingestion idempotent. It is safe to re-run.
+"""
+import argparse
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, text
+
+import models
+import telemetry_storage
+from database import engine
+
+
+def setup(args):
+    models.Base.metadata.create_all(bind=engine)  # creates soil_data on a fresh database, plus the rollup tables
+
+    added = telemetry_storage.sync_columns(engine)
+    print(f"Columns added to soil_data: {', '.join(added) if added else 'none'}")
+
+    print("Backfilling 'ts' from ISO timestamp strings...")
+    updated, unparseable, _ = telemetry_storage.backfill_ts(engine, args.batch_size, args.pause)
+    print(f"Backfilled {updated} rows.")
+    if unparseable:
+        print(f"Warning: {unparseable} rows have unparseable timestamps (ts left NULL; moved to the default partition on Postgres).")
+
+    with engine.connect() as conn:
+        oldest = conn.execute(select(func.min(models.SoilDataDB.__table__.c.ts))).scalar()
+    if oldest is not None:
+        print("Rolling existing history up into soil_data_hourly / soil_data_daily...")
+        print(telemetry_storage.rollup(engine, oldest, datetime.now(timezone.utc)))
+
+    if telemetry_storage.is_postgres(engine):
+        print("Converting soil_data to monthly range partitions...")
+        copied = telemetry_storage.convert_to_partitioned(engine, args.months_ahead)
+        print(f"Copied {copied} rows into the partitioned table.")
+        created = telemetry_storage.ensure_partitions(engine, args.months_ahead)
+        print(f"Partitions created: {', '.join(created) if created else 'none'}")
+    else:
+        telemetry_storage.ensure_ts_index(engine)
+        print("SQLite detected: keeping a plain table (retention uses batched DELETEs).")
+    telemetry_storage.ensure_dedup_index(engine)
+    print("Unique (farmer_id, ts, dedup_key) index in place: retried uploads are stored once.")
+    print("Setup complete.")
+
+
+def maintain(args):
+    summary = telemetry_storage.run_maintenance(
+        engine,
+        months_ahead=args.months_ahead,
+        raw_days=args.raw_days,
+        hourly_days=args.hourly_days,
+        lookback_hours=args.lookback_hours,
+    )
+    if summary is None:
+        print("Another worker is running maintenance; skipped.")
+    else:
+        print(summary)
+
+
+def rollup(args):
+    start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc)
+    end = datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc)
+    print(telemetry_storage.rollup(engine, start, end))
+
+
+def status(args):
+    missing = telemetry_storage.schema_problems(engine)
+    print(f"schema: missing {', '.join(missing)} (run setup)" if missing else "schema: up to date")
+    with engine.connect() as conn:
+        if telemetry_storage.is_partitioned(conn):
+            for name, start in telemetry_storage.list_partitions(conn):
+                rows = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+                print(f"{name:<22} {start:%Y-%m}  {rows:>12,} rows")
+            rows = conn.execute(text(f"SELECT COUNT(*) FROM {telemetry_storage.DEFAULT_PARTITION}")).scalar()
+            print(f"{telemetry_storage.DEFAULT_PARTITION:<22} default  {rows:>12,} rows")
+        else:
+            rows = conn.execute(select(func.count()).select_from(models.SoilDataDB.__table__)).scalar()
+            print(f"soil_data (not partitioned) {rows:,} rows")
+        for model in (models.SoilDataHourlyDB, models.SoilDataDailyDB):
+            table = model.__table__
+            count, first, last = conn.execute(select(func.count(), func.min(table.c.bucket), func.max(table.c.bucket))).one()
+            print(f"{table.name:<22} {count:>12,} buckets  {first} .. {last}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    settings = telemetry_storage.maintenance_settings()
+
+    parser = argparse.ArgumentParser(description="Manage the soil_data telemetry table")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    setup_parser = subcommands.add_parser("setup", help="bring soil_data up to the current schema")
+    setup_parser.add_argument("--batch-size", type=int, default=5000)
+    setup_parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between backfill batches")
+    setup_parser.add_argument("--months-ahead", type=int, default=settings["months_ahead"])
+    setup_parser.set_defaults(handler=setup)
+
+    maintain_parser = subcommands.add_parser("maintain", help="partitions, rollups and retention")
+    maintain_parser.add_argument("--months-ahead", type=int, default=settings["months_ahead"])
+    maintain_parser.add_argument("--raw-days", type=int, default=settings["raw_days"], help="0 keeps raw data forever")
+    maintain_parser.add_argument("--hourly-days", type=int, default=settings["hourly_days"], help="0 keeps hourly rollups forever")
+    maintain_parser.add_argument("--lookback-hours", type=int, default=settings["lookback_hours"])
+    maintain_parser.set_defaults(handler=maintain)
+
+    rollup_parser = subcommands.add_parser("rollup", help="recompute rollups for a time range")
+    rollup_parser.add_argument("--from", dest="start", required=True, help="ISO date/time (UTC)")
+    rollup_parser.add_argument("--to", dest="end", required=True, help="ISO date/time (UTC)")
+    rollup_parser.set_defaults(handler=rollup)
+
+    status_parser = subcommands.add_parser("status", help="partition and rollup overview")
+    status_parser.set_defaults(handler=status)
+
+    args = parser.parse_args()
+    try:
+        args.handler(args)
+    except Exception as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime
+from sqlalchemy import BigInteger, Column, Integer, Float, String, DateTime, Index, JSON
 from database import Base
 import datetime
+from typing import Optional
 
 class SoilDataDB(Base):
     __tablename__ = "soil_data"
@@ -26,6 +27,65 @@ class SoilDataDB(Base):
     battery_voltage = Column(Float, nullable=True) # Battery Monitor (V)
     
     timestamp = Column(String, nullable=False) # Storing as ISO string for simplicity out of ESP32
+    ts = Column(DateTime(timezone=True), nullable=True) # Typed copy of `timestamp` for ordering and time-range scans (see manage_soil_data.py)
+    dedup_key = Column(BigInteger, nullable=True) # Idempotency key of the reading (services/ingestion.py); NULL for rows stored before it existed
+
+    # Per-farmer "latest N" and time-window queries are a single range scan on this index
+    __table_args__ = (
+        Index("ix_soil_data_farmer_id_ts", farmer_id, ts.desc(), id.desc()),
+        # A retried upload of the same reading hits this and is skipped (INSERT ... ON CONFLICT DO NOTHING).
+        # ts is part of it because unique indexes on the partitioned table must include the partition key.
+        Index("ux_soil_data_reading", farmer_id, ts, dedup_key, unique=True),
+    )
+
+def parse_iso_timestamp(value: str) -> Optional[datetime.datetime]:
+    """Parse the ISO-8601 strings sent by the nodes ('2024-01-01T10:00:00Z'). Naive values are taken as UTC."""
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+def as_utc(value: datetime.datetime) -> datetime.datetime:
+    """A stored `ts` as an aware UTC datetime (SQLite hands it back naive; everything stored is UTC)."""
+    return value.replace(tzinfo=datetime.timezone.utc) if value.tzinfo is None else value.astimezone(datetime.timezone.utc)
+
+def format_utc(value: Optional[datetime.datetime]) -> Optional[str]:
+    """A stored `ts` as the ISO-8601 string every API response and export uses ('2024-01-01T10:00:00+00:00')."""
+    return None if value is None else as_utc(value).isoformat()
+
+# Numeric telemetry fields aggregated into the rollup tiers (min/avg/max per bucket)
+ROLLUP_FIELDS = [
+    "moisture", "temp", "humidity", "ph", "nitrogen", "phosphorus", "potassium", "rainfall",
+    "soil_temp", "soil_ec", "air_pressure", "light_intensity", "water_level", "flow_rate", "battery_voltage",
+]
+
+def _rollup_model(class_name: str, table_name: str):
+    # Same shape for every tier: one row per (farmer, bucket start) with <field>_min/_avg/_max columns
+    attrs = {
+        "__tablename__": table_name,
+        "farmer_id": Column(Integer, primary_key=True),
+        "bucket": Column(DateTime(timezone=True), primary_key=True), # Bucket start (UTC)
+        "samples": Column(Integer, nullable=False),                  # Raw readings folded into this bucket
+    }
+    for field in ROLLUP_FIELDS:
+        attrs[f"{field}_min"] = Column(Float, nullable=True)
+        attrs[f"{field}_avg"] = Column(Float, nullable=True)
+        attrs[f"{field}_max"] = Column(Float, nullable=True)
+    return type(class_name, (Base,), attrs)
+
+# Rollup tiers maintained by telemetry_storage.py; raw soil_data is dropped after retention
+SoilDataHourlyDB = _rollup_model("SoilDataHourlyDB", "soil_data_hourly")
+SoilDataDailyDB = _rollup_model("SoilDataDailyDB", "soil_data_daily")
+
+class SoilDataLateHourDB(Base):
+    # Hours that received readings after they left the rollup lookback (offline nodes replaying a backlog).
+    # Written by ingestion (telemetry_storage.mark_late_hours); run_maintenance re-rolls and clears them.
+    __tablename__ = "soil_data_late_hours"
+
+    bucket = Column(DateTime(timezone=True), primary_key=True) # Hour start (UTC)
 
 class FarmerDB(Base):
     __tablename__ = "farmers"
@@ -34,3 +94,39 @@ class FarmerDB(Base):
     name = Column(String, index=True)
     phone = Column(String, unique=True, index=True)
     location = Column(String)
+
+class DssRecommendationDB(Base):
+    __tablename__ = "dss_recommendations"
+
+    # Stage-1 decision precomputed by dss_precompute.py, valid while reading_id is still the farmer's latest reading
+    farmer_id = Column(Integer, primary_key=True)
+    region = Column(String, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    reading_id = Column(Integer, nullable=False)             # soil_data.id the decision was computed from
+    reading_ts = Column(DateTime(timezone=True), nullable=True)  # its ts; the API matches on this, since a cached reading has no id yet
+    decision = Column(JSON, nullable=False)                  # build_decision() output (explanation left empty)
+    prompt_inputs = Column(JSON, nullable=True)              # normalized LLM prompt inputs, None if no crop could be scored
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+class AlertDB(Base):
+    __tablename__ = "alerts"
+
+    # Disaster alerts raised by services/alert_engine.py from the ingested telemetry (rules in data/alert_rules.json)
+    id = Column(Integer, primary_key=True)
+    farmer_id = Column(Integer, nullable=False)
+    rule = Column(String, nullable=False)                        # rule id, e.g. "heatwave"
+    type = Column(String, nullable=False)
+    severity = Column(String, nullable=False)                    # LOW | MEDIUM | HIGH
+    message = Column(String, nullable=False)
+    value = Column(Float, nullable=True)                         # rule aggregate when it fired
+    started_at = Column(DateTime(timezone=True), nullable=False) # reading ts that fired it
+    cleared_at = Column(DateTime(timezone=True), nullable=True)  # NULL while active
+    cleared_value = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_alerts_farmer_id_started_at", farmer_id, started_at.desc()),
+        # At most one active alert per farmer and rule, across all workers
+        Index("uq_alerts_active", farmer_id, rule, unique=True,
+              postgresql_where=cleared_at.is_(None), sqlite_where=cleared_at.is_(None)),
+    )
@@ -0,0 +1,354 @@
+"""
+Token-bucket admission control for telemetry ingestion.
+
+Every reading takes one token from its farmer's bucket (INGEST_RATE_PER_FARMER readings/s,
+bursts up to INGEST_BURST_PER_FARMER) and one from the global bucket (INGEST_RATE_GLOBAL /
+INGEST_BURST_GLOBAL). A misconfigured node or a reconnect storm therefore empties its own
+bucket first, and the readings of every other farmer are still admitted. A reading
+that finds either bucket empty is shed: RateLimitedError carries the seconds until a token
+is due, for the 429 Retry-After. With INGEST_COALESCE=1 it is held instead, as that farmer's
+single pending reading (a newer one replaces it). The pending reading is written as soon as
+the farmer has a token again, so a flooding node costs one write per token and its latest
+value is never lost.
+
+Batch uploads (POST /api/soil-data/batch) skip the farmer buckets but charge every row to the
+global one. To let a node replay an offline backlog at once, a batch may take the global bucket
+up to INGEST_BURST_BATCH - INGEST_BURST_GLOBAL tokens into debt. Single readings are shed until
+the debt is paid off, so over time the write rate still stays at INGEST_RATE_GLOBAL.
+
+Buckets live in the worker (LocalBuckets) or, with INGEST_RATE_REDIS_URL, in Redis
+(RedisBuckets, one atomic script per reading), so the limits hold across all Uvicorn workers.
+The Redis backend needs the `redis` package.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ADMITTED, FARMER_LIMIT, GLOBAL_LIMIT = "admitted", "farmer", "global"
+
+
+class RateLimitedError(Exception):
+    """Raised when a reading is over its farmer's or the global rate (the caller should answer 429)."""
+
+    def __init__(self, limit: str, retry_after: float):
+        super().__init__(f"Over the {limit} ingestion rate limit, retry in {retry_after:.1f} s")
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def _refill(state, rate: float, burst: float, now: float) -> float:
+    if state is None:
+        return burst
+    tokens, last = state
+    return min(burst, tokens + max(0.0, now - last) * rate)
+
+
+class LocalBuckets:
+    """
+    In-process buckets: {farmer_id: (tokens, last refill)}, least recently refilled first.
+    Only the event loop touches them. A bucket idle long enough to be full again is the same
+    as no bucket, so those are dropped from the front on every take. Beyond `max_buckets` the
+    least recently used go too, even if not full yet, so pruning stays amortized O(1).
+    """
+
+    def __init__(self, farmer_rate: float, farmer_burst: float, global_rate: float, global_burst: float, max_buckets: int = 100000,
+                 batch_burst: Optional[float] = None):
+        self.farmer_rate = farmer_rate
+        self.farmer_burst = farmer_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.batch_burst = max(global_burst, batch_burst or 0)
+        self.max_buckets = max_buckets
+        self._farmers: "OrderedDict[int, Tuple[float, float]]" = OrderedDict()
+        self._global: Optional[Tuple[float, float]] = None
+
+    async def take(self, farmer_id: int) -> Tuple[str, float]:
+        """Take a token from both buckets, or neither. Returns (ADMITTED | limit hit, seconds until a token)."""
+        now = time.monotonic()
+        farmer_tokens = global_tokens = None
+        if self.farmer_rate > 0:
+            farmer_tokens = _refill(self._farmers.get(farmer_id), self.farmer_rate, self.farmer_burst, now)
+            if farmer_tokens < 1:
+                return FARMER_LIMIT, (1 - farmer_tokens) / self.farmer_rate
+        if self.global_rate > 0:
+            global_tokens = _refill(self._global, self.global_rate, self.global_burst, now)
+            if global_tokens < 1:
+                return GLOBAL_LIMIT, (1 - global_tokens) / self.global_rate
+
+        if farmer_tokens is not None:
+            self._farmers[farmer_id] = (farmer_tokens - 1, now)
+            self._farmers.move_to_end(farmer_id)
+            self._prune(now)
+        if global_tokens is not None:
+            self._global = (global_tokens - 1, now)
+        return ADMITTED, 0.0
+
+    async def take_batch(self, count: int) -> Tuple[str, float]:
+        """Charge `count` rows to the global bucket only, borrowing up to batch_burst - global_burst tokens."""
+        if self.global_rate <= 0:
+            return ADMITTED, 0.0
+        now = time.monotonic()
+        tokens = _refill(self._global, self.global_rate, self.global_burst, now)
+        extra = self.batch_burst - self.global_burst
+        need = min(count, self.batch_burst)  # a batch larger than the whole allowance needs a full bucket
+        if tokens + extra < need:
+            return GLOBAL_LIMIT, (need - extra - tokens) / self.global_rate
+        self._global = (tokens - count, now)
+        return ADMITTED, 0.0
+
+    def _prune(self, now: float):
+        full_after = self.farmer_burst / self.farmer_rate
+        while self._farmers:
+            oldest = next(iter(self._farmers.values()))
+            if now - oldest[1] < full_after and len(self._farmers) <= self.max_buckets:
+                break
+            self._farmers.popitem(last=False)
+
+    def __len__(self):
+        return len(self._farmers)
+
+
+# Same algorithm as LocalBuckets.take, atomically in Redis. KEYS: farmer bucket, global bucket.
+# ARGV: now, farmer rate, farmer burst, global rate, global burst (rate 0 = no limit).
+# Returns {0 admitted | 1 farmer limit | 2 global limit, seconds until a token (as a string)}.
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local function refill(key, rate, burst)
+  if rate <= 0 then return nil end
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(state[1])
+  if tokens == nil then return burst end
+  return math.min(burst, tokens + math.max(0, now - tonumber(state[2])) * rate)
+end
+local farmer_rate, farmer_burst = tonumber(ARGV[2]), tonumber(ARGV[3])
+local global_rate, global_burst = tonumber(ARGV[4]), tonumber(ARGV[5])
+local farmer = refill(KEYS[1], farmer_rate, farmer_burst)
+if farmer ~= nil and farmer < 1 then return {1, tostring((1 - farmer) / farmer_rate)} end
+local global = refill(KEYS[2], global_rate, global_burst)
+if global ~= nil and global < 1 then return {2, tostring((1 - global) / global_rate)} end
+if farmer ~= nil then
+  redis.call('HSET', KEYS[1], 'tokens', farmer - 1, 'ts', now)
+  redis.call('EXPIRE', KEYS[1], math.ceil(farmer_burst / farmer_rate) + 1)
+end
+if global ~= nil then
+  redis.call('HSET', KEYS[2], 'tokens', global - 1, 'ts', now)
+  redis.call('EXPIRE', KEYS[2], math.ceil(global_burst / global_rate) + 1)
+end
+return {0, '0'}
+"""
+# Same as LocalBuckets.take_batch. KEYS: global bucket. ARGV: now, rate, burst, batch burst, rows.
+_TAKE_BATCH_SCRIPT = """
+local now, rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local batch_burst, count = tonumber(ARGV[4]), tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+if tokens == nil then
+  tokens = burst
+else
+  tokens = math.min(burst, tokens + math.max(0, now - tonumber(state[2])) * rate)
+end
+local extra = batch_burst - burst
+local need = math.min(count, batch_burst)
+if tokens + extra < need then return {2, tostring((need - extra - tokens) / rate)} end
+redis.call('HSET', KEYS[1], 'tokens', tokens - count, 'ts', now)
+-- Kept until the debt is paid off and the bucket is full again
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens + count) / rate) + 1)
+return {0, '0'}
+"""
+_OUTCOMES = {0: ADMITTED, 1: FARMER_LIMIT, 2: GLOBAL_LIMIT}
+
+
+class RedisBuckets:
+    """Buckets shared by every worker (any Redis-protocol server). Needs the `redis` package."""
+
+    def __init__(self, url: str, farmer_rate: float, farmer_burst: float, global_rate: float, global_burst: float,
+                 prefix: str = "agrisphere:ratelimit:", batch_burst: Optional[float] = None):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("INGEST_RATE_REDIS_URL is set but the 'redis' package is not installed")
+        self.client = aioredis.from_url(url)
+        self.script = self.client.register_script(_TAKE_SCRIPT)
+        self.batch_script = self.client.register_script(_TAKE_BATCH_SCRIPT)
+        self.farmer_rate = farmer_rate
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.batch_burst = max(global_burst, batch_burst or 0)
+        self.args = (farmer_rate, farmer_burst, global_rate, global_burst)
+        self.prefix = prefix
+
+    async def take(self, farmer_id: int) -> Tuple[str, float]:
+        # Wall-clock time: workers on different hosts have to agree on it (NTP is enough here)
+        outcome, wait = await self.script(keys=[f"{self.prefix}farmer:{farmer_id}", f"{self.prefix}global"], args=[time.time(), *self.args])
+        return _OUTCOMES[int(outcome)], float(wait)
+
+    async def take_batch(self, count: int) -> Tuple[str, float]:
+        if self.global_rate <= 0:
+            return ADMITTED, 0.0
+        outcome, wait = await self.batch_script(keys=[f"{self.prefix}global"],
+                                                args=[time.time(), self.global_rate, self.global_burst, self.batch_burst, count])
+        return _OUTCOMES[int(outcome)], float(wait)
+
+    def __len__(self):
+        return 0  # not tracked locally
+
+
+class AdmissionController:
+    """
+    Decides, per reading, between writing it now, shedding it (RateLimitedError) and, with
+    `coalesce`, holding it as its farmer's pending reading. `write` is the normal ingestion
+    path; the background task calls it for pending readings once their farmer has a token.
+    If the bucket backend fails, readings are admitted (fail open) and the error is counted.
+    """
+
+    def __init__(self, buckets, write: Callable[[Dict], Awaitable[None]], coalesce: bool = False, flush_interval: float = 0.2):
+        self.buckets = buckets
+        self.write = write
+        self.coalesce = coalesce
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters exposed through stats()
+        self.admitted = 0
+        self.shed = {FARMER_LIMIT: 0, GLOBAL_LIMIT: 0}
+        self.coalesced = 0
+        self.coalesced_replaced = 0  # pending readings superseded by a newer one before being written
+        self.coalesced_written = 0
+        self.batch_admitted = 0  # rows
+        self.batch_shed = 0      # rows
+        self.errors = 0
+
+    async def admit(self, row: Dict) -> bool:
+        """True: write the reading now. False: held as the farmer's pending reading. Raises RateLimitedError."""
+        farmer_id = row["farmer_id"]
+        try:
+            outcome, wait = await self.buckets.take(farmer_id)
+        except Exception:
+            self.errors += 1
+            logger.exception("Admission control backend failed; admitting the reading")
+            return True
+
+        if outcome == ADMITTED:
+            self.admitted += 1
+            metrics.ingest_admission.inc(ADMITTED, "none")
+            return True
+        if self.coalesce:
+            if self._pending.get(farmer_id) is not None:
+                self.coalesced_replaced += 1
+            self._pending[farmer_id] = row
+            self.coalesced += 1
+            metrics.ingest_admission.inc("coalesced", outcome)
+            return False
+        self.shed[outcome] += 1
+        metrics.ingest_admission.inc("shed", outcome)
+        raise RateLimitedError(outcome, wait)
+
+    async def admit_batch(self, count: int):
+        """Charge a batch upload of `count` rows to the global budget. Raises RateLimitedError (the whole batch is refused)."""
+        try:
+            outcome, wait = await self.buckets.take_batch(count)
+        except Exception:
+            self.errors += 1
+            logger.exception("Admission control backend failed; admitting the batch")
+            return
+        if outcome == ADMITTED:
+            self.batch_admitted += count
+            metrics.ingest_admission.inc(ADMITTED, "none", amount=count)
+            return
+        self.batch_shed += count
+        metrics.ingest_admission.inc("shed", outcome, amount=count)
+        raise RateLimitedError(outcome, wait)
+
+    async def start(self):
+        if self.coalesce:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write every pending reading, bypassing the limits."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending, self._pending = self._pending, {}
+        for row in pending.values():
+            await self._write(row)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Writing coalesced readings failed")
+
+    async def flush(self):
+        """Write each pending reading whose farmer has a token again."""
+        for farmer_id in list(self._pending):
+            outcome, _ = await self.buckets.take(farmer_id)
+            if outcome == GLOBAL_LIMIT:
+                break  # nobody else will get a token this round either
+            if outcome == ADMITTED:
+                await self._write(self._pending.pop(farmer_id))
+
+    async def _write(self, row: Dict):
+        try:
+            await self.write(row)
+            self.coalesced_written += 1
+        except Exception as e:  # buffer full or already stored: the reading is dropped
+            logger.warning("Coalesced reading from farmer %s not written: %s", row.get("farmer_id"), e)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": True,
+            "backend": type(self.buckets).__name__,
+            "farmer_rate": self.buckets.farmer_rate,
+            "global_rate": self.buckets.global_rate,
+            "batch_burst": self.buckets.batch_burst,
+            "coalesce": self.coalesce,
+            "buckets": len(self.buckets),
+            "admitted": self.admitted,
+            "shed_farmer_limit": self.shed[FARMER_LIMIT],
+            "shed_global_limit": self.shed[GLOBAL_LIMIT],
+            "coalesced": self.coalesced,
+            "coalesced_replaced": self.coalesced_replaced,
+            "coalesced_written": self.coalesced_written,
+            "batch_admitted": self.batch_admitted,
+            "batch_shed": self.batch_shed,
+            "pending": len(self._pending),
+            "errors": self.errors,
+        }
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+def build_admission_controller(write: Callable[[Dict], Awaitable[None]]) -> Optional[AdmissionController]:
+    farmer_rate = float(os.getenv("INGEST_RATE_PER_FARMER", "0"))
+    global_rate = float(os.getenv("INGEST_RATE_GLOBAL", "0"))
+    if farmer_rate <= 0 and global_rate <= 0:
+        return None  # no limits configured
+    # Default bursts: 10 s of the farmer rate (a node flushing a short backlog), 1 s of the global one
+    farmer_burst = float(os.getenv("INGEST_BURST_PER_FARMER", "0")) or max(1.0, farmer_rate * 10)
+    global_burst = float(os.getenv("INGEST_BURST_GLOBAL", "0")) or max(1.0, global_rate)
+    # Batch uploads may borrow up to 10 s of the global rate by default (an offline backlog replayed at once)
+    batch_burst = float(os.getenv("INGEST_BURST_BATCH", "0")) or max(global_burst, global_rate * 10)
+    redis_url = os.getenv("INGEST_RATE_REDIS_URL")
+    if redis_url:
+        buckets = RedisBuckets(redis_url, farmer_rate, farmer_burst, global_rate, global_burst, batch_burst=batch_burst)
+    else:
+        buckets = LocalBuckets(farmer_rate, farmer_burst, global_rate, global_burst, batch_burst=batch_burst)
+    coalesce = os.getenv("INGEST_COALESCE", "0").lower() not in ("0", "false", "no")
+    return AdmissionController(buckets, write, coalesce=coalesce)
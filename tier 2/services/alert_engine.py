@@ -0,0 +1,325 @@
+"""
+Streaming disaster-alert engine, evaluated on every ingested reading.
+
+Rules are declarative (data/alert_rules.json, ALERT_RULES_PATH). Each one watches a single
+telemetry field through an aggregate:
+
+    value   the reading itself
+    avg     mean over the last `window` seconds
+    rate    change per hour between the oldest and newest sample in the last `window`
+            seconds, once the samples span at least half the window
+
+A window is a ring of WINDOW_BUCKETS fixed time buckets (sum, count and first sample of
+each) rather than every sample, so its memory does not grow with the reading rate. Buckets
+expire whole, so the window is exact to within one bucket (1/WINDOW_BUCKETS of its length).
+
+and fires when the aggregate has been `op` `threshold` for `for` seconds (0 = at once). An
+active alert clears only when the aggregate crosses back past `clear`, so a value hovering
+around the threshold does not flap. Per (farmer, rule) state is updated in amortized O(1)
+per reading and readings older than the last one seen are ignored.
+
+Fired and cleared alerts are written to the `alerts` table by a background task; a partial
+unique index keeps at most one active alert per (farmer, rule) even with several workers.
+At most `max_pending` events wait for the writer; while the database is down the oldest are
+dropped (and counted) rather than growing the queue without bound.
+The engine's windows live in each worker process, like the in-process latest cache.
+"""
+import asyncio
+import json
+import logging
+import operator
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "alert_rules.json")
+AGGREGATES = ("value", "avg", "rate")
+WINDOW_BUCKETS = 60
+OPERATORS = {">": operator.gt, "<": operator.lt}
+
+
+class AlertRule:
+    def __init__(self, id: str, type: str, severity: str, message: str, metric: str, op: str, threshold: float,
+                 clear: Optional[float] = None, aggregate: str = "value", window: float = 0, **options):
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Alert rule {id!r}: unknown aggregate {aggregate!r}")
+        if op not in OPERATORS:
+            raise ValueError(f"Alert rule {id!r}: op must be one of {', '.join(OPERATORS)}")
+        if aggregate != "value" and window <= 0:
+            raise ValueError(f"Alert rule {id!r}: aggregate {aggregate!r} needs a window")
+        self.id = id
+        self.type = type
+        self.severity = severity
+        self.message = message
+        self.metric = metric
+        self.aggregate = aggregate
+        self.window = float(window)
+        self.op = op
+        self.threshold = float(threshold)
+        self.clear = float(clear) if clear is not None else self.threshold
+        self.hold = float(options.get("for", 0))
+        self.bucket_width = self.window / WINDOW_BUCKETS
+        # Hysteresis: the clear level must sit on the safe side of the threshold
+        if OPERATORS[op](self.clear, self.threshold):
+            raise ValueError(f"Alert rule {id!r}: clear level {self.clear} is past the threshold {self.threshold}")
+
+    def breached(self, signal: float) -> bool:
+        return OPERATORS[self.op](signal, self.threshold)
+
+    def recovered(self, signal: float) -> bool:
+        return signal < self.clear if self.op == ">" else signal > self.clear
+
+
+def load_rules(path: str = DEFAULT_RULES_PATH) -> List[AlertRule]:
+    with open(path, encoding="utf-8") as f:
+        rules = [AlertRule(**rule) for rule in json.load(f)["rules"]]
+    ids = [rule.id for rule in rules]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Duplicate alert rule ids in {path}")
+    return rules
+
+
+class RuleState:
+    """Incremental state of one rule for one farmer."""
+
+    __slots__ = ("buckets", "total", "count", "last_ts", "breach_since", "active")
+
+    def __init__(self):
+        self.buckets: deque = deque()  # [bucket index, sum, count, first ts, first value], oldest first
+        self.total = 0.0
+        self.count = 0
+        self.last_ts: Optional[float] = None
+        self.breach_since: Optional[float] = None
+        self.active = False
+
+    def signal(self, rule: AlertRule, ts: float, value: float) -> Optional[float]:
+        if rule.aggregate == "value":
+            return value
+        index = int(ts // rule.bucket_width)
+        if self.buckets and self.buckets[-1][0] == index:
+            bucket = self.buckets[-1]
+            bucket[1] += value
+            bucket[2] += 1
+        else:
+            self.buckets.append([index, value, 1, ts, value])
+        self.total += value
+        self.count += 1
+        while self.buckets[0][0] <= index - WINDOW_BUCKETS:
+            _, old_total, old_count, _, _ = self.buckets.popleft()
+            self.total -= old_total
+            self.count -= old_count
+        if rule.aggregate == "avg":
+            return self.total / self.count
+        _, _, _, first_ts, first = self.buckets[0]
+        span = ts - first_ts
+        if span < rule.window / 2:
+            return None  # not enough history for a meaningful rate yet
+        return (value - first) / span * 3600
+
+
+def event_to_dict(event: Dict) -> Dict:
+    """Fire / clear event in the shape of an /api/disaster-alerts item, for the live telemetry push."""
+    rule = event["rule"]
+    return {
+        "action": event["action"],
+        "type": rule.type,
+        "severity": rule.severity,
+        "message": rule.message,
+        "rule": rule.id,
+        "value": event["value"],
+        "at": event["at"].isoformat(),
+    }
+
+
+class AlertEngine:
+    """
+    Evaluates `rules` on each reading (observe) and queues fire / clear events, which a
+    background task writes to `table` every `flush_interval` seconds.
+    """
+
+    def __init__(self, engine, table, rules: List[AlertRule], flush_interval: float = 1.0, executor=None,
+                 max_pending: int = 10000):
+        self.engine = engine
+        self.table = table
+        self.rules = rules
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.executor = executor  # None -> the loop's default thread pool
+
+        self._states: Dict[int, Dict[str, RuleState]] = {}
+        self._pending: deque = deque()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters exposed through stats()
+        self.evaluated = 0
+        self.fired = 0
+        self.cleared = 0
+        self.write_errors = 0
+        self.dropped_events = 0
+        self.last_eval_us = 0.0
+        self.max_eval_us = 0.0
+
+    def observe(self, row: Dict) -> List[Dict]:
+        """Feed one reading (a soil_data row with a typed `ts`). Returns the events it triggered."""
+        started = time.perf_counter()
+        farmer_id = row["farmer_id"]
+        ts = row["ts"].timestamp()
+        states = self._states.get(farmer_id)
+        if states is None:
+            states = self._states[farmer_id] = {rule.id: RuleState() for rule in self.rules}
+
+        events = []
+        for rule in self.rules:
+            value = row.get(rule.metric)
+            state = states[rule.id]
+            if value is None or (state.last_ts is not None and ts < state.last_ts):
+                continue
+            state.last_ts = ts
+            signal = state.signal(rule, ts, float(value))
+            if signal is None:
+                continue
+
+            if state.active:
+                if rule.recovered(signal):
+                    state.active = False
+                    state.breach_since = None
+                    events.append(self._event("clear", farmer_id, rule, signal, row["ts"]))
+            elif rule.breached(signal):
+                if state.breach_since is None:
+                    state.breach_since = ts
+                if ts - state.breach_since >= rule.hold:
+                    state.active = True
+                    events.append(self._event("fire", farmer_id, rule, signal, row["ts"]))
+            else:
+                state.breach_since = None
+
+        self.evaluated += 1
+        if events:
+            self._pending.extend(events)
+            self._trim_pending()
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        self.last_eval_us = elapsed_us
+        self.max_eval_us = max(self.max_eval_us, elapsed_us)
+        return events
+
+    def _trim_pending(self):
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            for _ in range(overflow):
+                self._pending.popleft()
+            self.dropped_events += overflow
+            logger.error("Alert write queue full (%d events): dropped the %d oldest", self.max_pending, overflow)
+
+    def _event(self, action: str, farmer_id: int, rule: AlertRule, signal: float, at: datetime) -> Dict:
+        if action == "fire":
+            self.fired += 1
+        else:
+            self.cleared += 1
+        return {"action": action, "farmer_id": farmer_id, "rule": rule, "value": round(signal, 3), "at": at}
+
+    async def start(self):
+        """Restore which alerts are active, then start the background writer."""
+        self._flush_lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        for farmer_id, rule_id in await loop.run_in_executor(self.executor, self._load_active):
+            states = self._states.setdefault(farmer_id, {rule.id: RuleState() for rule in self.rules})
+            if rule_id in states:
+                states[rule_id].active = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error("Alert shutdown: %d alert events could not be written", len(self._pending))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            events = list(self._pending)
+            self._pending.clear()
+            try:
+                await asyncio.get_running_loop().run_in_executor(self.executor, self._write, events)
+            except Exception:
+                self.write_errors += 1
+                self._pending.extendleft(reversed(events))
+                logger.exception("Writing %d alert events failed, requeued", len(events))
+                self._trim_pending()
+
+    def _load_active(self):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(self.table.c.farmer_id, self.table.c.rule).where(self.table.c.cleared_at.is_(None))
+            ).all()
+
+    def _write(self, events: List[Dict]):
+        table = self.table
+        insert_fn = pg_insert if self.engine.dialect.name == "postgresql" else sqlite_insert
+        now = datetime.now(timezone.utc)
+        with self.engine.begin() as conn:
+            # In order, so an alert that fired and cleared within one flush ends up cleared
+            for event in events:
+                rule = event["rule"]
+                if event["action"] == "fire":
+                    conn.execute(
+                        insert_fn(table)
+                        .values(
+                            farmer_id=event["farmer_id"], rule=rule.id, type=rule.type, severity=rule.severity,
+                            message=rule.message, value=event["value"], started_at=event["at"], created_at=now,
+                        )
+                        .on_conflict_do_nothing(index_elements=["farmer_id", "rule"], index_where=table.c.cleared_at.is_(None))
+                    )
+                else:
+                    conn.execute(
+                        update(table)
+                        .where(and_(table.c.farmer_id == event["farmer_id"], table.c.rule == rule.id, table.c.cleared_at.is_(None)))
+                        .values(cleared_at=event["at"], cleared_value=event["value"])
+                    )
+
+    def stats(self) -> Dict:
+        return {
+            "rules": len(self.rules),
+            "farmers_tracked": len(self._states),
+            "active": sum(state.active for states in self._states.values() for state in states.values()),
+            "evaluated": self.evaluated,
+            "fired": self.fired,
+            "cleared": self.cleared,
+            "pending_writes": len(self._pending),
+            "write_errors": self.write_errors,
+            "dropped_events": self.dropped_events,
+            "last_eval_us": round(self.last_eval_us, 1),
+            "max_eval_us": round(self.max_eval_us, 1),
+        }
+
+
+def build_alert_engine(engine, table) -> AlertEngine:
+    return AlertEngine(
+        engine,
+        table,
+        load_rules(os.getenv("ALERT_RULES_PATH", DEFAULT_RULES_PATH)),
+        flush_interval=float(os.getenv("ALERT_FLUSH_INTERVAL", "1.0")),
+        max_pending=int(os.getenv("ALERT_MAX_PENDING", "10000")),
+    )
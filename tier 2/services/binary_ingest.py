@@ -0,0 +1,197 @@
+"""
+Ingestion gateway for the compact binary frames in telemetry_codec.py, over UDP and/or MQTT.
+
+Both transports hand raw frames to one bounded queue; a single worker decodes them and passes
+each reading to `ingest`, the same validate -> buffer -> alerts / live push -> latest-cache
+path as POST /api/soil-data. Neither transport has a way to tell a node to back off, so
+when the queue is full (or the ingestion buffer answers BufferFullError, or admission control
+RateLimitedError) readings are dropped and counted rather than queued without bound.
+
+UDP binds with SO_REUSEPORT so every Uvicorn worker can listen on the same port and the
+kernel spreads datagrams between them. MQTT subscribes through the shared subscription
+`$share/agrisphere-ingest/<topic>/#`, so each message is delivered to one worker only.
+MQTT needs the `aiomqtt` package.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from .admission import RateLimitedError
+from .ingestion import BufferFullError, DuplicateReadingError
+from .telemetry_codec import FrameError, decode_frame
+
+logger = logging.getLogger(__name__)
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, gateway: "BinaryIngestGateway"):
+        self.gateway = gateway
+
+    def datagram_received(self, data: bytes, addr):
+        self.gateway.receive(data)
+
+
+class BinaryIngestGateway:
+    def __init__(self, ingest: Callable[[Dict], Awaitable[Optional[bool]]], udp_port: Optional[int] = None, udp_host: str = "0.0.0.0",
+                 mqtt_url: Optional[str] = None, mqtt_topic: str = "agrisphere/telemetry", max_pending: int = 10000,
+                 udp_rcvbuf: int = 4 << 20):
+        self.ingest = ingest
+        self.udp_port = udp_port
+        self.udp_host = udp_host
+        self.udp_rcvbuf = udp_rcvbuf  # capped by net.core.rmem_max
+        self.mqtt_url = mqtt_url
+        self.mqtt_topic = mqtt_topic
+        self.max_pending = max_pending
+
+        self._frames: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._transport = None
+        self._tasks = []
+
+        # Counters exposed through stats()
+        self.frames = 0
+        self.bytes = 0
+        self.frames_dropped = 0
+        self.frame_errors = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.buffer_full = 0
+        self.duplicates = 0  # device retries dropped as already accepted
+        self.rate_limited = 0  # shed by admission control
+        self.coalesced = 0
+        self.last_error: Optional[str] = None
+
+    def receive(self, frame: bytes):
+        self.frames += 1
+        self.bytes += len(frame)
+        if len(self._frames) >= self.max_pending:
+            self.frames_dropped += 1
+            return
+        self._frames.append(frame)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._worker()))
+        if self.udp_port is not None:
+            loop = asyncio.get_running_loop()
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _UdpProtocol(self), local_addr=(self.udp_host, self.udp_port), reuse_port=hasattr(socket, "SO_REUSEPORT"),
+            )
+            # Bursts of small datagrams overflow the default receive buffer long before it is full of bytes
+            try:
+                self._transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.udp_rcvbuf)
+            except OSError:
+                logger.warning("Could not raise the UDP receive buffer to %d bytes", self.udp_rcvbuf)
+            logger.info("Binary ingestion listening on udp://%s:%d", self.udp_host, self.udp_port)
+        if self.mqtt_url:
+            self._tasks.append(asyncio.create_task(self._mqtt()))
+
+    async def stop(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        for task in self._tasks[1:]:
+            task.cancel()
+        # Let the worker finish what is already queued
+        await self.drain()
+        self._tasks[0].cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while self._frames and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    async def _worker(self):
+        while True:
+            while not self._frames:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            frame = self._frames.popleft()
+            try:
+                records = decode_frame(frame)
+            except FrameError as e:
+                self.frame_errors += 1
+                self.last_error = str(e)
+                continue
+            for record in records:
+                try:
+                    if await self.ingest(record) is False:
+                        self.coalesced += 1  # over the farmer's rate, held as its latest reading
+                    else:
+                        self.accepted += 1
+                except DuplicateReadingError:
+                    self.duplicates += 1
+                except RateLimitedError:
+                    self.rate_limited += 1
+                except BufferFullError:
+                    self.buffer_full += 1
+                except ValueError as e:  # pydantic ValidationError and bounds checks
+                    self.rejected += 1
+                    self.last_error = str(e)
+                except Exception:
+                    self.rejected += 1
+                    logger.exception("Binary ingestion of a reading failed")
+
+    async def _mqtt(self):
+        try:
+            import aiomqtt
+        except ImportError:
+            logger.error("BINARY_INGEST_MQTT_URL is set but the 'aiomqtt' package is not installed")
+            return
+        url = urlparse(self.mqtt_url)
+        topic = f"$share/agrisphere-ingest/{self.mqtt_topic}/#"
+        delay = 1
+        while True:
+            try:
+                async with aiomqtt.Client(url.hostname, port=url.port or 1883, username=url.username, password=url.password) as client:
+                    await client.subscribe(topic, qos=1)
+                    logger.info("Binary ingestion subscribed to %s on %s", topic, url.hostname)
+                    delay = 1
+                    async for message in client.messages:
+                        self.receive(bytes(message.payload))
+            except aiomqtt.MqttError as e:
+                logger.warning("MQTT connection lost (%s), reconnecting in %ds", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    def stats(self) -> Dict:
+        return {
+            "udp_port": self.udp_port,
+            "mqtt": bool(self.mqtt_url),
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "queue_depth": len(self._frames),
+            "frames_dropped": self.frames_dropped,
+            "frame_errors": self.frame_errors,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "buffer_full": self.buffer_full,
+            "duplicates": self.duplicates,
+            "rate_limited": self.rate_limited,
+            "coalesced": self.coalesced,
+            "last_error": self.last_error,
+        }
+
+
+def build_binary_gateway(ingest: Callable[[Dict], Awaitable[Optional[bool]]]) -> Optional[BinaryIngestGateway]:
+    udp_port = os.getenv("BINARY_INGEST_UDP_PORT")
+    mqtt_url = os.getenv("BINARY_INGEST_MQTT_URL")
+    if not udp_port and not mqtt_url:
+        return None  # HTTP/JSON ingestion only
+    return BinaryIngestGateway(
+        ingest,
+        udp_port=int(udp_port) if udp_port else None,
+        udp_host=os.getenv("BINARY_INGEST_UDP_HOST", "0.0.0.0"),
+        mqtt_url=mqtt_url,
+        mqtt_topic=os.getenv("BINARY_INGEST_MQTT_TOPIC", "agrisphere/telemetry"),
+        max_pending=int(os.getenv("BINARY_INGEST_MAX_PENDING", "10000")),
+    )
@@ -1,25 +1,89 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
-def predict_crop_suitability(nitrogen: float, phosphorus: float, potassium: float, ph: float, temp: float, humidity: float, rainfall: float) -> List[Dict]:
+import numpy as np
+
+from .crop_registry import FEATURES, get_registry
+
+# Suitability points lost when a reading falls outside a crop's ideal range for that feature
+PENALTIES = {"nitrogen": 5, "phosphorus": 5, "potassium": 5, "ph": 15, "temp": 10, "humidity": 5, "rainfall": 5}
+PENALTY_WEIGHTS = np.array([PENALTIES[f] for f in FEATURES], dtype=np.float64)
+CHUNK_CELLS = 1 << 22
+
+
+class CropMatrix:
+    """
+    In-memory crop table with the same array attributes as the CropRegistry (names,
+    base_scores, ideal_low, ideal_high), for scoring against an ad-hoc list of crops.
+    """
+
+    def __init__(self, crops: List[Dict]):
+        self.names = [crop["name"] for crop in crops]
+        self.base_scores = np.array([crop["base_score"] for crop in crops], dtype=np.float64)
+        self.ideal_low = np.array([[crop["ideal"][f][0] for f in FEATURES] for crop in crops], dtype=np.float64).reshape(len(crops), len(FEATURES))
+        self.ideal_high = np.array([[crop["ideal"][f][1] for f in FEATURES] for crop in crops], dtype=np.float64).reshape(len(crops), len(FEATURES))
+
+    def __len__(self):
+        return len(self.names)
+
+
+def score_readings(readings: np.ndarray, matrix=None) -> np.ndarray:
+    """
+    Suitability (0-100) of every crop for every reading in one vectorized pass.
+    `readings` is (n_readings x len(FEATURES)); NaN marks a missing sensor and costs nothing.
+    Returns an (n_readings x n_crops) array. `matrix` defaults to the shared crop registry.
+    """
+    matrix = matrix if matrix is not None else get_registry()
+    readings = np.asarray(readings, dtype=np.float64)
+    if readings.ndim == 1:
+        readings = readings[np.newaxis, :]
+
+    # Chunked so the (rows x crops x features) comparison temporaries stay a few MB for large fleets
+    scores = np.empty((len(readings), len(matrix)))
+    chunk = max(1, CHUNK_CELLS // max(1, matrix.ideal_low.size))
+    for start in range(0, len(readings), chunk):
+        values = readings[start:start + chunk, np.newaxis, :]  # broadcast against the (n_crops x n_features) ranges
+        outside = (values < matrix.ideal_low) | (values > matrix.ideal_high)  # NaN compares False -> in range
+        scores[start:start + chunk] = matrix.base_scores - outside @ PENALTY_WEIGHTS
+    return np.maximum(0, scores, out=scores)
+
+
+def rank_crops(readings: np.ndarray, top_k: Optional[int] = None, matrix=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ranked top-k crops per reading. Returns (crop indices, scores), both (n_readings x k),
+    best first; ties keep table order. Map indices to names with `matrix.names`.
+    """
+    scores = score_readings(readings, matrix)
+    n_crops = scores.shape[1]
+    k = n_crops if top_k is None else max(0, min(top_k, n_crops))
+
+    if k < n_crops:
+        # argpartition narrows each row to its k best before the (stable) sort
+        candidates = np.sort(np.argpartition(-scores, k - 1, axis=1)[:, :k], axis=1) if k else np.empty((len(scores), 0), dtype=np.intp)
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.take_along_axis(candidates, np.argsort(-candidate_scores, axis=1, kind="stable"), axis=1)
+    else:
+        order = np.argsort(-scores, axis=1, kind="stable")
+    return order, np.take_along_axis(scores, order, axis=1)
+
+
+def readings_matrix(rows) -> np.ndarray:
+    """Build the (n x len(FEATURES)) input from objects or dicts with the reading attributes (None -> NaN)."""
+    matrix = np.full((len(rows), len(FEATURES)), np.nan)
+    for i, row in enumerate(rows):
+        for j, feature in enumerate(FEATURES):
+            value = row.get(feature) if isinstance(row, dict) else getattr(row, feature, None)
+            if value is not None:
+                matrix[i, j] = value
+    return matrix
+
+
+def predict_crop_suitability(nitrogen: float, phosphorus: float, potassium: float, ph: float, temp: float, humidity: float, rainfall: float,
+                             top_k: Optional[int] = None) -> List[Dict]:
     """
     Mock ML Model inference based on ideal ranges for Crops in different conditions.
+    Single-reading wrapper over rank_crops(): the `top_k` best crops (default: all), best first.
     """
-    available_crops = [
-        {"name": "Rice", "ideal_ph": (6.0, 7.0), "ideal_temp": (20, 27), "base_score": 85},
-        {"name": "Tomato", "ideal_ph": (6.0, 6.8), "ideal_temp": (20, 24), "base_score": 92},
-        {"name": "Maize", "ideal_ph": (5.8, 7.0), "ideal_temp": (18, 27), "base_score": 88},
-        {"name": "Wheat", "ideal_ph": (6.0, 7.5), "ideal_temp": (15, 25), "base_score": 80},
-    ]
-    
-    predictions = []
-    for crop in available_crops:
-        # Calculate penalties for deviations from ideal ranges
-        ph_penalty = 0 if crop["ideal_ph"][0] <= ph <= crop["ideal_ph"][1] else 15
-        temp_penalty = 0 if crop["ideal_temp"][0] <= temp <= crop["ideal_temp"][1] else 10
-        
-        # Calculate final ML probability proxy (0-100%)
-        suitability_score = max(0, crop["base_score"] - ph_penalty - temp_penalty)
-        predictions.append({"crop": crop["name"], "suitability_score": suitability_score})
-        
-    # Sort by highest suitability
-    return sorted(predictions, key=lambda x: x["suitability_score"], reverse=True)
+    registry = get_registry()  # one version for both the scores and the names
+    reading = np.array([np.nan if v is None else v for v in (nitrogen, phosphorus, potassium, ph, temp, humidity, rainfall)], dtype=np.float64)
+    order, scores = rank_crops(reading, top_k, registry)
+    return [{"crop": registry.names[index], "suitability_score": int(score)} for index, score in zip(order[0].tolist(), scores[0].tolist())]
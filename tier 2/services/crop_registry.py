@@ -0,0 +1,264 @@
+"""
+Crop knowledge base shared by crop_prediction, fertilizer_optimizer and market_api.
+
+The source of truth is data/crops.json (CROP_REGISTRY_PATH). On first use it is compiled
+into a directory of flat .npy arrays keyed by the source file's mtime and size, which every
+Uvicorn worker memory-maps read-only, so the pages are shared through the OS page cache
+instead of being copied per process:
+
+    names, base_scores, ideal_low/ideal_high (crops x FEATURES), npk_target (crops x 3),
+    saturation, trend, season_bitmaps (12 x ceil(crops / 8), one bit per crop per month),
+    alias_keys / alias_index (normalized names and aliases, sorted -> crop row)
+
+Lookups work on the mapped arrays too: names are read from the array on access and aliases
+are found by binary search, so a worker holds no per-crop Python objects.
+
+get_registry() never blocks once the registry is loaded: every CROP_REGISTRY_CHECK_INTERVAL
+seconds it starts a background thread that re-checks the source and, when it changed,
+recompiles it and swaps the new registry in with one reference assignment. Callers keep
+getting the previous version meanwhile; an invalid edit is logged and the old one is kept.
+
+    python -m services.crop_registry    # compile ahead of time (e.g. in the Docker build)
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Reading features, in the column order of the ideal-range matrices
+FEATURES = ("nitrogen", "phosphorus", "potassium", "ph", "temp", "humidity", "rainfall")
+SATURATION_LEVELS = ("LOW", "MEDIUM", "HIGH")
+PRICE_TRENDS = ("UNKNOWN", "UPWARD", "STABLE", "DOWNWARD")
+NAME_WIDTH = 64
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "crops.json")
+CHECK_INTERVAL = float(os.getenv("CROP_REGISTRY_CHECK_INTERVAL", "5"))
+
+FORMAT_VERSION = 2  # bumped when the compiled layout changes (2: alias_keys sorted)
+ARRAYS = ("names", "base_scores", "ideal_low", "ideal_high", "npk_target", "saturation", "trend", "season_bitmaps", "alias_keys", "alias_index")
+
+
+def normalize(name: str) -> str:
+    """Lookup key for crop names and aliases: case-insensitive, whitespace-collapsed."""
+    return " ".join(str(name).split()).casefold()
+
+
+def load_source(path: str = DEFAULT_PATH) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        crops = json.load(f)["crops"]
+    for crop in crops:
+        missing = [f for f in FEATURES if f not in crop.get("ideal", {})]
+        if missing:
+            raise ValueError(f"Crop {crop.get('name')!r} has no ideal range for {', '.join(missing)}")
+        if len(crop["name"]) > NAME_WIDTH:
+            raise ValueError(f"Crop name {crop['name']!r} is longer than {NAME_WIDTH} characters")
+        bad_months = [m for m in crop.get("season_months", []) if not isinstance(m, int) or isinstance(m, bool) or not 1 <= m <= 12]
+        if bad_months:
+            raise ValueError(f"Crop {crop['name']!r} has season months outside 1-12: {bad_months}")
+    return crops
+
+
+def compile_arrays(crops: List[Dict]) -> Dict[str, np.ndarray]:
+    count = len(crops)
+    season = np.zeros((12, count), dtype=bool)
+    alias_keys, alias_index, seen = [], [], set()
+    for i, crop in enumerate(crops):
+        for month in crop.get("season_months", []):
+            season[month - 1, i] = True
+        for key in [crop["name"], *crop.get("aliases", [])]:
+            key = normalize(key)
+            if key in seen:
+                raise ValueError(f"Crop name or alias {key!r} is used twice")
+            seen.add(key)
+            alias_keys.append(key)
+            alias_index.append(i)
+    # Sorted for np.searchsorted (numpy orders unicode arrays by code point, like Python)
+    order = sorted(range(len(alias_keys)), key=alias_keys.__getitem__)
+
+    return {
+        "names": np.array([crop["name"] for crop in crops], dtype=f"U{NAME_WIDTH}"),
+        "base_scores": np.array([crop["base_score"] for crop in crops], dtype=np.float64),
+        "ideal_low": np.array([[crop["ideal"][f][0] for f in FEATURES] for crop in crops], dtype=np.float64).reshape(count, len(FEATURES)),
+        "ideal_high": np.array([[crop["ideal"][f][1] for f in FEATURES] for crop in crops], dtype=np.float64).reshape(count, len(FEATURES)),
+        "npk_target": np.array([[crop.get("npk_target", {}).get(k, np.nan) for k in "NPK"] for crop in crops], dtype=np.float64).reshape(count, 3),
+        "saturation": np.array([SATURATION_LEVELS.index(crop.get("market_saturation", "HIGH")) for crop in crops], dtype=np.uint8),
+        "trend": np.array([PRICE_TRENDS.index(crop.get("expected_price_trend", "UNKNOWN")) for crop in crops], dtype=np.uint8),
+        "season_bitmaps": np.packbits(season, axis=1),
+        "alias_keys": np.array([alias_keys[i] for i in order], dtype=f"U{NAME_WIDTH}"),
+        "alias_index": np.array([alias_index[i] for i in order], dtype=np.int32),
+    }
+
+
+def source_stamp(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def compiled_dir_for(path: str, stamp: str) -> str:
+    base = os.getenv("CROP_REGISTRY_COMPILED_DIR") or os.path.join(os.path.dirname(os.path.abspath(path)), ".compiled")
+    return os.path.join(base, f"{os.path.splitext(os.path.basename(path))[0]}.v{FORMAT_VERSION}-{stamp}")
+
+
+def compile_registry(path: str = DEFAULT_PATH) -> str:
+    """Compile `path` if its current version isn't compiled yet. Returns the compiled directory."""
+    target = compiled_dir_for(path, source_stamp(path))
+    if os.path.isdir(target):
+        return target
+
+    arrays = compile_arrays(load_source(path))
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=".staging-")
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), array)
+    try:
+        os.rename(staging, target)  # atomic; another worker may have won the race
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    # Keep the previous version for workers that still map it; drop anything older
+    prefix = os.path.basename(target).rsplit("-", 2)[0] + "-"
+    versions = sorted((d for d in os.listdir(parent) if d.startswith(prefix)), key=lambda d: os.path.getmtime(os.path.join(parent, d)))
+    for old in versions[:-2]:
+        shutil.rmtree(os.path.join(parent, old), ignore_errors=True)
+    return target
+
+
+class _StringColumn(Sequence):
+    """A mapped string array as a sequence of plain str, converted one item at a time."""
+
+    __slots__ = ("_array",)
+
+    def __init__(self, array: np.ndarray):
+        self._array = array
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [str(item) for item in self._array[index]]
+        return str(self._array[index])
+
+
+class CropRegistry:
+    """Read-only view over one compiled version. Row index == crop id for the array lookups."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        self.base_scores = arrays["base_scores"]
+        self.ideal_low = arrays["ideal_low"]
+        self.ideal_high = arrays["ideal_high"]
+        self.npk_targets = arrays["npk_target"]
+        self.saturation = arrays["saturation"]
+        self.trend = arrays["trend"]
+        self.season_bitmaps = arrays["season_bitmaps"]
+        self.names = _StringColumn(arrays["names"])
+        self.alias_keys = arrays["alias_keys"]
+        self.alias_index = arrays["alias_index"]
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Row of a crop by name or alias, case-insensitive (binary search over the sorted keys)."""
+        key = normalize(name)
+        if len(key) > NAME_WIDTH:
+            return None  # no key is that long
+        position = int(np.searchsorted(self.alias_keys, key))
+        if position < len(self.alias_keys) and self.alias_keys[position] == key:
+            return int(self.alias_index[position])
+        return None
+
+    def in_season(self, index: int, month: int) -> bool:
+        if not 1 <= month <= 12:
+            return False
+        return bool((self.season_bitmaps[month - 1, index >> 3] >> (7 - (index & 7))) & 1)
+
+    def in_season_mask(self, month: int) -> np.ndarray:
+        """Boolean mask over all crops for one month."""
+        return np.unpackbits(self.season_bitmaps[month - 1], count=len(self.names)).astype(bool)
+
+    def npk_target(self, index: int) -> Optional[Dict[str, float]]:
+        target = self.npk_targets[index]
+        if np.isnan(target).any():
+            return None
+        return {"N": float(target[0]), "P": float(target[1]), "K": float(target[2])}
+
+    def market(self, index: int, month: int) -> Dict:
+        return {
+            "in_season": self.in_season(index, month),
+            "market_saturation": SATURATION_LEVELS[self.saturation[index]],
+            "expected_price_trend": PRICE_TRENDS[self.trend[index]],
+        }
+
+
+_registry: Optional[CropRegistry] = None
+_stamp: Optional[str] = None
+_checked_at = 0.0
+_lock = threading.Lock()  # held by the first load and by the (single) background refresh
+
+
+def _reload():
+    """Compile and swap in the source if it changed since the current version. Call with _lock held."""
+    global _registry, _stamp
+    path = os.getenv("CROP_REGISTRY_PATH", DEFAULT_PATH)
+    stamp = None
+    try:
+        stamp = source_stamp(path)
+        if stamp != _stamp or _registry is None:
+            registry = CropRegistry(compile_registry(path))
+            if _registry is not None:
+                logger.info("Crop registry reloaded from %s (%d crops)", path, len(registry))
+            _registry = registry  # a single assignment: readers see the old or the new version, never a mix
+            _stamp = stamp
+    except Exception:
+        if _registry is None:
+            raise
+        logger.exception("Crop registry reload failed; keeping the previous version")
+        _stamp = stamp or _stamp  # don't retry the same broken file every interval
+
+
+def _refresh():
+    try:
+        _reload()
+    finally:
+        _lock.release()
+
+
+def get_registry() -> CropRegistry:
+    """Current registry. Only the first call loads it synchronously; later changes are picked up in the background."""
+    global _checked_at
+    registry = _registry
+    if registry is None:
+        with _lock:
+            if _registry is None:
+                _checked_at = time.monotonic()
+                _reload()
+            return _registry
+
+    now = time.monotonic()
+    if CHECK_INTERVAL > 0 and now - _checked_at >= CHECK_INTERVAL and _lock.acquire(blocking=False):
+        _checked_at = now
+        try:
+            threading.Thread(target=_refresh, name="crop-registry-reload", daemon=True).start()
+        except Exception:
+            _lock.release()
+            raise
+    return registry
+
+
+if __name__ == "__main__":
+    source = os.getenv("CROP_REGISTRY_PATH", DEFAULT_PATH)
+    directory = compile_registry(source)
+    print(f"Compiled {len(CropRegistry(directory))} crops from {source} into {directory}")
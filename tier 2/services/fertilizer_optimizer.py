@@ -1,15 +1,12 @@
 from typing import Dict
 
-# Dictionary defining exact target NPK requirements in kg/hectare
-CROP_REQUIREMENTS = {
-    "Tomato": {"N": 100, "P": 60, "K": 120},
-    "Rice": {"N": 120, "P": 40, "K": 40},
-    "Maize": {"N": 150, "P": 50, "K": 100},
-    "Wheat": {"N": 120, "P": 60, "K": 40},
-}
+from .crop_registry import get_registry
 
 def calculate_fertilizer_deficit(crop_name: str, current_n: float, current_p: float, current_k: float) -> Dict:
-    requirements = CROP_REQUIREMENTS.get(crop_name)
+    # Target NPK requirements in kg/hectare come from the crop registry (data/crops.json)
+    registry = get_registry()
+    index = registry.lookup(crop_name)
+    requirements = registry.npk_target(index) if index is not None else None
     if not requirements:
         return {"error": "Crop requirements unknown."}
         
@@ -32,7 +29,7 @@ def calculate_fertilizer_deficit(crop_name: str, current_n: float, current_p: fl
         recommendation += "Phosphorus deficit: Consider superphosphate. "
         
     return {
-        "crop": crop_name,
+        "crop": registry.names[index],
         "deficits": {"N": deficit_n, "P": deficit_p, "K": deficit_k},
         "recommendation": recommendation.strip() or "Soil nutrients are optimal."
     }
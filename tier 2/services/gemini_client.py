@@ -0,0 +1,96 @@
+"""
+Lazily constructed Gemini model.
+
+Importing google.generativeai costs about a second, and configuring it reads the API key.
+Doing that when main.py is imported would slow every worker start and every script that
+imports the app. LazyGeminiModel exposes the one method the app uses,
+generate_content_async. It imports and builds the real genai.GenerativeModel in a worker
+thread on first use, or earlier through preload(), which the app starts in the background
+once it is up.
+
+Every call goes through services.llm_gateway.LLMGateway (deadline, retries, circuit breaker).
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+from types import SimpleNamespace
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.5-flash-lite"  # the current API key doesn't support the 1.5 models
+
+
+class LazyGeminiModel:
+    def __init__(self, api_key: str, model_name: str = DEFAULT_MODEL):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import google.generativeai and build the model (blocking; idempotent)."""
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def preload(self):
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception:
+            logger.exception("Gemini client could not be initialised; will retry on first use")
+
+    async def generate_content_async(self, prompt):
+        model = self._model
+        if model is None:
+            model = await asyncio.to_thread(self.load)  # never block the event loop on the import
+        return await model.generate_content_async(prompt)
+
+
+class FakeGeminiModel:
+    """
+    Local stand-in for the Gemini API (GEMINI_MODEL=fake) for load tests and for trying out the
+    LLM gateway: answers after `latency` seconds (+/- `jitter`), fails a `failure_rate` share of
+    calls with TransientLLMError, and reports usage metadata like the real client.
+    """
+
+    model_name = "fake"
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    async def generate_content_async(self, prompt):
+        from .llm_gateway import TransientLLMError
+
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        if self._random.random() < self.failure_rate:
+            raise TransientLLMError("503 The model is overloaded (fake)")
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=60)
+        return SimpleNamespace(text="Fake agronomist explanation for load testing.", usage_metadata=usage)
+
+
+def build_gemini_model() -> Optional[Union[LazyGeminiModel, FakeGeminiModel]]:
+    model_name = os.getenv("GEMINI_MODEL", DEFAULT_MODEL)
+    if model_name == "fake":
+        return FakeGeminiModel(
+            latency=float(os.getenv("GEMINI_FAKE_LATENCY", "0.5")),
+            jitter=float(os.getenv("GEMINI_FAKE_JITTER", "0")),
+            failure_rate=float(os.getenv("GEMINI_FAKE_FAILURE_RATE", "0")),
+        )
+    api_key = os.environ.get("GEMINI_API_KEY", "")
+    if not api_key:
+        return None  # explanations fall back to the "No AI Model Provided" text
+    return LazyGeminiModel(api_key, model_name)
@@ -0,0 +1,415 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from datetime import timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, exc, insert, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# A reading the database refuses (unknown farmer_id under a foreign key, a value out of range):
+# retrying won't help, so the batch is split to isolate it and it is dead-lettered
+ROW_ERRORS = (exc.IntegrityError, exc.DataError)
+# Lost connection, failover, lock timeout, exhausted pool: worth retrying the same batch later
+TRANSIENT_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError)
+
+# Not part of what a node measured, so left out of the content-based dedup key
+_KEY_EXCLUDED = frozenset(("farmer_id", "timestamp", "ts", "seq", "dedup_key"))
+
+
+class BufferFullError(Exception):
+    """Raised when the ingestion buffer is at capacity (the caller should answer 429)."""
+
+
+class DuplicateReadingError(Exception):
+    """Raised for a reading that was already accepted (a device retry); the caller should answer success."""
+
+
+def dedup_key(row: Dict, seq: Optional[int] = None) -> int:
+    """
+    Signed 64-bit idempotency key for soil_data.dedup_key; (farmer_id, ts, dedup_key) is unique.
+    Derived from the node's sequence number when it sends one, otherwise from the measured
+    values: firmware without a clock sends a fixed placeholder timestamp, and its distinct
+    readings must not collapse into one. A retry repeats both, so it maps to the same key.
+    A retry of a reading without a usable device time gets a new (receive time) ts, so readings
+    with a `seq` are matched on (farmer_id, dedup_key) alone; see IngestionBuffer.
+    """
+    if seq is not None:
+        material = f"seq={seq}"
+    else:
+        material = "|".join(f"{name}={row[name]!r}" for name in sorted(row) if name not in _KEY_EXCLUDED)
+    return int.from_bytes(hashlib.blake2b(material.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+class RecentKeys:
+    """
+    Bounded LRU set of recently accepted reading keys (recent_key). A retry
+    usually arrives within seconds of the original, so a small window answers most of
+    them without a database round trip; the unique index catches the rest.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._keys: OrderedDict = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        if key not in self._keys:
+            return False
+        self._keys.move_to_end(key)
+        return True
+
+    def add(self, key):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def recent_key(row: Dict):
+    # A node's seq identifies the reading on its own; a resend without an RTC carries a new timestamp
+    if row.get("seq") is not None:
+        return row["farmer_id"], None, row["dedup_key"]
+    return row["farmer_id"], row["timestamp"], row["dedup_key"]
+
+
+def _params(row: Dict) -> Dict:
+    # `seq` travels with the row for deduplication but is not a soil_data column
+    if "seq" not in row:
+        return row
+    return {name: value for name, value in row.items() if name != "seq"}
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class IngestionBuffer:
+    """
+    In-process write buffer for telemetry. Readings are queued by the request handler
+    and flushed to the database in bulk whenever `batch_size` rows are waiting or
+    `flush_interval` seconds have passed, whichever comes first.
+
+    SQLAlchemy turns a list of parameter dicts into a multi-row INSERT ... VALUES
+    (insertmanyvalues). On Postgres and SQLite the insert is ON CONFLICT DO NOTHING, so a
+    reading that is already stored (same farmer_id, ts and dedup_key) is skipped, and
+    RETURNING (farmer_id, timestamp, dedup_key) tells which rows were new. `dedup_cache_size` recent keys are also kept in
+    memory, so most retries are turned away before they are queued.
+
+    Readings with a `seq` are matched on (farmer_id, dedup_key) instead: a resend from a node
+    without a clock is stored at its own receive time, so the unique index can't see it. Before
+    inserting, the batch looks up those keys within `seq_window` seconds of each reading's ts
+    (a bounded range on the (farmer_id, ts, dedup_key) index) and drops the ones already stored.
+
+    A batch that fails is never allowed to block the queue for good. On a transient error
+    (lost connection, lock timeout) it goes back to the head of the queue and is retried with
+    exponential backoff, up to `max_attempts` times. A row error (IntegrityError / DataError)
+    bisects the batch until the offending rows are isolated, and the rest is written. Rows
+    that can't be written are dead-lettered: logged, counted and kept in `dead_letters` (the
+    last `dead_letter_size`) for inspection.
+    """
+
+    def __init__(self, engine, table, max_size: int = 10000, batch_size: int = 500, flush_interval: float = 1.0, executor=None,
+                 dedup_cache_size: int = 100000, max_attempts: int = 8, retry_backoff: float = 1.0, dead_letter_size: int = 1000,
+                 on_insert: Optional[Callable] = None, seq_window: float = 3600.0):
+        self.engine = engine
+        self.table = table
+        self.executor = executor  # None -> the loop's default thread pool
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recent = RecentKeys(dedup_cache_size) if dedup_cache_size > 0 else None
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.dead_letters: deque = deque(maxlen=dead_letter_size)  # (row, error) of rows given up on
+        self.on_insert = on_insert  # on_insert(conn, inserted rows), inside the insert's transaction
+        self.seq_window = timedelta(seconds=seq_window)
+        self._insert = None
+        self._attempts = 0  # consecutive failures of the batch at the head of the queue
+        self._retry_at = 0.0
+
+        self._queue: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters exposed through stats()
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed_rows = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.duplicates_cached = 0  # turned away by the recent-key filter
+        self.duplicates_stored = 0  # skipped by the unique index
+        self.dead_lettered = 0
+        self.last_error: Optional[str] = None
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def is_duplicate(self, row: Dict) -> bool:
+        """True if the same reading was accepted recently (answered from memory)."""
+        if self.recent is None or row.get("dedup_key") is None or recent_key(row) not in self.recent:
+            return False
+        self.duplicates_cached += 1
+        metrics.ingest_duplicates.inc("cache")
+        return True
+
+    def remember(self, rows: Iterable[Dict]):
+        if self.recent is not None:
+            for row in rows:
+                if row.get("dedup_key") is not None:  # rows without a key are never treated as duplicates
+                    self.recent.add(recent_key(row))
+
+    def submit(self, row: Dict) -> int:
+        """Queue one validated reading. Returns the queue depth after the append."""
+        if self.is_duplicate(row):
+            raise DuplicateReadingError(f"Reading {row.get('timestamp')} from farmer {row.get('farmer_id')} was already accepted")
+        if len(self._queue) >= self.max_size:
+            self.rejected += 1
+            raise BufferFullError(f"Ingestion buffer full ({self.max_size} readings pending)")
+
+        self._queue.append(row)
+        self.remember((row,))
+        self.accepted += 1
+        if self._wakeup is not None and len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return len(self._queue)
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and write out everything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush(force=True)
+        if self._queue:
+            logger.error("Ingestion shutdown: %d readings could not be written", len(self._queue))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self, force: bool = False):
+        """
+        Drain the queue in `batch_size` chunks. A batch that hit a transient error is requeued and
+        retried once its backoff has passed (`force` ignores the backoff, for shutdown).
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            while self._queue:
+                if not force and time.monotonic() < self._retry_at:
+                    break
+                batch = self._take_batch()
+                started = time.perf_counter()
+                try:
+                    inserted, rejected = await self._run_isolated(batch)
+                except TRANSIENT_ERRORS as e:
+                    self.flush_errors += 1
+                    self._attempts += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    if self._attempts >= self.max_attempts:
+                        logger.error("Ingestion flush of %d readings failed %d times, giving up: %s", len(batch), self._attempts, e)
+                        self._dead_letter(batch, self.last_error, "retries")
+                        self._attempts = 0
+                        continue
+                    delay = self.retry_backoff * 2 ** (self._attempts - 1)
+                    self._retry_at = time.monotonic() + delay
+                    self._queue.extendleft(reversed(batch))
+                    logger.warning("Ingestion flush of %d readings failed (attempt %d/%d), retrying in %.1f s: %s",
+                                   len(batch), self._attempts, self.max_attempts, delay, e)
+                    if force:
+                        break
+                    continue
+                except Exception as e:
+                    # Neither transient nor tied to a row (e.g. a schema mismatch): retrying the same
+                    # batch would fail the same way and hold up everything queued behind it
+                    self.flush_errors += 1
+                    self._attempts = 0
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    logger.exception("Ingestion flush of %d readings failed", len(batch))
+                    self._dead_letter(batch, self.last_error, "error")
+                    continue
+
+                self._attempts = 0
+                for row, error in rejected:
+                    self._dead_letter([row], error, "row")
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.flush_count += 1
+                self.flushed_rows += len(inserted)
+                self._count_stored_duplicates(len(batch) - len(inserted))
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                self._total_flush_ms += elapsed_ms
+
+    def _dead_letter(self, rows: List[Dict], error: str, reason: str):
+        for row in rows:
+            self.dead_letters.append((row, error))
+        self.dead_lettered += len(rows)
+        metrics.ingest_dead_letters.inc(reason, amount=len(rows))
+        if reason == "row":
+            logger.warning("Reading from farmer %s at %s rejected by the database: %s", rows[0].get("farmer_id"), rows[0].get("timestamp"), error)
+
+    def _take_batch(self) -> List[Dict]:
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        return batch
+
+    def _count_stored_duplicates(self, count: int):
+        if count > 0:
+            self.duplicates_stored += count
+            metrics.ingest_duplicates.inc("database", amount=count)
+
+    def _insert_statement(self):
+        dialect = self.engine.dialect.name
+        if dialect == "postgresql":
+            return pg_insert(self.table).on_conflict_do_nothing().returning(*self._key_columns())
+        if dialect == "sqlite":
+            return sqlite_insert(self.table).on_conflict_do_nothing().returning(*self._key_columns())
+        return insert(self.table)  # no ON CONFLICT: duplicates are only caught in memory
+
+    def _key_columns(self):
+        return self.table.c.farmer_id, self.table.c.timestamp, self.table.c.dedup_key
+
+    async def _run_write(self, rows: List[Dict]) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._write, rows)
+
+    async def _run_isolated(self, rows: List[Dict]):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._write_isolated, rows)
+
+    def _write_isolated(self, rows: List[Dict]):
+        """
+        Blocking. Writes `rows`, bisecting on row errors so one bad reading doesn't sink the
+        batch. Returns (rows inserted, [(row, error) for every row the database refused]).
+        Transient and other errors propagate.
+        """
+        try:
+            return self._write(rows), []
+        except ROW_ERRORS as e:
+            if len(rows) == 1:
+                return [], [(rows[0], f"{type(e).__name__}: {e.orig}")]
+        middle = len(rows) // 2
+        inserted_left, rejected_left = self._write_isolated(rows[:middle])
+        inserted_right, rejected_right = self._write_isolated(rows[middle:])
+        return inserted_left + inserted_right, rejected_left + rejected_right
+
+    def _stored_seqs(self, conn, rows: List[Dict]) -> List[Dict]:
+        """Rows whose (farmer_id, dedup_key) is already stored, or earlier in `rows`, within `seq_window` of their ts."""
+        by_farmer = defaultdict(list)
+        for row in rows:
+            if row.get("seq") is not None and row.get("dedup_key") is not None:
+                by_farmer[row["farmer_id"]].append(row)
+        if not by_farmer:
+            return []
+
+        c = self.table.c
+        window = self.seq_window
+        conditions = [
+            and_(c.farmer_id == farmer_id,
+                 c.ts.between(min(row["ts"] for row in seq_rows) - window, max(row["ts"] for row in seq_rows) + window),
+                 c.dedup_key.in_({row["dedup_key"] for row in seq_rows}))
+            for farmer_id, seq_rows in by_farmer.items()
+        ]
+        seen = defaultdict(list)  # (farmer_id, dedup_key) -> ts of the stored or already kept readings
+        for farmer_id, key, ts in conn.execute(select(c.farmer_id, c.dedup_key, c.ts).where(or_(*conditions))):
+            seen[farmer_id, key].append(_as_utc(ts))
+
+        duplicates = []
+        for seq_rows in by_farmer.values():
+            for row in seq_rows:
+                times = seen[row["farmer_id"], row["dedup_key"]]
+                if any(abs(row["ts"] - ts) <= window for ts in times):
+                    duplicates.append(row)
+                else:
+                    times.append(row["ts"])
+        return duplicates
+
+    def _write(self, rows: List[Dict]) -> List[Dict]:
+        """Returns the rows of `rows` that were inserted (the rest were already stored)."""
+        if self._insert is None:
+            self._insert = self._insert_statement()
+        with self.engine.begin() as conn:
+            duplicates = self._stored_seqs(conn, rows)
+            if duplicates:
+                duplicate_ids = {id(row) for row in duplicates}
+                rows = [row for row in rows if id(row) not in duplicate_ids]
+                if not rows:
+                    return []
+            result = conn.execute(self._insert, [_params(row) for row in rows])
+            if result.returns_rows:
+                # A key repeated within `rows` was only inserted once: the first row with it gets it
+                stored = Counter(tuple(key) for key in result)
+                inserted = []
+                for row in rows:
+                    key = (row["farmer_id"], row["timestamp"], row.get("dedup_key"))  # rows queued without a key come back with NULL
+                    if stored[key] > 0:
+                        stored[key] -= 1
+                        inserted.append(row)
+            else:
+                inserted = rows
+            if self.on_insert is not None and inserted:
+                self.on_insert(conn, inserted)
+        return inserted
+
+    async def write_batch(self, rows: List[Dict]) -> List[Dict]:
+        """
+        Insert `rows` right away in a single transaction, bypassing the queue (bulk uploads).
+        Returns the rows inserted; rows already stored are skipped.
+        """
+        started = time.perf_counter()
+        inserted = await self._run_write(rows)
+        self.remember(rows)  # only once written, so a failed upload can be retried as-is
+        self.accepted += len(rows)
+        self.flushed_rows += len(inserted)
+        self._count_stored_duplicates(len(rows) - len(inserted))
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        return inserted
+
+    def stats(self) -> Dict:
+        duplicates = self.duplicates_cached + self.duplicates_stored
+        return {
+            "queue_depth": len(self._queue),
+            "max_size": self.max_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "flushed_rows": self.flushed_rows,
+            "flush_count": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "duplicates_cached": self.duplicates_cached,
+            "duplicates_stored": self.duplicates_stored,
+            "dead_lettered": self.dead_lettered,
+            "last_error": self.last_error,
+            "duplicate_rate": round(duplicates / (self.accepted + self.duplicates_cached), 4) if self.accepted + self.duplicates_cached else 0.0,
+            "recent_keys": len(self.recent) if self.recent is not None else 0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.flush_count, 2) if self.flush_count else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
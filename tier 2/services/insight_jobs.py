@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many insight jobs are waiting (the caller should answer 429)."""
+
+
+class InsightJob:
+    def __init__(self, dedup_key, farmer_id: int, result: Dict, explain: Callable[[], Awaitable[str]]):
+        self.job_id = uuid.uuid4().hex
+        self.dedup_key = dedup_key
+        self.farmer_id = farmer_id
+        self.status = "queued"  # queued -> running -> done | failed
+        self.result = result    # deterministic Stage-1 scores; "explanation" is filled in by the worker
+        self.error: Optional[str] = None
+        self.explain = explain
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self.finished = asyncio.Event()
+        self._queued_mono = time.monotonic()
+        self._started_mono: Optional[float] = None
+        self._finished_mono: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "farmer_id": self.farmer_id,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class InsightJobQueue:
+    """
+    Background LLM step for /api/dss-insight. The request handler runs the cheap Stage-1
+    heuristics, submits a job holding those scores and returns at once; `workers` tasks
+    then await the Gemini narrative, so at most `workers` calls are in flight per process.
+
+    A farmer with a job still queued or running gets that job back instead of a new one.
+    Finished jobs are kept for `retention` seconds so clients can poll for the result.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 1000, retention: float = 600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+
+        self._jobs: "OrderedDict[str, InsightJob]" = OrderedDict()
+        self._active: Dict = {}  # dedup key -> queued/running job
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+        # Counters exposed through stats()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.last_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self._total_duration_ms = 0.0
+        self._timed = 0
+        self.max_wait_ms = 0.0
+        self._total_wait_ms = 0.0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in list(self._active.values()):
+            self._finish(job, error="Server shutting down")
+
+    def submit(self, dedup_key, farmer_id: int, result: Dict, explain: Callable[[], Awaitable[str]]) -> InsightJob:
+        self._purge()
+        active = self._active.get(dedup_key)
+        if active is not None:
+            self.deduplicated += 1
+            return active
+
+        if self._queue is None or self._queue.qsize() >= self.max_pending:
+            self.rejected += 1
+            raise JobQueueFullError(f"Insight job queue full ({self.max_pending} jobs pending)")
+
+        job = InsightJob(dedup_key, farmer_id, result, explain)
+        self._jobs[job.job_id] = job
+        self._active[dedup_key] = job
+        self._queue.put_nowait(job)
+        self.submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[InsightJob]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.status != "queued":
+                continue  # already failed during shutdown
+            job.status = "running"
+            job._started_mono = time.monotonic()
+            wait_ms = (job._started_mono - job._queued_mono) * 1000
+            self._total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.running += 1
+            try:
+                job.result["explanation"] = await job.explain()
+            except asyncio.CancelledError:
+                self._finish(job, error="Server shutting down")
+                raise
+            except Exception as e:
+                logger.exception("Insight job %s failed", job.job_id)
+                self._finish(job, error=str(e))
+            else:
+                self._finish(job)
+
+    def _finish(self, job: InsightJob, error: Optional[str] = None):
+        if job.status == "running":
+            self.running -= 1
+            duration_ms = (time.monotonic() - job._started_mono) * 1000
+            self.last_duration_ms = duration_ms
+            self.max_duration_ms = max(self.max_duration_ms, duration_ms)
+            self._total_duration_ms += duration_ms
+            self._timed += 1
+        if error is None:
+            job.status = "done"
+            self.completed += 1
+        else:
+            job.status = "failed"
+            job.error = error
+            self.failed += 1
+        job.finished_at = datetime.now(timezone.utc)
+        job._finished_mono = time.monotonic()
+        job.explain = None
+        self._active.pop(job.dedup_key, None)
+        job.finished.set()
+
+    def _purge(self):
+        # Jobs finish roughly in submission order, so expired ones sit at the front
+        cutoff = time.monotonic() - self.retention
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job._finished_mono is None:
+                continue
+            if job._finished_mono >= cutoff:
+                break
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict:
+        started = self._timed + self.running
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "max_pending": self.max_pending,
+            "retained_jobs": len(self._jobs),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "last_duration_ms": round(self.last_duration_ms, 2),
+            "avg_duration_ms": round(self._total_duration_ms / self._timed, 2) if self._timed else 0.0,
+            "max_duration_ms": round(self.max_duration_ms, 2),
+            "avg_queue_wait_ms": round(self._total_wait_ms / started, 2) if started else 0.0,
+            "max_queue_wait_ms": round(self.max_wait_ms, 2),
+        }
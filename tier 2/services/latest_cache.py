@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def reading_epoch(reading: Dict) -> float:
+    """The reading's `ts` as epoch seconds, for ordering (datetime, or ISO string after a JSON round trip)."""
+    ts = reading.get("ts")
+    if ts is None:
+        return 0.0  # sorts before any real reading
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if ts.tzinfo is None:  # SQLite hands back naive UTC
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class LRUBackend:
+    """In-process LRU with an optional TTL. Each Uvicorn worker holds its own copy."""
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key, value: Dict, only_if_absent: bool = False):
+        """Stores `value` unless the entry holds a reading with a later ts (or any entry, with only_if_absent)."""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (only_if_absent or reading_epoch(entry[0]) > reading_epoch(value)):
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Compare-and-set on the reading's ts. KEYS: entry (hash of ts epoch + JSON reading).
+# ARGV: ts epoch, JSON, only_if_absent (0/1), ttl in seconds (0 = none). Returns 1 if stored.
+_SET_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'ts')
+if current and (ARGV[3] == '1' or tonumber(current) > tonumber(ARGV[1])) then return 0 end
+redis.call('HSET', KEYS[1], 'ts', ARGV[1], 'v', ARGV[2])
+if tonumber(ARGV[4]) > 0 then redis.call('EXPIRE', KEYS[1], ARGV[4]) end
+return 1
+"""
+
+
+class RedisBackend:
+    """Shared backend for multi-worker deployments (any Redis-protocol server). Needs the `redis` package."""
+
+    def __init__(self, url: str, ttl: Optional[float] = None, prefix: str = "agrisphere:latest:v2:"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("LATEST_CACHE_REDIS_URL is set but the 'redis' package is not installed")
+        self.client = aioredis.from_url(url)
+        self.script = self.client.register_script(_SET_SCRIPT)
+        self.ttl = int(ttl) if ttl else None
+        self.prefix = prefix
+
+    async def get(self, key) -> Optional[Dict]:
+        raw = await self.client.hget(f"{self.prefix}{key}", "v")
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        if value.get("ts") is not None:
+            value["ts"] = datetime.fromisoformat(value["ts"])
+        return value
+
+    async def set(self, key, value: Dict, only_if_absent: bool = False):
+        # The epoch goes alongside the JSON, so the script compares numbers rather than ts strings
+        await self.script(
+            keys=[f"{self.prefix}{key}"],
+            args=[repr(reading_epoch(value)), json.dumps(value, default=str), int(only_if_absent), self.ttl or 0],
+        )
+
+
+class LatestReadingCache:
+    """
+    Latest telemetry row per farmer, shared by the decision endpoints.
+
+    The ingestion path writes through with put(), which only replaces the entry with a reading
+    whose ts is the same or later: a replayed backlog must not hide the newest reading. A read
+    miss falls back to the database and back-fills with fill(), which never overwrites a
+    write-through value.
+    Backend errors are logged and treated as misses so the cache can't take endpoints down.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, farmer_id: int) -> Optional[Dict]:
+        try:
+            value = await self.backend.get(farmer_id)
+        except Exception:
+            self.errors += 1
+            logger.exception("Latest-reading cache lookup failed")
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def put(self, farmer_id: int, reading: Dict):
+        await self._set(farmer_id, reading, only_if_absent=False)
+
+    async def fill(self, farmer_id: int, reading: Dict):
+        await self._set(farmer_id, reading, only_if_absent=True)
+
+    async def _set(self, farmer_id: int, reading: Dict, only_if_absent: bool):
+        try:
+            await self.backend.set(farmer_id, reading, only_if_absent=only_if_absent)
+        except Exception:
+            self.errors += 1
+            logger.exception("Latest-reading cache update failed")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def build_latest_cache() -> LatestReadingCache:
+    ttl = float(os.getenv("LATEST_CACHE_TTL", "60")) or None
+    redis_url = os.getenv("LATEST_CACHE_REDIS_URL")
+    if redis_url:
+        return LatestReadingCache(RedisBackend(redis_url, ttl=ttl))
+    return LatestReadingCache(LRUBackend(max_entries=int(os.getenv("LATEST_CACHE_SIZE", "10000")), ttl=ttl))
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(namespace: str, inputs: Dict) -> str:
+    """Stable hash of the deterministic inputs a prompt is built from (callers round them first)."""
+    payload = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class LLMResponseCache:
+    """
+    Prompt-result cache for the Gemini calls, with single-flight coalescing.
+
+    Entries are fresh for `ttl` seconds. With `stale_ttl` set, an expired entry younger than
+    `stale_ttl` is still returned immediately while one background refresh replaces it
+    (stale-while-revalidate). Concurrent misses for the same key share one in-flight call.
+    Failures are never cached: the caller's exception propagates and the next request retries.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, stale_ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refresh_errors = 0
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, created_at = entry
+            age = time.monotonic() - created_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    self._start(key, generate, background=True)
+                return value
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start(key, generate, background=False)
+        # shield: a waiter being cancelled (client disconnect) must not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _start(self, key: str, generate: Callable[[], Awaitable[str]], background: bool) -> asyncio.Task:
+        task = asyncio.create_task(generate())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done, background))
+        return task
+
+    def _finish(self, key: str, task: asyncio.Task, background: bool):
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        error = task.exception()  # also marks it retrieved when nobody is awaiting a background refresh
+        if error is None:
+            self._store(key, task.result())
+        elif background:
+            # The stale answer stays in place until it ages out of stale_ttl
+            self.refresh_errors += 1
+            logger.warning("Background LLM cache refresh failed: %s", error)
+
+    def _store(self, key: str, value: str):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refresh_errors": self.refresh_errors,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def build_llm_cache() -> Optional[LLMResponseCache]:
+    ttl = float(os.getenv("LLM_CACHE_TTL", "3600"))
+    if ttl <= 0:
+        return None
+    return LLMResponseCache(
+        max_entries=int(os.getenv("LLM_CACHE_SIZE", "1000")),
+        ttl=ttl,
+        stale_ttl=float(os.getenv("LLM_CACHE_STALE_TTL", "86400")),
+    )
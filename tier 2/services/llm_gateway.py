@@ -0,0 +1,252 @@
+"""
+Single path for every Gemini prompt: concurrency cap, deadline, retry, circuit breaker and accounting.
+
+    gateway = LLMGateway(model)
+    text = await gateway.generate(prompt)   # or raises LLMUnavailableError
+
+- At most `max_concurrency` calls are in flight per worker; a caller waits up to
+  `queue_timeout` (default: half the deadline) for a slot, so a call that gets one still has
+  time left for the model.
+- Each call has a deadline of `timeout` seconds. It covers the wait for a slot, every attempt
+  and the pauses between them, so a slow API can't hold a request open for long.
+- Transient errors (timeouts, 5xx / 429-style API errors, dropped connections) are retried up to
+  `retries` times after a jittered exponential backoff (`backoff`, 2x, 4x ... with full jitter).
+- After `failure_threshold` failed calls in a row the circuit opens. For `reset_timeout` seconds
+  calls fail at once instead of waiting on a dead API, and so do calls already waiting for a
+  slot or a retry. Then one probe call is let through, and it closes the circuit again if it
+  succeeds.
+
+A call that can't be answered raises LLMUnavailableError. Callers catch it and use a
+deterministic fallback explanation built from the same inputs as the prompt. The error is
+never cached, since LLMResponseCache does not store failures. Latency, outcomes and token
+usage go to the Prometheus metrics and to stats().
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# google.api_core exception names (HTTP 429 / 500 / 502 / 503 / 504) worth another attempt; the
+# SDK is imported lazily, so these are matched by name rather than imported
+_TRANSIENT_API_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "InternalServerError", "BadGateway",
+    "ServiceUnavailable", "GatewayTimeout", "DeadlineExceeded",
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# asyncio.wait_for raises asyncio.TimeoutError, which is only an alias of the builtin from Python 3.11
+TIMEOUT_ERRORS = (asyncio.TimeoutError, TimeoutError)
+
+
+class LLMUnavailableError(Exception):
+    """No answer from the model. `reason`: circuit_open, overloaded, timeout or error."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class TransientLLMError(Exception):
+    """A model error that is worth retrying (raised by FakeGeminiModel, for one)."""
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, (TransientLLMError, ConnectionError) + TIMEOUT_ERRORS):
+        return True
+    return any(cls.__name__ in _TRANSIENT_API_ERRORS for cls in type(error).__mro__)
+
+
+class LLMGateway:
+    def __init__(self, model, max_concurrency: int = 8, timeout: float = 15.0, queue_timeout: Optional[float] = None,
+                 retries: int = 2, backoff: float = 0.5, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout if queue_timeout is not None else timeout / 2
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._probing = False
+
+        # Counters exposed through stats()
+        self.calls = 0
+        self.succeeded = 0
+        self.failed: Dict[str, int] = {"circuit_open": 0, "overloaded": 0, "timeout": 0, "error": 0}
+        self.attempts = 0
+        self.retried = 0
+        self.circuit_opened = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._total_ms = 0.0
+        self.max_ms = 0.0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Text of the model's answer to `prompt`, within `timeout` (default: the gateway's) seconds."""
+        self.calls += 1
+        probe = self._admit()
+        started = time.monotonic()
+        deadline = started + (timeout or self.timeout)
+        try:
+            text = await self._call(prompt, deadline, probe)
+        except LLMUnavailableError as e:
+            if e.reason in ("timeout", "error"):  # not our own queue or the breaker itself
+                self._record_failure(probe)
+            elif probe:
+                self._probing = False
+            self.failed[e.reason] += 1
+            metrics.llm_fallbacks.inc(e.reason)
+            raise
+        except BaseException:
+            if probe:  # cancelled: let the next call probe instead
+                self._probing = False
+            raise
+        self._record_success()
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.succeeded += 1
+        self._total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        return text
+
+    def _admit(self) -> bool:
+        """Fail fast while the circuit is open. Returns True if this call is the half-open probe."""
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.failed["circuit_open"] += 1
+        metrics.llm_fallbacks.inc("circuit_open")
+        raise self._open_error()
+
+    def _open_error(self) -> LLMUnavailableError:
+        return LLMUnavailableError("circuit_open", f"Gemini circuit open after {self._consecutive_failures} failed calls")
+
+    def _record_success(self):
+        self._consecutive_failures = 0
+        self._probing = False
+        if self._state != CLOSED:
+            logger.info("Gemini circuit closed")
+        self._state = CLOSED
+
+    def _record_failure(self, probe: bool):
+        self._consecutive_failures += 1
+        self._probing = False
+        if probe or (self._state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+            if self._state == CLOSED:
+                self.circuit_opened += 1
+                logger.warning("Gemini circuit opened after %d failed calls", self._consecutive_failures)
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    async def _call(self, prompt: str, deadline: float, probe: bool) -> str:
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), min(self.queue_timeout, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise LLMUnavailableError("overloaded", f"No free Gemini slot in time ({self.max_concurrency} calls in flight)")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            attempt = 0
+            while True:
+                if not probe and self._state != CLOSED:
+                    raise self._open_error()  # opened while this call was waiting
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMUnavailableError("timeout", "Gemini call deadline exceeded")
+                try:
+                    return await self._attempt(prompt, remaining)
+                except Exception as e:
+                    reason = "timeout" if isinstance(e, TIMEOUT_ERRORS) else "error"
+                    if not is_transient(e) or attempt >= self.retries:
+                        raise LLMUnavailableError(reason, f"Gemini call failed: {type(e).__name__}: {e}") from e
+                    pause = random.uniform(0, self.backoff * 2 ** attempt)
+                    if time.monotonic() + pause >= deadline:
+                        raise LLMUnavailableError("timeout", f"Gemini call deadline exceeded after {type(e).__name__}") from e
+                    attempt += 1
+                    self.retried += 1
+                    await asyncio.sleep(pause)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def _attempt(self, prompt: str, timeout: float) -> str:
+        self.attempts += 1
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self.model.generate_content_async(prompt), timeout)
+            text = response.text.strip()
+        except Exception as e:
+            outcome = "timeout" if isinstance(e, TIMEOUT_ERRORS) else "error"
+            metrics.gemini_requests.observe(time.perf_counter() - started, outcome)
+            metrics.gemini_errors.inc(type(e).__name__)
+            raise
+        metrics.gemini_requests.observe(time.perf_counter() - started, "ok")
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+            completion_tokens = getattr(usage, "candidates_token_count", 0) or 0
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            metrics.gemini_tokens.inc("prompt", amount=prompt_tokens)
+            metrics.gemini_tokens.inc("completion", amount=completion_tokens)
+        return text
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": True,
+            "model": getattr(self.model, "model_name", type(self.model).__name__),
+            "circuit": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "circuit_opened": self.circuit_opened,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "succeeded": self.succeeded,
+            "fallbacks": dict(self.failed),
+            "attempts": self.attempts,
+            "retried": self.retried,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_ms": round(self._total_ms / self.succeeded, 2) if self.succeeded else 0.0,
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+def build_llm_gateway(model) -> Optional[LLMGateway]:
+    if model is None:
+        return None  # no Gemini key: explanations use the fallback text
+    return LLMGateway(
+        model,
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        timeout=float(os.getenv("LLM_TIMEOUT", "15")),
+        queue_timeout=float(os.environ["LLM_QUEUE_TIMEOUT"]) if os.getenv("LLM_QUEUE_TIMEOUT") else None,
+        retries=int(os.getenv("LLM_RETRIES", "2")),
+        backoff=float(os.getenv("LLM_RETRY_BACKOFF", "0.5")),
+        failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET", "30")),
+    )
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+
+from .crop_registry import normalize
+from .market_api import MarketAnalyzer
+
+logger = logging.getLogger(__name__)
+
+FORECAST_FIELDS = ("in_season", "market_saturation", "expected_price_trend")
+
+
+class MarketDataClient:
+    """
+    Client for the market forecast API behind MarketAnalyzer.
+
+    One pooled httpx.AsyncClient is shared by every request. Forecasts are cached per
+    (crop, region, month): fresh for `ttl` seconds, then served as-is for up to `max_stale`
+    seconds while a background refresh runs. A fetch that times out or fails falls back to
+    the last known value, and to the mock forecast if there has never been one. At most
+    `max_entries` forecasts are kept; the least recently used go first.
+
+    The API is expected to answer
+        GET /v1/crops/{crop}/forecast?region=&month=        -> {forecast}
+        GET /v1/forecasts?crops=a,b,c&region=&month=        -> {"forecasts": [{forecast}, ...]}
+    where a forecast carries crop, in_season, market_saturation and expected_price_trend
+    (see benchmarks/market_stub.py).
+    """
+
+    def __init__(self, base_url: str, timeout: float = 0.5, ttl: float = 900, max_stale: float = 86400,
+                 max_connections: int = 20, max_entries: int = 10000, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max(max_stale, ttl)
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[Dict, float]]" = OrderedDict()
+        self._refreshing = set()
+        self._inflight: Dict[Tuple[str, str, int], asyncio.Task] = {}
+        self._tasks = set()
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.requests = 0
+        self.errors = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _key(crop: str, region: str, month: int) -> Tuple[str, str, int]:
+        return normalize(crop), normalize(region), month
+
+    async def get_forecast(self, crop: str, region: str, month: int) -> Dict:
+        return (await self.get_forecasts([crop], region, month))[crop]
+
+    async def get_forecasts(self, crops: Iterable[str], region: str, month: int) -> Dict[str, Dict]:
+        """Forecasts for many crops; every crop missing from the cache is fetched in one bulk request."""
+        crops = list(dict.fromkeys(crops))
+        now = time.monotonic()
+        results, missing, refresh = {}, [], []
+        for crop in crops:
+            key = self._key(crop, region, month)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            age = now - entry[1] if entry is not None else None
+            if entry is not None and age < self.ttl:
+                self.hits += 1
+                results[crop] = entry[0]
+            elif entry is not None and age < self.max_stale:
+                self.stale_hits += 1
+                results[crop] = entry[0]
+                refresh.append(crop)
+            else:
+                self.misses += 1
+                missing.append(crop)
+
+        refresh = [crop for crop in refresh if self._key(crop, region, month) not in self._refreshing]
+        if refresh:
+            self._refreshing.update(self._key(crop, region, month) for crop in refresh)
+            task = asyncio.create_task(self._refresh(refresh, region, month))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        if missing:
+            # Crops already being fetched by a concurrent request share that request
+            waits = {self._inflight[key] for key in (self._key(crop, region, month) for crop in missing) if key in self._inflight}
+            to_fetch = [crop for crop in missing if self._key(crop, region, month) not in self._inflight]
+            if to_fetch:
+                task = asyncio.create_task(self._fetch(to_fetch, region, month))
+                keys = [self._key(crop, region, month) for crop in to_fetch]
+                for key in keys:
+                    self._inflight[key] = task
+                task.add_done_callback(lambda _, keys=keys: [self._inflight.pop(key, None) for key in keys])
+                waits.add(task)
+            await asyncio.gather(*waits, return_exceptions=True)  # failures are logged once, in _fetch
+            for crop in missing:
+                entry = self._entries.get(self._key(crop, region, month))
+                if entry is not None and entry[1] >= now:
+                    results[crop] = entry[0]
+                else:
+                    results[crop] = self._fallback(crop, region, month)
+        return results
+
+    async def _fetch(self, crops: List[str], region: str, month: int):
+        self.requests += 1
+        try:
+            if len(crops) == 1:
+                response = await self.http.get(f"/v1/crops/{quote(crops[0], safe='')}/forecast", params={"region": region, "month": month})
+                response.raise_for_status()
+                forecasts = [response.json()]
+            else:
+                response = await self.http.get("/v1/forecasts", params={"crops": ",".join(crops), "region": region, "month": month})
+                response.raise_for_status()
+                forecasts = response.json()["forecasts"]
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Market forecast fetch failed for %s (%s, month %d): %r", ",".join(crops), region, month, e)
+            raise
+
+        by_name = {normalize(item["crop"]): item for item in forecasts}
+        fetched_at = time.monotonic()
+        for crop in crops:
+            item = by_name.get(normalize(crop))
+            if item is not None:
+                key = self._key(crop, region, month)
+                self._entries[key] = ({field: item[field] for field in FORECAST_FIELDS}, fetched_at)
+                self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _refresh(self, crops: List[str], region: str, month: int):
+        try:
+            await self._fetch(crops, region, month)
+        except Exception:
+            pass  # already logged; the cached value keeps being served until it passes max_stale
+        finally:
+            self._refreshing.difference_update(self._key(crop, region, month) for crop in crops)
+
+    def _fallback(self, crop: str, region: str, month: int) -> Dict:
+        self.fallbacks += 1
+        entry = self._entries.get(self._key(crop, region, month))
+        if entry is not None:
+            return entry[0]  # last known value, however old
+        return MarketAnalyzer.mock_forecast(crop, month)
+
+    async def aclose(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await self.http.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "cached_forecasts": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "requests": self.requests,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def build_market_client() -> Optional[MarketDataClient]:
+    base_url = os.getenv("MARKET_API_URL")
+    if not base_url:
+        return None  # MarketAnalyzer keeps using the mock forecasts
+    return MarketDataClient(
+        base_url,
+        timeout=float(os.getenv("MARKET_API_TIMEOUT", "0.5")),
+        ttl=float(os.getenv("MARKET_CACHE_TTL", "900")),
+        max_stale=float(os.getenv("MARKET_CACHE_MAX_STALE", "86400")),
+        max_connections=int(os.getenv("MARKET_API_MAX_CONNECTIONS", "20")),
+        max_entries=int(os.getenv("MARKET_CACHE_SIZE", "10000")),
+    )
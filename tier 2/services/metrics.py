@@ -0,0 +1,293 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at GET /metrics.
+
+Hot paths record from both the event loop and the DB executor threads, so instead of a lock
+every thread writes to its own shard (a dict it alone mutates) and a scrape sums the shards.
+Recording is a thread-local lookup plus a dict update; the cost of combining is paid by the
+scraper, every 15-60 s.
+
+Every metric caps its number of label combinations (`max_series`). Once the cap is reached,
+new combinations are recorded under the metric's overflow labels (e.g. farmer_id="other").
+Per-farmer series therefore stop at a fixed count instead of growing with the fleet.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond cache hits up to multi-second Gemini calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), max_series: int = 1000, overflow: Optional[Sequence[str]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.max_series = max_series
+        self.overflow = tuple(overflow) if overflow is not None else ("other",) * len(self.labelnames)
+        self._series = set()
+        self._local = threading.local()
+        self._shards: List[Dict] = []
+
+    def _key(self, labels: Tuple) -> Tuple:
+        if labels in self._series:
+            return labels
+        if len(self._series) >= self.max_series:
+            return self.overflow
+        self._series.add(labels)
+        return labels
+
+    def _shard(self) -> Dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            self._shards.append(values)  # list.append is atomic; the shard outlives its thread
+            return values
+
+    def _snapshot(self) -> Dict:
+        """Sum of all shards. Another thread may add a series mid-copy, so retry on that."""
+        merged: Dict = {}
+        for shard in list(self._shards):
+            while True:
+                try:
+                    items = list(shard.items())
+                    break
+                except RuntimeError:
+                    continue
+            for labels, value in items:
+                self._merge(merged, labels, value)
+        return merged
+
+    def _merge(self, merged: Dict, labels: Tuple, value):
+        merged[labels] = merged.get(labels, 0) + value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self._snapshot().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Written from one thread (the event loop) or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), function: Optional[Callable[[], Dict[Tuple, float]]] = None, **kwargs):
+        super().__init__(name, help, labels, **kwargs)
+        self.function = function
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        self._values[self._key(labels)] = value
+
+    def _snapshot(self) -> Dict:
+        if self.function is not None:
+            return dict(self.function())
+        return dict(self._values)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(name, help, labels, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        key = self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            # Per-bucket (not cumulative) counts, the +Inf bucket last, then the sum
+            entry = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def _merge(self, merged: Dict, labels: Tuple, value):
+        current = merged.get(labels)
+        merged[labels] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, entry in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), entry[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), **kwargs) -> Counter:
+        return self.register(Counter(name, help, labels, **kwargs))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), **kwargs) -> Gauge:
+        return self.register(Gauge(name, help, labels, **kwargs))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, help, labels, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:  # a failing gauge callback must not break the whole scrape
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+# Per-farmer series (ingestion) beyond this are folded into farmer_id="other"
+MAX_FARMER_SERIES = int(os.getenv("METRICS_MAX_FARMER_SERIES", "100"))
+
+# --- HTTP (MetricsMiddleware) ---
+http_requests = REGISTRY.histogram(
+    "agrisphere_http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"), max_series=500, overflow=("other", "other", "other"),
+)
+http_in_flight = REGISTRY.gauge("agrisphere_http_requests_in_flight", "HTTP requests currently being served.")
+
+# --- Database (SQLAlchemy engine / pool events in database.py) ---
+db_queries = REGISTRY.histogram(
+    "agrisphere_db_query_duration_seconds", "Time spent executing SQL statements, by statement type.", ("statement",), max_series=20,
+)
+db_checkouts = REGISTRY.counter("agrisphere_db_connection_checkouts_total", "Connections checked out of the SQLAlchemy pool.")
+db_connection_held = REGISTRY.histogram(
+    "agrisphere_db_connection_held_seconds", "How long a checked-out pool connection was held before being returned.",
+)
+db_executor_wait = REGISTRY.histogram(
+    "agrisphere_db_executor_wait_seconds", "Time DB work waited for a free thread in the run_db executor.",
+)
+
+# --- Gemini (services/llm_gateway.py) ---
+gemini_requests = REGISTRY.histogram(
+    "agrisphere_gemini_request_duration_seconds", "Gemini generate_content latency, by outcome.", ("outcome",), max_series=5,
+)
+gemini_errors = REGISTRY.counter("agrisphere_gemini_errors_total", "Failed Gemini calls, by exception type.", ("error",), max_series=20)
+gemini_tokens = REGISTRY.counter("agrisphere_gemini_tokens_total", "Gemini tokens reported in usage metadata.", ("kind",), max_series=5)
+llm_fallbacks = REGISTRY.counter(
+    "agrisphere_llm_fallbacks_total", "Prompts answered with the fallback explanation, by reason (circuit_open, overloaded, timeout, error).",
+    ("reason",), max_series=5,
+)
+
+# --- Ingestion ---
+ingested_readings = REGISTRY.counter(
+    "agrisphere_ingested_readings_total", "Readings accepted for ingestion, by farmer (rate() gives rows/sec).",
+    ("farmer_id",), max_series=MAX_FARMER_SERIES,
+)
+ingest_duplicates = REGISTRY.counter(
+    "agrisphere_ingest_duplicates_total",
+    "Duplicate readings (device retries) dropped, by where they were caught: cache = recent-key filter, database = unique index.",
+    ("layer",), max_series=5,
+)
+ingest_dead_letters = REGISTRY.counter(
+    "agrisphere_ingest_dead_letters_total",
+    "Buffered readings given up on, by reason: row = refused by the database, retries = transient errors past the attempt limit, error = other failures.",
+    ("reason",), max_series=5,
+)
+ingest_admission = REGISTRY.counter(
+    "agrisphere_ingest_admission_total",
+    "Admission control decisions on single readings: admitted, shed (429) or coalesced, by the limit that was hit.",
+    ("outcome", "limit"), max_series=10,
+)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task/queue overhead) recording latency per
+    route template, so /api/soil-data?farmer_id=1 and ?farmer_id=2 share one series and
+    paths that matched no route are all counted as route="unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict] = None
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")  # set in the shared scope by the router
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            self._routes = {getattr(route, "endpoint", None): route.path for route in scope["app"].routes}
+        return self._routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500  # if the app raises before starting a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.dec()
+            http_requests.observe(time.perf_counter() - started, scope["method"], self._route(scope), f"{status // 100}xx")
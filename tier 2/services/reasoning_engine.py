@@ -1,8 +1,42 @@
-from .crop_prediction import predict_crop_suitability
+from typing import Dict, List, Optional
+
+from .crop_prediction import predict_crop_suitability, rank_crops, readings_matrix
+from .crop_registry import get_registry
 from .fertilizer_optimizer import calculate_fertilizer_deficit
 from .market_api import MarketAnalyzer
+from .llm_cache import cache_key
+from .llm_gateway import LLMUnavailableError
+
+async def generate_cached(llm, llm_cache, key: str, prompt: str) -> str:
+    # Identical Stage-1 inputs produce the same prompt, so they share one cached / in-flight answer.
+    # `llm` is the LLMGateway; LLMUnavailableError is raised to the caller (and never cached)
+    if llm_cache is None:
+        return await llm.generate(prompt)
+    return await llm_cache.get_or_generate(key, lambda: llm.generate(prompt))
+
+async def generate_decision(farmer_soil_data, region: str, current_month: int, llm, llm_cache=None):
+    decision, prompt_inputs = build_decision(farmer_soil_data, region, current_month)
+    if prompt_inputs is not None:
+        decision["explanation"] = await explain_decision(prompt_inputs, llm, llm_cache)
+    return decision
+
+# build_decision only checks the market of the best-scoring crop
+MARKET_TOP_K = 1
+# Crops listed in crop_scores (each with its own fertilizer plan)
+DECISION_TOP_K = 5
 
-def generate_decision(farmer_soil_data, region: str, current_month: int, gemini_model):
+def market_candidates(readings, k: int = MARKET_TOP_K) -> List[str]:
+    # Crops whose forecasts build_decision can use for these readings: the top k of each, ranked before any fetch
+    order, _ = rank_crops(readings_matrix(readings), top_k=k)
+    names = get_registry().names
+    return list(dict.fromkeys(names[index] for index in order.ravel()))
+
+def build_decision(farmer_soil_data, region: str, current_month: int, market_details: Optional[Dict[str, dict]] = None):
+    """
+    Deterministic Stage-1 (crop scores, fertilizer plan, market check). Returns the decision
+    without its explanation, plus the normalized inputs for the LLM prompt (None on error).
+    `market_details` maps crop names to forecasts prefetched by MarketDataClient.
+    """
     # 1. Get Top Crops from ML proxy
     top_crops = predict_crop_suitability(
         nitrogen=farmer_soil_data.nitrogen, 
@@ -11,14 +45,15 @@ def generate_decision(farmer_soil_data, region: str, current_month: int, gemini_
         ph=farmer_soil_data.ph, 
         temp=farmer_soil_data.temp, 
         humidity=farmer_soil_data.humidity, 
-        rainfall=farmer_soil_data.rainfall
+        rainfall=farmer_soil_data.rainfall,
+        top_k=DECISION_TOP_K,
     )
     
     if not top_crops:
-        return {"error": "Could not predict suitable crops."}
+        return {"error": "Could not predict suitable crops."}, None
         
     best_candidate = top_crops[0]["crop"]
-    # 2. Get Fertilization Cost/Deficit for ALL candidates
+    # 2. Get Fertilization Cost/Deficit for the top DECISION_TOP_K candidates
     for crop in top_crops:
         crop_name = crop["crop"]
         f_data = calculate_fertilizer_deficit(
@@ -47,26 +82,20 @@ def generate_decision(farmer_soil_data, region: str, current_month: int, gemini_
     }
     
     # 3. Get Market Viability for the best candidate
-    market_data = MarketAnalyzer().check_viability(best_candidate, region, current_month)
+    details = market_details.get(best_candidate) if market_details else None
+    market_data = MarketAnalyzer().check_viability(best_candidate, region, current_month, details)
     
-    # 4. Synthesize the "Why" using LLM for natural language generation
-    explanation = "Data synthesis complete. (No AI Model Provided)"
-    if gemini_model:
-        synthesis_prompt = f"""
-        Act as an Expert Agronomist providing advice to a farmer in decision support. 
-        Recommend they plant {best_candidate}.
-        
-        Reason 1 (Agronomic): Agronomic soil suitability based on ML analysis is {top_crops[0]['suitability_score']}%.
-        Reason 2 (Fertilization): The precise fertilizer deficit is: N={fert_data.get('deficits', {}).get('N')} kg/ha, P={fert_data.get('deficits', {}).get('P')} kg/ha, K={fert_data.get('deficits', {}).get('K')} kg/ha. 
-        Reason 3 (Market): Market saturation is currently {market_data['details']['market_saturation']}, making it a good time to plant.
-        
-        Explain clearly and concisely in 2 or 3 sentences why {best_candidate} is the most profitable and viable choice right now based on their exact soil {fert_data.get('recommendation')} and market trends.
-        """
-        
-        try:
-            explanation = gemini_model.generate_content(synthesis_prompt).text.strip()
-        except Exception as e:
-            explanation = f"AI Error evaluating decision: {str(e)}"
+    # Normalized prompt inputs, which also form the LLM cache key
+    deficits = fert_data.get('deficits', {})
+    prompt_inputs = {
+        "crop": best_candidate,
+        "suitability": top_crops[0]['suitability_score'],
+        "N": round(float(deficits.get('N', 0)), 1),
+        "P": round(float(deficits.get('P', 0)), 1),
+        "K": round(float(deficits.get('K', 0)), 1),
+        "recommendation": fert_data.get('recommendation'),
+        "market_saturation": market_data['details']['market_saturation'],
+    }
     
     return {
         "recommended_crop": best_candidate,
@@ -77,5 +106,36 @@ def generate_decision(farmer_soil_data, region: str, current_month: int, gemini_
         },
         "crop_scores": top_crops,
         "fertilizer_plan": fert_data.get('recommendation', 'Unknown'),
-        "explanation": explanation
-    }
+        "explanation": None
+    }, prompt_inputs
+
+def fallback_explanation(prompt_inputs: dict) -> str:
+    # Same facts as the prompt, in fixed wording: served when Gemini is down, slow or shedding load
+    return (
+        f"{prompt_inputs['crop']} is the best match for your field: soil suitability is {prompt_inputs['suitability']}% "
+        f"and market saturation is currently {prompt_inputs['market_saturation']}. "
+        f"Nutrient deficit: N={prompt_inputs['N']} kg/ha, P={prompt_inputs['P']} kg/ha, K={prompt_inputs['K']} kg/ha. "
+        f"{prompt_inputs['recommendation']} (AI explanation temporarily unavailable)"
+    )
+
+async def explain_decision(prompt_inputs: dict, llm, llm_cache=None) -> str:
+    # 4. Synthesize the "Why" using LLM for natural language generation
+    explanation = "Data synthesis complete. (No AI Model Provided)"
+    if llm:
+        synthesis_prompt = f"""
+        Act as an Expert Agronomist providing advice to a farmer in decision support. 
+        Recommend they plant {prompt_inputs['crop']}.
+        
+        Reason 1 (Agronomic): Agronomic soil suitability based on ML analysis is {prompt_inputs['suitability']}%.
+        Reason 2 (Fertilization): The precise fertilizer deficit is: N={prompt_inputs['N']} kg/ha, P={prompt_inputs['P']} kg/ha, K={prompt_inputs['K']} kg/ha. 
+        Reason 3 (Market): Market saturation is currently {prompt_inputs['market_saturation']}, making it a good time to plant.
+        
+        Explain clearly and concisely in 2 or 3 sentences why {prompt_inputs['crop']} is the most profitable and viable choice right now based on their exact soil {prompt_inputs['recommendation']} and market trends.
+        """
+        
+        try:
+            explanation = await generate_cached(llm, llm_cache, cache_key("decision", prompt_inputs), synthesis_prompt)
+        except LLMUnavailableError:
+            explanation = fallback_explanation(prompt_inputs)
+    
+    return explanation
@@ -0,0 +1,104 @@
+"""
+Compact binary telemetry frames for the UDP / MQTT ingestion gateway.
+
+A frame is MessagePack: one reading as a map, or an array of maps for a node that batches
+readings between radio wake-ups. Map keys are the small integer field ids below (one byte
+each on the wire) and every value is an integer: the reading scaled by the field's factor
+and rounded, so a full reading packs into ~65 bytes instead of ~350 bytes of JSON plus
+the HTTP request around it.
+
+    {1: 42, 2: 1717200000, 3: 4512, 4: 2437, 5: 6012, 6: 650, ...}
+      farmer 42, 2024-06-01T00:00:00Z, moisture 45.12 %, temp 24.37 °C, humidity 60.12 %, pH 6.50
+
+The timestamp (unix seconds) is optional; without an RTC/NTP fix the node leaves it out and
+the receive time is used. Unknown field ids are ignored, so nodes can be upgraded ahead of
+the server. Field ids are never reused; a new sensor gets a new id.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+import msgpack
+
+# field id -> (SoilData field, scale factor)
+FIELDS = {
+    1: ("farmer_id", 1),
+    2: ("timestamp", 1),          # unix seconds, UTC
+    3: ("moisture", 100),
+    4: ("temp", 100),
+    5: ("humidity", 100),
+    6: ("ph", 100),
+    7: ("nitrogen", 10),
+    8: ("phosphorus", 10),
+    9: ("potassium", 10),
+    10: ("rainfall", 10),
+    11: ("soil_temp", 100),
+    12: ("soil_ec", 100),
+    13: ("air_pressure", 10),
+    14: ("light_intensity", 1),
+    15: ("water_level", 10),
+    16: ("flow_rate", 100),
+    17: ("battery_voltage", 1000),
+    18: ("seq", 1),               # per-node sequence number (idempotent retries)
+}
+FIELD_IDS = {name: (field_id, scale) for field_id, (name, scale) in FIELDS.items()}
+MAX_READINGS_PER_FRAME = 256
+
+
+class FrameError(ValueError):
+    """The frame is not valid MessagePack or not shaped like a telemetry frame."""
+
+
+def encode_reading(reading: Dict) -> Dict[int, int]:
+    """SoilData-shaped dict -> field-id map (what a node would pack)."""
+    packed = {}
+    for name, value in reading.items():
+        if value is None or name not in FIELD_IDS:
+            continue
+        field_id, scale = FIELD_IDS[name]
+        if name == "timestamp":
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00")) if isinstance(value, str) else value
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            value = parsed.timestamp()
+        packed[field_id] = int(round(value * scale))
+    return packed
+
+
+def encode_frame(readings: Iterable[Dict]) -> bytes:
+    maps = [encode_reading(reading) for reading in readings]
+    return msgpack.packb(maps[0] if len(maps) == 1 else maps)
+
+
+def decode_reading(packed) -> Dict:
+    if not isinstance(packed, dict):
+        raise FrameError("Expected a map of field id -> value")
+    record = {}
+    for field_id, value in packed.items():
+        field = FIELDS.get(field_id)
+        if field is None:
+            continue  # newer node firmware; ignore what this server doesn't know
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise FrameError(f"Field {field_id} must be an integer")
+        name, scale = field
+        if name == "timestamp":
+            try:
+                record[name] = datetime.fromtimestamp(value, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+            except (OverflowError, OSError, ValueError):
+                raise FrameError(f"Timestamp {value} is out of range")
+        elif scale == 1:
+            record[name] = value
+        else:
+            record[name] = value / scale
+    if "timestamp" not in record:
+        record["timestamp"] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    return record
+
+
+def decode_frame(frame: bytes) -> List[Dict]:
+    """Frame bytes -> SoilData-shaped dicts (not validated yet)."""
+    try:
+        payload = msgpack.unpackb(frame, strict_map_key=False, max_array_len=MAX_READINGS_PER_FRAME, max_map_len=64)
+    except Exception as e:
+        raise FrameError(f"Invalid MessagePack frame: {e}")
+    readings = payload if isinstance(payload, list) else [payload]
+    return [decode_reading(packed) for packed in readings]
@@ -0,0 +1,195 @@
+"""
+Live telemetry fan-out for /ws/telemetry and /api/soil-data/stream.
+
+The ingestion path publishes each accepted reading and each fired / cleared alert for a
+farmer; every connection subscribed to that farmer gets the message as a delta. Messages
+are JSON-encoded once per publish and the same string is queued for every subscriber.
+
+Each subscription has a bounded queue. A client that reads slower than its farmer's
+telemetry arrives (slow network, backgrounded tab) loses the oldest queued messages rather
+than growing memory or holding up the publisher; its next message is then a
+{"type": "lagged", "dropped": n} notice so the client can re-fetch /api/soil-data.
+
+With several Uvicorn workers a node's readings land on one worker while its dashboard may
+be connected to another, so TELEMETRY_PUBSUB_REDIS_URL routes every publish through a Redis
+channel that all workers listen on (needs the `redis` package).
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, farmer_id: int, max_queue: int):
+        self.farmer_id = farmer_id
+        self.max_queue = max_queue
+        self.dropped = 0  # messages lost since the last lag notice
+        self._queue: deque = deque()
+        self._ready = asyncio.Event()
+
+    def put(self, message: str) -> bool:
+        """Queue a message; returns False if the oldest queued one had to be dropped for it."""
+        overflow = len(self._queue) >= self.max_queue
+        if overflow:
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(message)
+        self._ready.set()
+        return not overflow
+
+    async def get(self) -> str:
+        while not self._queue:
+            self._ready.clear()
+            await self._ready.wait()
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return json.dumps({"type": "lagged", "dropped": dropped})
+        return self._queue.popleft()
+
+
+class RedisBroker:
+    """Relays publishes between workers over one Redis pub/sub channel."""
+
+    def __init__(self, url: str, channel: str = "agrisphere:telemetry"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("TELEMETRY_PUBSUB_REDIS_URL is set but the 'redis' package is not installed")
+        self.client = aioredis.from_url(url)
+        self.channel = channel
+
+    async def publish(self, farmer_id: int, message: str):
+        await self.client.publish(self.channel, f"{farmer_id}:{message}")
+
+    async def listen(self, deliver):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for item in pubsub.listen():
+                if item["type"] != "message":
+                    continue
+                farmer_id, _, message = item["data"].decode("utf-8").partition(":")
+                deliver(int(farmer_id), message)
+        finally:
+            await pubsub.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class TelemetryHub:
+    """
+    In-process pub/sub keyed by farmer id. publish() never blocks: it either delivers to the
+    local subscribers directly or, with a broker, queues the message for the relay task
+    (`max_outbox` deep; beyond that messages are dropped and counted).
+    """
+
+    def __init__(self, max_queue: int = 100, broker=None, max_outbox: int = 10000):
+        self.max_queue = max_queue
+        self.broker = broker
+        self.max_outbox = max_outbox
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._outbox: deque = deque()
+        self._outbox_ready: Optional[asyncio.Event] = None
+        self._tasks = []
+
+        # Counters exposed through stats()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.outbox_dropped = 0
+        self.broker_errors = 0
+
+    def subscribe(self, farmer_id: int) -> Subscription:
+        subscription = Subscription(farmer_id, self.max_queue)
+        self._subscribers.setdefault(farmer_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.farmer_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.farmer_id]
+
+    def publish(self, farmer_id: int, message: Dict):
+        self.published += 1
+        if self.broker is None:
+            if farmer_id in self._subscribers:
+                self._deliver(farmer_id, json.dumps(message, default=str))
+            return
+        if len(self._outbox) >= self.max_outbox:
+            self.outbox_dropped += 1
+            return
+        self._outbox.append((farmer_id, json.dumps(message, default=str)))
+        if self._outbox_ready is not None:
+            self._outbox_ready.set()
+
+    def _deliver(self, farmer_id: int, message: str):
+        for subscription in self._subscribers.get(farmer_id, ()):
+            self.delivered += 1
+            if not subscription.put(message):
+                self.dropped += 1
+
+    async def start(self):
+        if self.broker is None:
+            return
+        self._outbox_ready = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._relay()), asyncio.create_task(self._listen())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.broker is not None:
+            await self.broker.aclose()
+
+    async def _relay(self):
+        while True:
+            while not self._outbox:
+                self._outbox_ready.clear()
+                await self._outbox_ready.wait()
+            farmer_id, message = self._outbox.popleft()
+            try:
+                await self.broker.publish(farmer_id, message)
+            except Exception:
+                self.broker_errors += 1
+                logger.exception("Telemetry broker publish failed; message dropped")
+
+    async def _listen(self):
+        while True:
+            try:
+                await self.broker.listen(self._deliver)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.broker_errors += 1
+                logger.exception("Telemetry broker subscription lost, reconnecting")
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict:
+        return {
+            "broker": type(self.broker).__name__ if self.broker is not None else None,
+            "farmers": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "outbox_depth": len(self._outbox),
+            "outbox_dropped": self.outbox_dropped,
+            "broker_errors": self.broker_errors,
+        }
+
+
+def build_telemetry_hub() -> TelemetryHub:
+    redis_url = os.getenv("TELEMETRY_PUBSUB_REDIS_URL")
+    return TelemetryHub(
+        max_queue=int(os.getenv("TELEMETRY_SUBSCRIBER_QUEUE", "100")),
+        broker=RedisBroker(redis_url) if redis_url else None,
+    )
@@ -1,16 +1,57 @@
-import time
-import requests
+"""
+ESP32 fleet simulator and load generator.
+
+With no options it behaves like one physical node: Farmer #1 posting a reading to the local
+backend every 10 seconds. With --nodes it runs a whole fleet of virtual nodes on one asyncio
+loop, spread over --farmers farmers, and reports achieved throughput, latency percentiles
+and error rates.
+
+Scenarios
+  steady           every node sends one reading per --interval (± --jitter)
+  burst            steady, plus every --burst-every seconds all nodes send --burst-size
+                   readings at the same instant (e.g. a storm front triggering event sends)
+  reconnect-storm  steady, but the network drops at --outage-at for --outage seconds; nodes
+                   keep sampling into a local backlog and all flush it the moment it returns
+  replay           every node uploads a --backlog of historical readings (a node coming
+                   back from days offline) as fast as the server takes them, then exits
+
+Targets
+  --url URL        a live server (default http://localhost:8000)
+  --in-process     the app imported from main.py over ASGI, with a throwaway SQLite database;
+                   no network or Docker involved, so runs are reproducible (use --seed)
+  --udp HOST:PORT  MessagePack frames to the binary ingestion gateway (fire-and-forget, so
+                   only send rates are reported; check /api/binary-ingest/stats for what landed)
+
+    python simulate_esp32.py
+    python simulate_esp32.py --nodes 1000 --farmers 100 --interval 5 --jitter 0.2 --duration 60
+    python simulate_esp32.py --nodes 500 --scenario reconnect-storm --outage 60 --fresh-connections
+    python simulate_esp32.py --in-process --nodes 200 --scenario replay --backlog 500 --batch 100 --json
+
+Readings for farmers that don't exist are rejected by Postgres; pass --register to create
+--farmers simulated farmers (phones sim-000001, ...) before the run.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
 import random
-from datetime import datetime
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 
-API_URL = "http://localhost:8000/api/soil-data"
+import httpx
+
+from services.telemetry_codec import encode_frame
+
+API_URL = "http://localhost:8000"
 FARMER_ID = 1  # Note: The database must have a farmer with ID=1. If not, this script will fail.
 
-print("=========================================")
-print(f" Simulating physical node for Farmer #{FARMER_ID}")
-print("=========================================\n")
 
-def generate_telemetry(farmer_id, base_temp=25.0, base_hum=60.0):
+def generate_telemetry(farmer_id, base_temp=25.0, base_hum=60.0, when=None):
     # Simulate realistic fluctuations
     temp = base_temp + random.uniform(-2.0, 2.0)
     humidity = base_hum + random.uniform(-5.0, 5.0)
@@ -21,6 +62,7 @@ def generate_telemetry(farmer_id, base_temp=25.0, base_hum=60.0):
     phosphorus = 50.0 + random.uniform(-10.0, 10.0)
     potassium = 80.0 + random.uniform(-15.0, 15.0)
     rainfall = max(0.0, random.uniform(-5.0, 10.0)) # Sometimes no rain
+    when = when or datetime.now(timezone.utc)
 
     payload = {
         "farmer_id": farmer_id,
@@ -32,7 +74,7 @@ def generate_telemetry(farmer_id, base_temp=25.0, base_hum=60.0):
         "phosphorus": float(round(phosphorus, 2)),
         "potassium": float(round(potassium, 2)),
         "rainfall": float(round(rainfall, 2)),
-        
+
         # New Hardware Sensors
         "soil_temp": float(round(temp - random.uniform(2.0, 5.0), 2)),    # DS18B20 (°C, usually cooler than air)
         "soil_ec": float(round(random.uniform(1.2, 1.8), 2)),             # EC Sensor (ms/cm)
@@ -41,28 +83,338 @@ def generate_telemetry(farmer_id, base_temp=25.0, base_hum=60.0):
         "water_level": float(round(random.uniform(60.0, 95.0), 2)),       # Water Level Sensor (%)
         "flow_rate": float(round(random.uniform(0.0, 2.5), 2)),           # Flow Rate Sensor (L/min)
         "battery_voltage": float(round(random.uniform(3.8, 4.2), 2)),     # Battery Monitor (V)
-        
-        "timestamp": datetime.utcnow().isoformat() + "Z"
+
+        "timestamp": when.replace(tzinfo=None, microsecond=0).isoformat() + "Z"
     }
     return payload, moisture, temp, ph # Return individual values for printing
 
-while True:
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Stats:
+    """Per-request outcomes; an error is any request that did not get all its readings accepted."""
+
+    def __init__(self):
+        self.start()
+        self.requests = 0
+        self.readings_sent = 0
+        self.readings_accepted = 0
+        self.latencies = []  # ms, requests that got an answer
+        self.errors = Counter()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._window = (self.started, 0, 0)  # progress(): time, accepted, requests at the last report
+
+    def record(self, readings: int, accepted: int, latency=None, error=None):
+        self.requests += 1
+        self.readings_sent += readings
+        self.readings_accepted += accepted
+        if latency is not None:
+            self.latencies.append(latency * 1000)
+        if error:
+            self.errors[error] += 1
+
+    def progress(self) -> str:
+        now = time.perf_counter()
+        since, accepted, requests = self._window
+        self._window = (now, self.readings_accepted, self.requests)
+        rate = (self.readings_accepted - accepted) / max(now - since, 1e-9)
+        errors = sum(self.errors.values())
+        return (f"[{now - self.started:6.1f}s] {self.readings_sent:,} readings sent, {rate:,.0f} accepted/s, "
+                f"{self.requests - requests:,} requests, {errors:,} errors so far")
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        ordered = sorted(self.latencies)
+        errors = sum(self.errors.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": self.requests,
+            "readings_sent": self.readings_sent,
+            "readings_accepted": self.readings_accepted,
+            "throughput": round(self.readings_accepted / elapsed, 1) if elapsed else 0.0,
+            "request_rate": round(self.requests / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(ordered, 50), 2),
+                "p90": round(percentile(ordered, 90), 2),
+                "p99": round(percentile(ordered, 99), 2),
+                "max": round(ordered[-1], 2),
+            } if ordered else None,
+            "error_rate": round(errors / self.requests, 4) if self.requests else 0.0,
+            "errors": dict(self.errors),
+        }
+
+
+class HttpTransport:
+    """POST /api/soil-data for a single reading, /api/soil-data/batch for a backlog chunk."""
+
+    def __init__(self, client: httpx.AsyncClient, fresh_connections: bool = False):
+        self.client = client
+        # The firmware's HTTPClient opens a new TCP connection for every reading
+        self.headers = {"Connection": "close"} if fresh_connections else {}
+
+    async def send(self, readings, stats: Stats):
+        started = time.perf_counter()
+        try:
+            if len(readings) == 1:
+                response = await self.client.post("/api/soil-data", json=readings[0], headers=self.headers)
+                accepted = 1 if response.status_code == 201 else 0
+            else:
+                response = await self.client.post("/api/soil-data/batch", json=readings, headers=self.headers)
+                accepted = response.json()["accepted"] if response.status_code == 200 else 0
+        except httpx.HTTPError as e:
+            stats.record(len(readings), 0, error=type(e).__name__)
+            return False
+        error = None
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+        elif accepted < len(readings):
+            error = "rejected"
+        stats.record(len(readings), accepted, time.perf_counter() - started, error)
+        return response.status_code < 400
+
+
+class UdpTransport:
+    """One MessagePack frame per send (a backlog chunk goes out as one multi-reading frame)."""
+
+    def __init__(self, target):
+        self.target = target
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    async def send(self, readings, stats: Stats):
+        try:
+            self.sock.sendto(encode_frame(readings), self.target)
+        except OSError as e:
+            stats.record(len(readings), 0, error=type(e).__name__)
+            return False
+        stats.record(len(readings), len(readings))  # sent, not confirmed
+        return True
+
+
+class Node:
+    def __init__(self, node_id: int, farmer_id: int):
+        self.node_id = node_id
+        self.farmer_id = farmer_id
+        # Each field sits in its own microclimate
+        self.base_temp = random.uniform(22.0, 30.0)
+        self.base_hum = random.uniform(50.0, 70.0)
+        self.backlog = []
+
+    def reading(self, when=None) -> dict:
+        return generate_telemetry(self.farmer_id, self.base_temp, self.base_hum, when)[0]
+
+
+class Fleet:
+    def __init__(self, args, transport, farmer_ids, stats: Stats):
+        self.args = args
+        self.transport = transport
+        self.stats = stats
+        self.nodes = [Node(n, farmer_ids[n % len(farmer_ids)]) for n in range(args.nodes)]
+        self.online = asyncio.Event()
+        self.online.set()
+        self.verbose = args.nodes == 1
+        # Keep stdout clean for --json
+        self.log = functools.partial(print, file=sys.stderr if args.json else sys.stdout)
+
+    def next_interval(self) -> float:
+        return max(0.0, self.args.interval * (1 + random.uniform(-self.args.jitter, self.args.jitter)))
+
+    async def send(self, node: Node, readings) -> bool:
+        ok = await self.transport.send(readings, self.stats)
+        if self.verbose:
+            reading = readings[-1]
+            status = "TX SUCCESS" if ok else "TX FAILED"
+            self.log(f"[{status} x{len(readings)}] --> Moisture: {reading['moisture']}% | Temp: {reading['temp']}°C | pH: {reading['ph']}")
+        return ok
+
+    async def flush_backlog(self, node: Node):
+        backlog, node.backlog = node.backlog, []
+        for start in range(0, len(backlog), self.args.batch):
+            await self.send(node, backlog[start:start + self.args.batch])
+
+    async def run_node(self, node: Node, deadline):
+        if len(self.nodes) > 1:
+            # Nodes boot at different times; spread the first send over one interval
+            await asyncio.sleep(random.uniform(0, self.args.interval))
+        while deadline is None or time.monotonic() < deadline:
+            if self.online.is_set():
+                await self.send(node, [node.reading()])
+            else:
+                node.backlog.append(node.reading())  # keeps sampling while the uplink is down
+            delay = self.next_interval()
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+
+    async def bursts(self):
+        while True:
+            await asyncio.sleep(self.args.burst_every)
+            if self.verbose:
+                self.log(f"[BURST] {len(self.nodes)} nodes x {self.args.burst_size} readings")
+            await asyncio.gather(*(
+                self.send(node, [node.reading()]) for node in self.nodes for _ in range(self.args.burst_size)
+            ))
+
+    async def outage(self):
+        await asyncio.sleep(self.args.outage_at)
+        self.online.clear()
+        self.log(f"[OUTAGE] uplink down for {self.args.outage:.0f}s")
+        await asyncio.sleep(self.args.outage)
+        self.online.set()
+        backlog = sum(len(node.backlog) for node in self.nodes)
+        self.log(f"[RECONNECT] {len(self.nodes)} nodes flushing {backlog:,} buffered readings at once")
+        await asyncio.gather(*(self.flush_backlog(node) for node in self.nodes))
+
+    async def replay(self):
+        now = datetime.now(timezone.utc)
+        for node in self.nodes:
+            node.backlog = [node.reading(now - timedelta(seconds=self.args.interval * age))
+                            for age in range(self.args.backlog, 0, -1)]
+        self.log(f"[REPLAY] {len(self.nodes)} nodes uploading {len(self.nodes) * self.args.backlog:,} historical readings")
+        await asyncio.gather(*(self.flush_backlog(node) for node in self.nodes))
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(self.args.report_every)
+            self.log(self.stats.progress())
+
+    async def run(self):
+        args = self.args
+        background = []
+        self.stats.start()  # measure the fleet, not app startup or farmer registration
+        if not self.verbose and args.report_every:
+            background.append(asyncio.create_task(self.report()))
+        try:
+            if args.scenario == "replay":
+                await self.replay()
+            else:
+                deadline = time.monotonic() + args.duration if args.duration else None
+                if args.scenario == "burst":
+                    background.append(asyncio.create_task(self.bursts()))
+                elif args.scenario == "reconnect-storm":
+                    background.append(asyncio.create_task(self.outage()))
+                await asyncio.gather(*(self.run_node(node, deadline) for node in self.nodes))
+                if args.scenario == "reconnect-storm" and not background[-1].done():
+                    await background[-1]  # a storm that outlasts --duration still gets measured
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+
+
+async def register_farmers(client: httpx.AsyncClient, count: int):
+    farmer_ids = []
+    for n in range(1, count + 1):
+        phone = f"sim-{n:06d}"
+        # An already registered phone fails here and is simply logged in below
+        await client.post("/api/farmer-register", json={"name": f"Simulated Farmer {n}", "phone": phone, "location": "Simulated"})
+        response = await client.post("/api/login", json={"phone": phone})
+        response.raise_for_status()
+        farmer_ids.append(response.json()["farmer_id"])
+    return farmer_ids
+
+
+async def run(args, stats: Stats):
+    if args.udp:
+        host, _, port = args.udp.rpartition(":")
+        farmer_ids = list(range(args.first_farmer, args.first_farmer + args.farmers))
+        await Fleet(args, UdpTransport((host or "localhost", int(port))), farmer_ids, stats).run()
+        return
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=0 if args.fresh_connections else args.connections)
+    if args.in_process:
+        import main
+
+        transport = httpx.ASGITransport(app=main.app)
+        lifespan = main.app.router.lifespan_context(main.app)
+        base_url = "http://simulator"
+    else:
+        transport, lifespan, base_url = None, None, args.url
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            if args.register:
+                farmer_ids = await register_farmers(client, args.farmers)
+            else:
+                farmer_ids = list(range(args.first_farmer, args.first_farmer + args.farmers))
+            await Fleet(args, HttpTransport(client, args.fresh_connections), farmer_ids, stats).run()
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+
+def print_summary(args, summary: dict):
+    target = f"udp://{args.udp}" if args.udp else ("in-process app" if args.in_process else args.url)
+    print("\n=========================================")
+    print(f" {args.scenario}: {args.nodes:,} nodes / {args.farmers:,} farmers -> {target}")
+    print("=========================================")
+    print(f"  readings sent      {summary['readings_sent']:,} in {summary['elapsed_s']:.1f}s ({summary['requests']:,} requests)")
+    print(f"  readings accepted  {summary['readings_accepted']:,} ({summary['throughput']:,.1f}/s)")
+    latency = summary["latency_ms"]
+    if latency:
+        print(f"  latency            p50 {latency['p50']:.1f} ms   p90 {latency['p90']:.1f} ms   "
+              f"p99 {latency['p99']:.1f} ms   max {latency['max']:.1f} ms")
+    print(f"  error rate         {summary['error_rate']:.2%}   {summary['errors'] or ''}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=API_URL, help="backend base URL")
+    target.add_argument("--in-process", action="store_true", help="drive main.app over ASGI with a throwaway SQLite database")
+    target.add_argument("--udp", metavar="HOST:PORT", help="send MessagePack frames to the binary ingestion gateway instead of JSON over HTTP")
+    parser.add_argument("--scenario", choices=("steady", "burst", "reconnect-storm", "replay"), default="steady")
+    parser.add_argument("--nodes", type=int, default=1)
+    parser.add_argument("--farmers", type=int, default=1, help="nodes are spread evenly over this many farmers")
+    parser.add_argument("--first-farmer", type=int, default=FARMER_ID, help="farmer ids used are first-farmer .. first-farmer + farmers - 1")
+    parser.add_argument("--register", action="store_true", help="register --farmers simulated farmers first and use their ids")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between a node's readings")
+    parser.add_argument("--jitter", type=float, default=0.0, help="interval jitter as a fraction (0.2 = ±20%%)")
+    parser.add_argument("--duration", type=float, help="seconds to run (default: forever, except replay)")
+    parser.add_argument("--burst-every", type=float, default=30.0, help="burst: seconds between bursts")
+    parser.add_argument("--burst-size", type=int, default=5, help="burst: readings every node sends per burst")
+    parser.add_argument("--outage-at", type=float, default=10.0, help="reconnect-storm: seconds before the uplink drops")
+    parser.add_argument("--outage", type=float, default=30.0, help="reconnect-storm: seconds the uplink stays down")
+    parser.add_argument("--backlog", type=int, default=1000, help="replay: historical readings per node")
+    parser.add_argument("--batch", type=int, default=1, help="readings per request when flushing a backlog (>1 uses /api/soil-data/batch)")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size shared by the fleet")
+    parser.add_argument("--fresh-connections", action="store_true", help="new TCP connection per request, like the firmware")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout, including waiting for a pooled connection")
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between progress lines (0 = off)")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible readings and timing")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--max-error-rate", type=float, help="exit with status 1 if the error rate is above this (CI gate)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.in_process:
+        # Point the app at a throwaway SQLite database before main.py is imported
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='agrisphere-sim-'), 'sim.db')}"
+        os.environ.pop("GEMINI_API_KEY", None)
+    if args.nodes == 1:
+        print("=========================================")
+        print(f" Simulating physical node for Farmer #{args.first_farmer}")
+        print("=========================================\n")
+
+    stats = Stats()
     try:
-        # Simulate physical analog sensors wildly fluctuating based on weather
-        payload, moisture, temp, ph = generate_telemetry(FARMER_ID)
-        
-        # Throw the JSON packet over the network, exactly like the C++ http.POST()
-        response = requests.post(API_URL, json=payload)
-        
-        if response.status_code == 201:
-            print(f"[WIFI TX SUCCESS] --> Moisture: {moisture}% | Temp: {temp}°C | pH: {ph}")
-        else:
-            print(f"[HTTP {response.status_code} ERROR] Backend refused packet: {response.text}")
-            
-    except requests.exceptions.ConnectionError:
-        print("[WIFI TX FAILED] Cannot reach backend server. Is Docker running?")
-    except Exception as e:
-        print(f"[CRASH] Loop iteration failed: {e}")
-        
-    # Sleep for 10 seconds before the loop repeats, mimicking delay(10000);
-    time.sleep(10)
+        asyncio.run(run(args, stats))
+    except KeyboardInterrupt:
+        pass  # report what was measured so far
+    summary = stats.summary()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(args, summary)
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        sys.exit(1)
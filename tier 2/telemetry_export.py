@@ -0,0 +1,246 @@
+"""
+Bulk export of raw soil_data rows as CSV, Parquet or Arrow IPC (for model training).
+
+Rows are read through a streaming cursor (a server-side cursor on Postgres) `chunk_rows` at
+a time and each chunk is encoded and handed on before the next one is fetched, so memory
+stays at one chunk whatever the size of the export: a Parquet row group or an Arrow record
+batch per chunk, or a block of CSV lines. Column names are the SoilData field names, so
+read_chunks() output can go straight into services.crop_prediction.readings_matrix() /
+rank_crops() for re-scoring (see export_soil_data.py).
+
+Parquet and Arrow need the optional `pyarrow` package; CSV has no extra dependencies.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import Float, Integer, select
+
+import models
+
+# format -> (media type, file extension)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+EXTENSIONS = {extension: name for name, (_, extension) in FORMATS.items()}
+EXTENSIONS["arrow"] = "arrow"
+DEFAULT_CHUNK_ROWS = 50000
+
+_COLUMNS = models.SoilDataDB.__table__.c
+FIELDS = tuple(column.name for column in _COLUMNS)
+FLOAT_FIELDS = tuple(column.name for column in _COLUMNS if isinstance(column.type, Float))
+INTEGER_FIELDS = tuple(column.name for column in _COLUMNS if isinstance(column.type, Integer))  # BigInteger included
+# The device's own `timestamp` string is left out unless asked for; `ts` is the same instant, typed
+DEFAULT_FIELDS = ("id", "farmer_id", "ts") + FLOAT_FIELDS
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet and Arrow exports need the 'pyarrow' package (pip install pyarrow)")
+    return pyarrow
+
+
+def check_format(fmt: str):
+    """Raises ValueError for an unknown format and RuntimeError if its encoder can't be loaded."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt != "csv":
+        _pyarrow()
+
+
+def format_for_path(path: str) -> str:
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"Can't tell the format of {path}; use a .csv, .parquet or .arrow(s) file")
+    return EXTENSIONS[extension]
+
+
+def export_statement(farmer_ids: Optional[Sequence[int]] = None, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, fields: Sequence[str] = DEFAULT_FIELDS):
+    statement = select(*[_COLUMNS[field] for field in fields]).where(_COLUMNS.ts.isnot(None))
+    if farmer_ids:
+        statement = statement.where(_COLUMNS.farmer_id.in_(list(farmer_ids)))
+    if start is not None:
+        statement = statement.where(_COLUMNS.ts >= start)
+    if end is not None:
+        statement = statement.where(_COLUMNS.ts < end)
+    # Walks the (farmer_id, ts) index, one farmer's series after another
+    return statement.order_by(_COLUMNS.farmer_id, _COLUMNS.ts, _COLUMNS.id)
+
+
+def iter_row_chunks(engine, statement, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[List[tuple]]:
+    """Blocking. Yields lists of up to `chunk_rows` row tuples from a streaming cursor."""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(statement)
+        for partition in result.partitions():
+            yield partition
+
+
+class _Sink:
+    """Write-only file object that pyarrow writes into; drained after every chunk."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class CsvEncoder:
+    def __init__(self, fields: Sequence[str]):
+        self.fields = list(fields)
+        self._ts = self.fields.index("ts") if "ts" in self.fields else None
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def start(self) -> bytes:
+        self._writer.writerow(self.fields)
+        return self._drain()
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        if self._ts is None:
+            self._writer.writerows(rows)
+        else:
+            ts = self._ts
+            for row in rows:
+                row = list(row)
+                row[ts] = models.format_utc(row[ts])
+                self._writer.writerow(row)
+        return self._drain()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _ArrowEncoderBase:
+    def __init__(self, fields: Sequence[str]):
+        pa = self._pa = _pyarrow()
+        self.fields = list(fields)
+        self.schema = pa.schema([(field, arrow_type(pa, field)) for field in self.fields])
+        self._sink = _Sink()
+        self._writer = None
+
+    def _batch(self, rows: Sequence[tuple]):
+        pa = self._pa
+        return pa.record_batch(
+            [pa.array(column, type=self.schema.field(i).type) for i, column in enumerate(zip(*rows))], schema=self.schema,
+        )
+
+    def start(self) -> bytes:
+        return self._sink.drain()
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        if rows:
+            self._writer.write_batch(self._batch(rows))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+class ArrowEncoder(_ArrowEncoderBase):
+    """Arrow IPC streaming format: a schema message, then one record batch per chunk."""
+
+    def __init__(self, fields: Sequence[str]):
+        super().__init__(fields)
+        self._writer = self._pa.ipc.new_stream(self._sink, self.schema)
+
+
+class ParquetEncoder(_ArrowEncoderBase):
+    """One zstd-compressed row group per chunk; the footer is written by finish()."""
+
+    def __init__(self, fields: Sequence[str]):
+        super().__init__(fields)
+        self._writer = self._pa.parquet.ParquetWriter(self._sink, self.schema, compression="zstd")
+
+
+ENCODERS = {"csv": CsvEncoder, "parquet": ParquetEncoder, "arrow": ArrowEncoder}
+
+
+def arrow_type(pa, field: str):
+    if field == "ts":
+        return pa.timestamp("us", tz="UTC")
+    if field in INTEGER_FIELDS:
+        return pa.int64()
+    if field in FLOAT_FIELDS:
+        return pa.float64()
+    return pa.string()
+
+
+def stream_export(engine, fmt: str, farmer_ids: Optional[Sequence[int]] = None, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, fields: Optional[Sequence[str]] = None,
+                  chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Blocking generator of encoded bytes; StreamingResponse runs it in a worker thread."""
+    fields = tuple(fields or DEFAULT_FIELDS)
+    encoder = ENCODERS[fmt](fields)
+    yield encoder.start()
+    for rows in iter_row_chunks(engine, export_statement(farmer_ids, start, end, fields), chunk_rows):
+        data = encoder.encode(rows)
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+def _csv_value(field: str, value: str):
+    if value == "":
+        return None
+    if field in FLOAT_FIELDS:
+        return float(value)
+    if field in INTEGER_FIELDS:
+        return int(value)
+    if field == "ts":
+        return datetime.fromisoformat(value)
+    return value
+
+
+def read_chunks(path: str, fmt: Optional[str] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[List[Dict]]:
+    """Reads an export back as lists of row dicts (None for missing values), a chunk at a time."""
+    fmt = fmt or format_for_path(path)
+    if fmt == "csv":
+        with open(path, newline="") as f:
+            chunk = []
+            for row in csv.DictReader(f):
+                chunk.append({field: _csv_value(field, value) for field, value in row.items()})
+                if len(chunk) >= chunk_rows:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        return
+
+    pa = _pyarrow()
+    if fmt == "parquet":
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pylist()
+        return
+    with pa.OSFile(path, "rb") as source:
+        for batch in pa.ipc.open_stream(source):
+            yield batch.to_pylist()
@@ -0,0 +1,133 @@
+"""
+Downsampled telemetry history for the dashboard charts.
+
+Buckets are aggregated in SQL (min/avg/max per field), so the response size depends on the
+number of buckets rather than the number of readings. The 1h and 1d resolutions are read from
+the soil_data_hourly / soil_data_daily rollup tiers (see telemetry_storage.py) up to the
+newest rolled-up bucket, and only the still-open tail is aggregated from raw rows.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, cast, extract, func, literal_column, select
+
+import models
+
+RESOLUTIONS = {"raw": None, "5m": 300, "1h": 3600, "1d": 86400}
+ROLLUP_TIERS = {"1h": models.SoilDataHourlyDB, "1d": models.SoilDataDailyDB}
+
+
+def _epoch(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _epoch_bucket(dialect_name: str, column, seconds: int):
+    # Bucket start as epoch seconds. Literal (not bound) numbers keep SELECT and GROUP BY identical on Postgres.
+    size = literal_column(str(seconds))
+    if dialect_name == "postgresql":
+        return cast(func.floor(extract("epoch", column) / size), Integer) * size
+    return (cast(func.strftime(literal_column("'%s'"), column), Integer) // size) * size
+
+
+def _bucket_row(bucket_epoch: int, samples: int, values, fields: List[str]) -> Dict:
+    row = {"t": _iso(bucket_epoch), "samples": samples}
+    for index, field in enumerate(fields):
+        low, mean, high = values[index * 3: index * 3 + 3]
+        row[f"{field}_min"] = low
+        row[f"{field}_avg"] = round(mean, 3) if mean is not None else None
+        row[f"{field}_max"] = high
+    return row
+
+
+def _raw_buckets(db, farmer_id: int, start: datetime, end: datetime, seconds: int, fields: List[str]) -> List[Dict]:
+    raw = models.SoilDataDB.__table__.c
+    bucket = _epoch_bucket(db.get_bind().dialect.name, raw.ts, seconds)
+    columns = [bucket.label("bucket"), func.count().label("samples")]
+    for field in fields:
+        columns += [func.min(raw[field]), func.avg(raw[field]), func.max(raw[field])]
+
+    statement = (
+        select(*columns)
+        .where(raw.farmer_id == farmer_id, raw.ts >= start, raw.ts < end)
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    return [_bucket_row(int(row[0]), row[1], row[2:], fields) for row in db.execute(statement)]
+
+
+def _rollup_buckets(db, model, farmer_id: int, start: datetime, end: datetime, fields: List[str]) -> List[Dict]:
+    tier = model.__table__.c
+    columns = [tier.bucket, tier.samples]
+    for field in fields:
+        columns += [tier[f"{field}_min"], tier[f"{field}_avg"], tier[f"{field}_max"]]
+
+    statement = (
+        select(*columns)
+        .where(tier.farmer_id == farmer_id, tier.bucket >= start, tier.bucket < end)
+        .order_by(tier.bucket)
+    )
+    return [_bucket_row(_epoch(row[0]), row[1], row[2:], fields) for row in db.execute(statement)]
+
+
+def _raw_rows(db, farmer_id: int, start: datetime, end: datetime, fields: List[str], limit: int) -> List[Dict]:
+    raw = models.SoilDataDB.__table__.c
+    statement = (
+        select(raw.ts, *[raw[field] for field in fields])
+        .where(raw.farmer_id == farmer_id, raw.ts >= start, raw.ts < end)
+        .order_by(raw.ts, raw.id)
+        .limit(limit)
+    )
+    rows = []
+    for row in db.execute(statement):
+        item = {"t": _iso(_epoch(row[0]))}
+        item.update(zip(fields, row[1:]))
+        rows.append(item)
+    return rows
+
+
+def query_history(db, farmer_id: int, start: datetime, end: datetime, resolution: str,
+                  fields: Optional[List[str]] = None, raw_limit: int = 10000) -> Dict:
+    """Blocking; call through database.run_db. `start`/`end` must be timezone-aware."""
+    fields = fields or list(models.ROLLUP_FIELDS)
+    seconds = RESOLUTIONS[resolution]
+    result = {
+        "farmer_id": farmer_id,
+        "resolution": resolution,
+        "from": _iso(_epoch(start)),
+        "to": _iso(_epoch(end)),
+        "fields": fields,
+    }
+
+    if seconds is None:
+        rows = _raw_rows(db, farmer_id, start, end, fields, raw_limit + 1)
+        result.update({"source": "raw", "truncated": len(rows) > raw_limit, "readings": rows[:raw_limit]})
+        return result
+
+    # Align to bucket boundaries so the first bucket isn't a partial one
+    start = datetime.fromtimestamp(_epoch(start) // seconds * seconds, tz=timezone.utc)
+
+    model = ROLLUP_TIERS.get(resolution)
+    watermark = None
+    if model is not None:
+        tier = model.__table__.c
+        watermark = db.execute(select(func.max(tier.bucket)).where(tier.farmer_id == farmer_id)).scalar()
+
+    if watermark is None:
+        result.update({"source": "raw", "buckets": _raw_buckets(db, farmer_id, start, end, seconds, fields)})
+        return result
+
+    # Newest rolled-up bucket may still be filling: serve it and anything after it from raw rows
+    watermark = datetime.fromtimestamp(_epoch(watermark), tz=timezone.utc)
+    buckets = []
+    if start < watermark:
+        buckets += _rollup_buckets(db, model, farmer_id, start, min(end, watermark), fields)
+    if end > watermark:
+        buckets += _raw_buckets(db, farmer_id, max(start, watermark), end, seconds, fields)
+    result.update({"source": "rollup", "buckets": buckets})
+    return result
@@ -0,0 +1,69 @@
+"""
+Recent-readings read path for GET /api/soil-data.
+
+Selects only the requested columns as plain row tuples (no ORM objects, no identity map, no
+per-row Pydantic model) and lets SQL do the ordering: the inner query takes the newest
+`limit` readings by (ts, id) DESC using the farmer/ts index, the outer one returns them
+oldest-first for the charts. Rows are encoded straight to JSON bytes with orjson, either as
+the usual list of objects or as a columnar `{"fields": [...], "columns": {field: [values]}}`
+layout that chart libraries take as series without reshaping.
+"""
+from typing import List, Optional, Sequence
+
+import orjson
+from sqlalchemy import select
+
+import models
+
+# Same keys, in the same order, as main.SoilDataResponse (less the upload-only `seq`)
+DEFAULT_FIELDS = (
+    "farmer_id", "moisture", "temp", "humidity", "ph", "nitrogen", "phosphorus", "potassium", "rainfall",
+    "soil_temp", "soil_ec", "air_pressure", "light_intensity", "water_level", "flow_rate", "battery_voltage",
+    "timestamp", "id",
+)
+# `ts` is selectable too, written as an aware UTC ISO string (models.format_utc, as in the exports). `dedup_key` is ingestion bookkeeping, not served
+FIELDS = frozenset(column.name for column in models.SoilDataDB.__table__.columns) - {"dedup_key"}
+FORMATS = ("rows", "columnar")
+
+
+def unknown_fields(fields: Sequence[str]) -> List[str]:
+    return [field for field in fields if field not in FIELDS]
+
+
+def query_recent_rows(db, farmer_id: int, limit: int, fields: Optional[Sequence[str]] = None) -> List[tuple]:
+    """Blocking; call through database.run_db. The newest `limit` readings, oldest first."""
+    raw = models.SoilDataDB.__table__.c
+    fields = fields or DEFAULT_FIELDS
+    newest = (
+        select(*[raw[name] for name in dict.fromkeys((*fields, "ts", "id"))])
+        .where(raw.farmer_id == farmer_id, raw.ts.isnot(None))
+        .order_by(raw.ts.desc(), raw.id.desc())
+        .limit(limit)
+        .subquery()
+    )
+    statement = select(*[newest.c[field] for field in fields]).order_by(newest.c.ts, newest.c.id)
+    return db.connection().execute(statement).all()
+
+
+def encode_rows(rows: Sequence[tuple], fields: Sequence[str]) -> bytes:
+    records = [dict(zip(fields, row)) for row in rows]
+    if "ts" in fields:
+        for record in records:
+            record["ts"] = models.format_utc(record["ts"])
+    return orjson.dumps(records)
+
+
+def encode_columnar(rows: Sequence[tuple], fields: Sequence[str]) -> bytes:
+    columns = dict(zip(fields, zip(*rows) if rows else ([] for _ in fields)))
+    if "ts" in columns:
+        columns["ts"] = [models.format_utc(value) for value in columns["ts"]]
+    return orjson.dumps({"fields": list(fields), "columns": columns})
+
+
+def read_recent(db, farmer_id: int, limit: int, fields: Optional[Sequence[str]] = None, layout: str = "rows") -> bytes:
+    """Blocking; query and encode in the DB thread so the event loop only sends bytes."""
+    fields = tuple(fields or DEFAULT_FIELDS)
+    rows = query_recent_rows(db, farmer_id, limit, fields)
+    if layout == "columnar":
+        return encode_columnar(rows, fields)
+    return encode_rows(rows, fields)
@@ -0,0 +1,552 @@
+"""
+Lifecycle management for the soil_data telemetry table: schema sync, monthly range
+partitions, hourly/daily rollup tiers and raw-data retention.
+
+On Postgres soil_data is partitioned BY RANGE (ts), one partition per month
+(soil_data_yYYYYmMM) plus a default partition that catches anything outside the
+pre-created range. Partitions are created a few months ahead; raw partitions older than
+the retention window are rolled up into soil_data_hourly / soil_data_daily and then
+detached and dropped, which is a metadata operation instead of a huge DELETE.
+
+SQLite (local dev) keeps a plain table: rollups work the same and retention falls back to
+batched DELETEs. Use manage_soil_data.py to run any of this by hand.
+"""
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, bindparam, case, func, inspect, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+
+logger = logging.getLogger(__name__)
+
+TABLE = "soil_data"
+LEGACY_TABLE = "soil_data_legacy"
+DEFAULT_PARTITION = "soil_data_default"
+TS_INDEX = "ix_soil_data_farmer_id_ts"
+DEDUP_INDEX = "ux_soil_data_reading"
+PARTITION_RE = re.compile(r"^soil_data_y(\d{4})m(\d{2})$")
+MAINTENANCE_LOCK_KEY = 72_0601  # pg_advisory_lock key, so only one worker runs maintenance at a time
+
+UPDATE_TS = text("UPDATE soil_data SET ts = :ts WHERE id = :id").bindparams(bindparam("ts", type_=DateTime(timezone=True)))
+
+
+def maintenance_settings() -> Dict:
+    return {
+        "months_ahead": int(os.getenv("SOIL_DATA_PARTITION_MONTHS_AHEAD", "3")),
+        "raw_days": int(os.getenv("SOIL_DATA_RAW_RETENTION_DAYS", "90")),
+        "hourly_days": int(os.getenv("SOIL_DATA_HOURLY_RETENTION_DAYS", "730")),
+        "lookback_hours": int(os.getenv("SOIL_DATA_ROLLUP_LOOKBACK_HOURS", "48")),
+    }
+
+
+def is_postgres(engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_start(value: datetime) -> datetime:
+    return floor_day(value).replace(day=1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    years, month_index = divmod(value.month - 1 + months, 12)
+    return value.replace(year=value.year + years, month=month_index + 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"soil_data_y{start.year:04d}m{start.month:02d}"
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything stored is UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+# --- Schema sync (replaces the old migrate_postgres_*.py scripts) ---------------------------
+
+def sync_columns(engine) -> List[str]:
+    """Add every SoilDataDB column that is missing from the live table. Returns the added names."""
+    existing = {column["name"] for column in inspect(engine).get_columns(TABLE)}
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as conn:
+        for column in models.SoilDataDB.__table__.columns:
+            if column.name in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE {TABLE} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=engine.dialect)}"))
+            added.append(column.name)
+    return added
+
+
+def _index_exists(engine, name: str) -> bool:
+    if is_postgres(engine):
+        # pg_indexes also lists the parent index of a partitioned table
+        query = text("SELECT 1 FROM pg_indexes WHERE tablename = :table AND indexname = :name")
+    else:
+        query = text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND name = :name")
+    with engine.connect() as conn:
+        return conn.execute(query, {"table": TABLE, "name": name}).first() is not None
+
+
+def schema_problems(engine) -> List[str]:
+    """
+    What ingestion needs from soil_data that the live table lacks: SoilDataDB columns (every
+    insert names them all) and the unique index behind ON CONFLICT. create_all() does not alter an
+    existing table, so an old database stays like this until manage_soil_data.py setup runs.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(TABLE):
+        return [f"table {TABLE}"]
+    existing = {column["name"] for column in inspector.get_columns(TABLE)}
+    problems = [f"column {column.name}" for column in models.SoilDataDB.__table__.columns if column.name not in existing]
+    if not _index_exists(engine, DEDUP_INDEX):
+        problems.append(f"index {DEDUP_INDEX}")
+    return problems
+
+
+def backfill_ts(engine, batch_size: int = 5000, pause: float = 0.05, start_after_id: int = 0) -> Tuple[int, int, int]:
+    """
+    Fill ts from the ISO `timestamp` strings, walking the primary key in short batches so only
+    the current batch is ever locked. Returns (updated, unparseable, last_id).
+    """
+    last_id = start_after_id
+    updated = 0
+    unparseable = 0
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, timestamp FROM soil_data WHERE id > :last_id AND ts IS NULL ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size},
+            ).fetchall()
+            if not rows:
+                break
+
+            params = []
+            for row_id, raw in rows:
+                parsed = models.parse_iso_timestamp(raw)
+                if parsed is None:
+                    unparseable += 1
+                else:
+                    params.append({"id": row_id, "ts": parsed})
+            if params:
+                conn.execute(UPDATE_TS, params)
+
+        last_id = rows[-1][0]
+        updated += len(params)
+        logger.info("Backfilled ts for %d rows (up to id %d)", updated, last_id)
+        if pause:
+            time.sleep(pause)  # give foreground traffic room between batches
+
+    return updated, unparseable, last_id
+
+
+def ensure_ts_index(engine):
+    """Build ix_soil_data_farmer_id_ts on a plain (non-partitioned) table."""
+    ddl = f"CREATE INDEX {'CONCURRENTLY ' if is_postgres(engine) else ''}IF NOT EXISTS {TS_INDEX} ON {TABLE} (farmer_id, ts DESC, id DESC)"
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(ddl))
+
+
+def ensure_dedup_index(engine):
+    """
+    Build the unique (farmer_id, ts, dedup_key) index that ingestion's ON CONFLICT DO NOTHING
+    relies on. Rows stored before dedup_key existed have it NULL and never conflict.
+    """
+    with engine.connect() as conn:
+        partitioned = is_partitioned(conn)
+    # CONCURRENTLY isn't supported on a partitioned parent; there the index is built per partition
+    concurrently = "CONCURRENTLY " if is_postgres(engine) and not partitioned else ""
+    ddl = f"CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS {DEDUP_INDEX} ON {TABLE} (farmer_id, ts, dedup_key)"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(ddl))
+
+
+# --- Partitioning (Postgres) ---------------------------------------------------------------
+
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": TABLE}).scalar() == "p"
+
+
+def list_partitions(conn) -> List[Tuple[str, datetime]]:
+    """Monthly partitions of soil_data as (name, month start), oldest first."""
+    rows = conn.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:name)"),
+        {"name": TABLE},
+    )
+    partitions = []
+    for (name,) in rows:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _create_partition(conn, start: datetime):
+    # Build the partition standalone, move any rows the default partition caught for this month,
+    # then ATTACH: unlike CREATE ... PARTITION OF this never takes an exclusive lock on soil_data.
+    name = partition_name(start)
+    bounds = {"start": start, "end": add_months(start, 1)}
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    conn.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"))
+
+
+def ensure_partitions(engine, months_ahead: int = 3, start: Optional[datetime] = None) -> List[str]:
+    """Create monthly partitions from `start` (default: this month) through `months_ahead` months out."""
+    now = datetime.now(timezone.utc)
+    month = month_start(_as_utc(start) if start else now)
+    last = add_months(month_start(now), months_ahead)
+    created = []
+
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return created
+        existing = {name for name, _ in list_partitions(conn)}
+
+    while month <= last:
+        if partition_name(month) not in existing:
+            try:
+                with engine.begin() as conn:
+                    _create_partition(conn, month)
+                created.append(partition_name(month))
+            except Exception:
+                logger.exception("Could not create partition %s", partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def _partitioned_table_ddl(engine, next_id: int) -> str:
+    quote = engine.dialect.identifier_preparer.quote
+    columns = []
+    for column in models.SoilDataDB.__table__.columns:
+        if column.name == "id":
+            columns.append(f"id INTEGER GENERATED BY DEFAULT AS IDENTITY (START WITH {next_id}) NOT NULL")
+        elif column.name == "ts":
+            columns.append("ts TIMESTAMP WITH TIME ZONE NOT NULL")  # partition key
+        else:
+            not_null = "" if column.nullable else " NOT NULL"
+            columns.append(f"{quote(column.name)} {column.type.compile(dialect=engine.dialect)}{not_null}")
+    # Unique constraints on a partitioned table must include the partition key
+    return f"CREATE TABLE {TABLE} ({', '.join(columns)}, PRIMARY KEY (id, ts)) PARTITION BY RANGE (ts)"
+
+
+def _legacy_exists(conn) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": LEGACY_TABLE}).scalar() is not None
+
+
+def convert_to_partitioned(engine, months_ahead: int = 3, batch_size: int = 50000) -> int:
+    """
+    One-time conversion of a plain soil_data table into the partitioned layout.
+
+    The swap (rename old table, create partitioned parent) is a single short transaction, so
+    ingestion resumes straight away: the slow MIN(ts) scan runs before the ACCESS EXCLUSIVE
+    lock, and the new identity starts from the id sequence rather than a MAX(id). Foreign keys
+    of the old table (fk_farmer) are re-added to the new one. History is then copied across in
+    id-range batches and the old table is dropped. If the copy is interrupted, soil_data_legacy
+    is left behind and calling this again carries on after the last copied id. Rows without a
+    parseable ts land in the default partition at the epoch. Returns the number of rows copied.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.connect() as conn:
+        partitioned = is_partitioned(conn)
+        legacy = _legacy_exists(conn)
+        oldest = None if partitioned else conn.execute(text(f"SELECT MIN(ts) FROM {TABLE}")).scalar()
+    if partitioned and not legacy:
+        return 0
+    if legacy and not partitioned:
+        raise RuntimeError(f"{LEGACY_TABLE} exists but {TABLE} is not partitioned; resolve by hand before converting")
+
+    if not partitioned:
+        with engine.begin() as conn:
+            conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+            # Past every id in use, without a scan when id has a sequence (MAX(id) is an index lookup otherwise)
+            next_id = conn.execute(text(
+                f"SELECT COALESCE(nextval(pg_get_serial_sequence('{TABLE}', 'id')), (SELECT COALESCE(MAX(id), 0) + 1 FROM {TABLE}))"
+            )).scalar()
+            foreign_keys = conn.execute(
+                text("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(:name) AND contype = 'f'"),
+                {"name": TABLE},
+            ).all()
+
+            conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}"))
+            # Index names are schema-wide; move the old ones out of the way of the new parent's
+            index_names = conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :name"), {"name": LEGACY_TABLE}).scalars().all()
+            for index_name in index_names:
+                conn.execute(text(f"ALTER INDEX {quote(index_name)} RENAME TO {quote(index_name + '_legacy')}"))
+
+            conn.execute(text(_partitioned_table_ddl(engine, next_id)))
+            conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+            conn.execute(text(f"CREATE INDEX {TS_INDEX} ON {TABLE} (farmer_id, ts DESC, id DESC)"))
+            conn.execute(text(f"CREATE INDEX ix_soil_data_farmer_id ON {TABLE} (farmer_id)"))
+            conn.execute(text(f"CREATE UNIQUE INDEX {DEDUP_INDEX} ON {TABLE} (farmer_id, ts, dedup_key)"))
+            # The new table is empty, so validating these is instant
+            for name, definition in foreign_keys:
+                conn.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT {quote(name)} {definition}"))
+    else:
+        with engine.connect() as conn:
+            oldest = conn.execute(text(f"SELECT MIN(ts) FROM {LEGACY_TABLE}")).scalar()
+        logger.info("Resuming the copy from %s", LEGACY_TABLE)
+
+    ensure_partitions(engine, months_ahead, start=oldest)
+
+    column_names = [quote(column.name) for column in models.SoilDataDB.__table__.columns]
+    select_list = ["COALESCE(ts, to_timestamp(0))" if name == "ts" else name for name in column_names]
+    # ON CONFLICT: a device retry ingested since the swap may already hold the same reading
+    copy_batch = text(
+        f"INSERT INTO {TABLE} ({', '.join(column_names)}) "
+        f"SELECT {', '.join(select_list)} FROM {LEGACY_TABLE} WHERE id > :low AND id <= :high "
+        f"ON CONFLICT DO NOTHING"
+    )
+    next_high = text(f"SELECT MAX(id) FROM (SELECT id FROM {LEGACY_TABLE} WHERE id > :low ORDER BY id LIMIT :limit) batch")
+    with engine.connect() as conn:
+        # Legacy ids are all below the new identity, and each batch commits whole: the highest one copied is the resume point
+        low = conn.execute(
+            text(f"SELECT COALESCE(MAX(id), 0) FROM {TABLE} WHERE id <= (SELECT MAX(id) FROM {LEGACY_TABLE})")
+        ).scalar()
+    copied = 0
+    while True:
+        with engine.begin() as conn:
+            high = conn.execute(next_high, {"low": low, "limit": batch_size}).scalar()
+            if high is None:
+                break
+            copied += conn.execute(copy_batch, {"low": low, "high": high}).rowcount
+        low = high
+        logger.info("Copied %d rows into partitioned soil_data (up to id %d)", copied, low)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+    return copied
+
+
+# --- Rollups --------------------------------------------------------------------------------
+
+def _bucket(engine, column, unit: str):
+    # Bucket start in UTC. Literal (not bound) arguments keep the SELECT and GROUP BY expressions identical.
+    if is_postgres(engine):
+        return func.timezone("UTC", func.date_trunc(literal_column(f"'{unit}'"), func.timezone("UTC", column)))
+    pattern = "%Y-%m-%d %H:00:00.000000" if unit == "hour" else "%Y-%m-%d 00:00:00.000000"
+    return func.strftime(literal_column(f"'{pattern}'"), column)
+
+
+def _upsert(engine, model, select_stmt):
+    table = model.__table__
+    insert_fn = pg_insert if is_postgres(engine) else sqlite_insert
+    column_names = [column.name for column in table.columns]
+    stmt = insert_fn(table).from_select(column_names, select_stmt)
+    return stmt.on_conflict_do_update(
+        index_elements=["farmer_id", "bucket"],
+        set_={name: stmt.excluded[name] for name in column_names if name not in ("farmer_id", "bucket")},
+    )
+
+
+def _hourly_select(engine, start: datetime, end: datetime):
+    raw = models.SoilDataDB.__table__.c
+    bucket = _bucket(engine, raw.ts, "hour")
+    columns = [raw.farmer_id, bucket.label("bucket"), func.count().label("samples")]
+    for field in models.ROLLUP_FIELDS:
+        columns += [func.min(raw[field]), func.avg(raw[field]), func.max(raw[field])]
+    return (
+        select(*columns)
+        .where(raw.ts >= start, raw.ts < end, raw.farmer_id.isnot(None))
+        .group_by(raw.farmer_id, bucket)
+    )
+
+
+def _daily_select(engine, start: datetime, end: datetime):
+    hourly = models.SoilDataHourlyDB.__table__.c
+    bucket = _bucket(engine, hourly.bucket, "day")
+    columns = [hourly.farmer_id, bucket.label("bucket"), func.sum(hourly.samples).label("samples")]
+    for field in models.ROLLUP_FIELDS:
+        avg_column = hourly[f"{field}_avg"]
+        # Sample-weighted mean of the hourly means, ignoring hours where the sensor reported nothing
+        weight = func.sum(case((avg_column.isnot(None), hourly.samples), else_=0))
+        columns += [
+            func.min(hourly[f"{field}_min"]),
+            func.sum(avg_column * hourly.samples) / func.nullif(weight, 0),
+            func.max(hourly[f"{field}_max"]),
+        ]
+    return (
+        select(*columns)
+        .where(hourly.bucket >= start, hourly.bucket < end)
+        .group_by(hourly.farmer_id, bucket)
+    )
+
+
+def rollup(engine, start: datetime, end: datetime) -> Dict:
+    """
+    (Re)compute hourly buckets for [start, end) from raw rows and daily buckets for the days
+    touched, from the hourly tier. Idempotent: buckets are upserted, so late readings replayed
+    by offline nodes are folded in the next time their window is rolled up.
+    """
+    start = floor_hour(_as_utc(start))
+    end = floor_hour(_as_utc(end))
+    if end <= start:
+        return {"hourly": 0, "daily": 0}
+
+    day_start = floor_day(start)
+    day_end = floor_day(end) + (timedelta(days=1) if end != floor_day(end) else timedelta(0))
+    with engine.begin() as conn:
+        hourly = conn.execute(_upsert(engine, models.SoilDataHourlyDB, _hourly_select(engine, start, end))).rowcount
+        daily = conn.execute(_upsert(engine, models.SoilDataDailyDB, _daily_select(engine, day_start, day_end))).rowcount
+    return {"hourly": hourly, "daily": daily}
+
+
+def mark_late_hours(conn, rows: List[Dict], lookback_hours: int):
+    """
+    Called in the ingestion transaction with the rows just inserted. Records the hour of every
+    row older than the rollup lookback (a node replaying its backlog), since the scheduled
+    rollup only re-rolls the last `lookback_hours`; rollup_late_hours() folds them in.
+    """
+    horizon = datetime.now(timezone.utc) - timedelta(hours=lookback_hours)
+    hours = {floor_hour(_as_utc(row["ts"])) for row in rows if row.get("ts") is not None and _as_utc(row["ts"]) < horizon}
+    if hours:
+        insert_fn = pg_insert if conn.dialect.name == "postgresql" else sqlite_insert
+        conn.execute(insert_fn(models.SoilDataLateHourDB.__table__).on_conflict_do_nothing(), [{"bucket": hour} for hour in sorted(hours)])
+
+
+def rollup_late_hours(engine) -> Dict:
+    """Re-roll every hour marked by mark_late_hours(), one rollup() per run of consecutive hours."""
+    table = models.SoilDataLateHourDB.__table__
+    # Markers are taken before the rollup reads the raw rows: a late row committed after this gets a new one
+    with engine.begin() as conn:
+        hours = sorted(_as_utc(hour) for hour in conn.execute(table.delete().returning(table.c.bucket)).scalars())
+    summary = {"hours": len(hours), "hourly": 0, "daily": 0}
+    ranges = []
+    for hour in hours:
+        if ranges and hour == ranges[-1][1]:
+            ranges[-1][1] = hour + timedelta(hours=1)
+        else:
+            ranges.append([hour, hour + timedelta(hours=1)])
+    try:
+        for start, end in ranges:
+            counts = rollup(engine, start, end)
+            summary["hourly"] += counts["hourly"]
+            summary["daily"] += counts["daily"]
+    except Exception:
+        mark = pg_insert if is_postgres(engine) else sqlite_insert
+        with engine.begin() as conn:
+            conn.execute(mark(table).on_conflict_do_nothing(), [{"bucket": hour} for hour in hours])
+        raise
+    return summary
+
+
+# --- Retention ------------------------------------------------------------------------------
+
+def _delete_older_than(engine, table: str, cutoff: datetime, batch_size: int) -> int:
+    # Short batches keyed on id, so the DELETE never holds locks on a large slice of the table
+    statement = text(
+        f"DELETE FROM {table} WHERE id IN "
+        f"(SELECT id FROM {table} WHERE ts < :cutoff LIMIT :limit)"
+    ).bindparams(bindparam("cutoff", type_=DateTime(timezone=True)))
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            count = conn.execute(statement, {"cutoff": cutoff, "limit": batch_size}).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def apply_retention(engine, raw_days: int, hourly_days: Optional[int] = None, batch_size: int = 10000) -> Dict:
+    """
+    Drop raw telemetry older than `raw_days`, always rolling the affected range up first.
+    Partitioned tables lose whole monthly partitions (raw data is therefore kept for at least
+    `raw_days`); plain tables and the default partition are trimmed with batched DELETEs.
+    """
+    now = datetime.now(timezone.utc)
+    cutoff = floor_day(now - timedelta(days=raw_days))
+    dropped = []
+
+    with engine.connect() as conn:
+        partitioned = is_partitioned(conn)
+        partitions = list_partitions(conn) if partitioned else []
+
+    for name, start in partitions:
+        end = add_months(start, 1)
+        if end > cutoff:
+            continue
+        rollup(engine, start, end)
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+        logger.info("Dropped raw partition %s after rollup", name)
+
+    target = DEFAULT_PARTITION if partitioned else TABLE
+    with engine.connect() as conn:
+        oldest = conn.execute(
+            text(f"SELECT MIN(ts) FROM {target} WHERE ts < :cutoff").bindparams(bindparam("cutoff", type_=DateTime(timezone=True))),
+            {"cutoff": cutoff},
+        ).scalar()
+
+    deleted = 0
+    if oldest is not None:
+        if isinstance(oldest, str):  # SQLite: raw text() results are not type-converted
+            oldest = datetime.fromisoformat(oldest)
+        rollup(engine, oldest, cutoff)
+        deleted = _delete_older_than(engine, target, cutoff, batch_size)
+
+    hourly_deleted = 0
+    if hourly_days:
+        hourly_table = models.SoilDataHourlyDB.__table__
+        with engine.begin() as conn:
+            hourly_deleted = conn.execute(
+                hourly_table.delete().where(hourly_table.c.bucket < floor_day(now - timedelta(days=hourly_days)))
+            ).rowcount
+
+    return {"dropped_partitions": dropped, "deleted_rows": deleted, "deleted_hourly": hourly_deleted}
+
+
+# --- Scheduled maintenance ------------------------------------------------------------------
+
+def run_maintenance(engine, months_ahead: int = 3, raw_days: int = 90, hourly_days: Optional[int] = 730, lookback_hours: int = 48) -> Optional[Dict]:
+    """
+    Pre-create partitions, refresh recent rollups and the hours late readings landed in, and
+    apply retention. On Postgres an advisory
+    lock makes concurrent calls from several workers a no-op (returns None).
+    """
+    lock_conn = None
+    if is_postgres(engine):
+        lock_conn = engine.connect()
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}).scalar():
+            lock_conn.close()
+            return None
+
+    try:
+        now = datetime.now(timezone.utc)
+        summary = {"created_partitions": ensure_partitions(engine, months_ahead)}
+        # Include the current, still-filling hour; it is simply upserted again next run
+        summary["rollup"] = rollup(engine, now - timedelta(hours=lookback_hours), floor_hour(now) + timedelta(hours=1))
+        # Older hours that late readings landed in since the last run
+        summary["late_rollup"] = rollup_late_hours(engine)
+        if raw_days:
+            summary["retention"] = apply_retention(engine, raw_days, hourly_days)
+        return summary
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+            lock_conn.close()
@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+# Before anything imports database.py / main.py: a throwaway SQLite file, no background maintenance
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='agrisphere-tests-'), 'app.db')}")
+os.environ.setdefault("SOIL_DATA_MAINTENANCE_INTERVAL", "0")
+os.environ.pop("GEMINI_API_KEY", None)
+
+import pytest
+from sqlalchemy import create_engine
+
+import models
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A fresh SQLite database with the full schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client():
+    """The app with its lifespan running; leaving the block drains the ingestion buffer."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
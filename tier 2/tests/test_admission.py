@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from services.admission import ADMITTED, FARMER_LIMIT, GLOBAL_LIMIT, AdmissionController, LocalBuckets, RateLimitedError
+
+
+def take(buckets, farmer_id):
+    return asyncio.run(buckets.take(farmer_id))[0]
+
+
+def test_farmer_bucket_limits_only_that_farmer():
+    buckets = LocalBuckets(farmer_rate=0.001, farmer_burst=2, global_rate=0, global_burst=0)
+    assert [take(buckets, 1) for _ in range(3)] == [ADMITTED, ADMITTED, FARMER_LIMIT]
+    assert take(buckets, 2) == ADMITTED
+
+
+def test_global_bucket_limits_everyone():
+    buckets = LocalBuckets(farmer_rate=0, farmer_burst=0, global_rate=0.001, global_burst=3)
+    assert [take(buckets, farmer_id) for farmer_id in range(4)] == [ADMITTED, ADMITTED, ADMITTED, GLOBAL_LIMIT]
+
+
+def test_rejected_take_charges_neither_bucket():
+    buckets = LocalBuckets(farmer_rate=0.001, farmer_burst=1, global_rate=0.001, global_burst=2)
+    assert take(buckets, 1) == ADMITTED
+    assert take(buckets, 1) == FARMER_LIMIT
+    assert take(buckets, 2) == ADMITTED  # farmer 1's refusal did not use a global token
+    assert take(buckets, 3) == GLOBAL_LIMIT
+
+
+def test_buckets_are_bounded():
+    buckets = LocalBuckets(farmer_rate=0.001, farmer_burst=5, global_rate=0, global_burst=0, max_buckets=2)
+    for farmer_id in range(10):
+        take(buckets, farmer_id)
+    assert len(buckets) == 2
+
+
+def test_idle_full_buckets_are_dropped():
+    buckets = LocalBuckets(farmer_rate=1000, farmer_burst=1, global_rate=0, global_burst=0)
+    take(buckets, 1)
+    asyncio.run(asyncio.sleep(0.01))  # refilled well past the burst
+    take(buckets, 2)
+    assert len(buckets) == 1
+
+
+def test_batch_borrows_from_the_global_bucket_and_sheds_readings_until_repaid():
+    buckets = LocalBuckets(farmer_rate=0, farmer_burst=0, global_rate=0.001, global_burst=2, batch_burst=10)
+    assert asyncio.run(buckets.take_batch(8)) == (ADMITTED, 0.0)
+    assert take(buckets, 1) == GLOBAL_LIMIT  # 6 tokens in debt
+    outcome, wait = asyncio.run(buckets.take_batch(5))
+    assert outcome == GLOBAL_LIMIT and wait > 0
+    assert asyncio.run(buckets.take_batch(2))[0] == ADMITTED  # up to the batch burst in all
+
+
+def test_batch_larger_than_the_burst_needs_a_full_bucket():
+    buckets = LocalBuckets(farmer_rate=0, farmer_burst=0, global_rate=0.001, global_burst=2, batch_burst=10)
+    assert asyncio.run(buckets.take_batch(50))[0] == ADMITTED
+    assert asyncio.run(buckets.take_batch(1))[0] == GLOBAL_LIMIT
+
+
+def test_over_rate_reading_is_shed_with_retry_after():
+    written = []
+
+    async def write(row):
+        written.append(row)
+
+    controller = AdmissionController(LocalBuckets(1, 1, 0, 0), write)
+    assert asyncio.run(controller.admit({"farmer_id": 1})) is True
+    with pytest.raises(RateLimitedError) as raised:
+        asyncio.run(controller.admit({"farmer_id": 1}))
+    assert raised.value.limit == FARMER_LIMIT and 0 < raised.value.retry_after <= 1
+    assert controller.stats()["shed_farmer_limit"] == 1
+
+
+def test_coalescing_keeps_only_the_newest_pending_reading():
+    written = []
+
+    async def write(row):
+        written.append(row)
+
+    controller = AdmissionController(LocalBuckets(0.001, 1, 0, 0), write, coalesce=True)
+
+    async def scenario():
+        assert await controller.admit({"farmer_id": 1, "n": 1}) is True
+        assert await controller.admit({"farmer_id": 1, "n": 2}) is False
+        assert await controller.admit({"farmer_id": 1, "n": 3}) is False
+        await controller.flush()  # no token yet: still pending
+        assert written == []
+        await controller.stop()   # shutdown writes what is pending, bypassing the limits
+
+    asyncio.run(scenario())
+    assert written == [{"farmer_id": 1, "n": 3}]
+    assert controller.coalesced_replaced == 1
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.alert_engine import AlertEngine, AlertRule
+
+START = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+def engine_with(*rules, **options):
+    return AlertEngine(None, None, list(rules), **options)
+
+
+def observe(engine, seconds, farmer_id=1, **values):
+    return [(event["action"], event["rule"].id) for event in engine.observe({"farmer_id": farmer_id, "ts": START + timedelta(seconds=seconds), **values})]
+
+
+def heatwave():
+    return AlertRule(id="heatwave", type="Heatwave", severity="HIGH", message="Hot", metric="temp", op=">", threshold=40, clear=38)
+
+
+def test_value_rule_fires_and_clears_with_hysteresis():
+    engine = engine_with(heatwave())
+    assert observe(engine, 0, temp=41) == [("fire", "heatwave")]
+    assert observe(engine, 10, temp=42) == []   # already active
+    assert observe(engine, 20, temp=39) == []   # below the threshold, not past `clear`
+    assert observe(engine, 30, temp=41) == []
+    assert observe(engine, 40, temp=37) == [("clear", "heatwave")]
+
+
+def test_average_must_hold_for_the_configured_time():
+    rule = AlertRule(id="sustained_heat", type="Heat Stress", severity="MEDIUM", message="Hot", metric="temp",
+                     op=">", threshold=35, clear=33, aggregate="avg", window=600, **{"for": 300})
+    engine = engine_with(rule)
+    fired_at = [seconds for seconds in range(0, 900, 60) if observe(engine, seconds, temp=36)]
+    assert fired_at == [300]
+
+
+def test_average_window_forgets_old_samples():
+    rule = AlertRule(id="avg", type="T", severity="LOW", message="m", metric="temp", op=">", threshold=35, clear=33,
+                     aggregate="avg", window=600)
+    engine = engine_with(rule)
+    assert observe(engine, 0, temp=100) == [("fire", "avg")]
+    # Once the first sample has left the window the average is the new reading alone
+    assert observe(engine, 600 + 60, temp=20) == [("clear", "avg")]
+    assert engine._states[1]["avg"].count == 1
+
+
+def test_rate_needs_half_a_window_of_history():
+    rule = AlertRule(id="drying", type="Drying", severity="LOW", message="m", metric="moisture", op="<", threshold=-10,
+                     clear=-5, aggregate="rate", window=3600)
+    engine = engine_with(rule)
+    assert observe(engine, 0, moisture=60) == []
+    assert observe(engine, 1200, moisture=40) == []            # 20 min of history: no rate yet
+    assert observe(engine, 1800, moisture=30) == [("fire", "drying")]  # -60 %/h
+
+
+def test_older_readings_are_ignored():
+    engine = engine_with(heatwave())
+    observe(engine, 100, temp=20)
+    assert observe(engine, 50, temp=45) == []
+    assert engine.stats()["active"] == 0
+
+
+def test_farmers_are_independent():
+    engine = engine_with(heatwave())
+    assert observe(engine, 0, farmer_id=1, temp=41) == [("fire", "heatwave")]
+    assert observe(engine, 0, farmer_id=2, temp=41) == [("fire", "heatwave")]
+
+
+def test_pending_writes_are_bounded():
+    engine = engine_with(heatwave(), max_pending=2)
+    for farmer_id in range(5):
+        observe(engine, 0, farmer_id=farmer_id, temp=41)
+    assert len(engine._pending) == 2 and engine.dropped_events == 3
+    assert [event["farmer_id"] for event in engine._pending] == [3, 4]
+
+
+def test_clear_level_past_the_threshold_is_rejected():
+    with pytest.raises(ValueError):
+        AlertRule(id="bad", type="T", severity="LOW", message="m", metric="temp", op=">", threshold=40, clear=42)
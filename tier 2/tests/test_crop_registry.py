@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pytest
+
+from services.crop_registry import CropRegistry, compile_registry, load_source
+
+IDEAL = {"nitrogen": [40, 80], "phosphorus": [20, 40], "potassium": [20, 40], "ph": [6, 7], "temp": [20, 30],
+         "humidity": [50, 80], "rainfall": [100, 200]}
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setenv("CROP_REGISTRY_COMPILED_DIR", str(tmp_path / "compiled"))
+    crops = [
+        {"name": "Tomato", "aliases": ["Tamatar"], "base_score": 80, "ideal": IDEAL, "season_months": [1, 2]},
+        {"name": "Rice", "aliases": ["Paddy", "Dhan"], "base_score": 70, "ideal": IDEAL, "season_months": [6, 7]},
+        {"name": "Wheat", "base_score": 75, "ideal": IDEAL, "season_months": [11, 12]},
+    ]
+    path = tmp_path / "crops.json"
+    path.write_text(json.dumps({"crops": crops}))
+    return CropRegistry(compile_registry(str(path)))
+
+
+def test_lookup_by_name_or_alias_ignores_case_and_spacing(registry):
+    assert registry.lookup("tomato") == 0
+    assert registry.lookup("  PADDY ") == 1
+    assert registry.lookup("dhan") == 1
+    assert registry.lookup("Wheat") == 2
+
+
+def test_unknown_and_overlong_names_are_not_found(registry):
+    assert registry.lookup("Banana") is None
+    assert registry.lookup("") is None
+    assert registry.lookup("z" * 200) is None
+
+
+def test_lookup_data_stays_memory_mapped(registry):
+    assert isinstance(registry.alias_keys, np.memmap)
+    assert list(registry.alias_keys) == sorted(registry.alias_keys)
+
+
+def test_names_are_plain_strings(registry):
+    assert len(registry) == 3
+    assert list(registry.names) == ["Tomato", "Rice", "Wheat"]
+    assert type(registry.names[1]) is str
+    assert registry.names[1:] == ["Rice", "Wheat"]
+
+
+def test_every_shipped_crop_is_found_by_its_name():
+    from services.crop_registry import DEFAULT_PATH, get_registry
+
+    registry = get_registry()
+    for index, crop in enumerate(load_source(DEFAULT_PATH)):
+        for key in [crop["name"], *crop.get("aliases", [])]:
+            assert registry.lookup(key) == index
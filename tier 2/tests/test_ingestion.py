@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import exc, func, select
+
+import models
+from services.ingestion import DuplicateReadingError, IngestionBuffer, dedup_key
+
+TABLE = models.SoilDataDB.__table__
+
+
+def reading(farmer_id=1, minute=0, seq=None, **values):
+    ts = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minute)
+    row = {"farmer_id": farmer_id, "moisture": 30.0 + minute, "temp": 20.0, "humidity": 50.0,
+           "timestamp": ts.isoformat(), "ts": ts}
+    row.update(values)
+    row["dedup_key"] = dedup_key(row, seq)
+    if seq is not None:
+        row["seq"] = seq
+    return row
+
+
+def stored_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(TABLE)).scalar()
+
+
+def test_write_batch_returns_only_new_rows(engine):
+    buffer = IngestionBuffer(engine, TABLE)
+    first = [reading(minute=0), reading(minute=1)]
+    assert asyncio.run(buffer.write_batch(first)) == first
+
+    replay = [dict(first[1]), reading(minute=2)]
+    inserted = asyncio.run(buffer.write_batch(replay))
+    assert inserted == [replay[1]]
+    assert buffer.stats()["duplicates_stored"] == 1
+    assert stored_rows(engine) == 3
+
+
+def test_rows_without_dedup_key_are_matched(engine):
+    # Rows queued before dedup keys existed come back from RETURNING with a NULL key
+    rows = [reading(minute=0), reading(minute=1)]
+    for row in rows:
+        del row["dedup_key"]
+    buffer = IngestionBuffer(engine, TABLE)
+    assert asyncio.run(buffer.write_batch(rows)) == rows
+
+
+def test_recent_key_turns_away_a_retry(engine):
+    buffer = IngestionBuffer(engine, TABLE)
+    row = reading()
+    buffer.submit(row)
+    with pytest.raises(DuplicateReadingError):
+        buffer.submit(dict(row))
+    assert buffer.stats()["duplicates_cached"] == 1
+
+
+def test_row_error_is_isolated_and_dead_lettered(engine):
+    buffer = IngestionBuffer(engine, TABLE, batch_size=8)
+    rows = [reading(minute=minute) for minute in range(5)]
+    rows[3]["moisture"] = None  # NOT NULL: IntegrityError for this row only
+    for row in rows:
+        buffer.submit(row)
+    asyncio.run(buffer.flush())
+
+    assert stored_rows(engine) == 4
+    assert buffer.dead_lettered == 1
+    assert buffer.dead_letters[0][0] is rows[3]
+
+
+def _failing_write(rows):
+    raise exc.OperationalError("INSERT INTO soil_data ...", {}, Exception("database is locked"))
+
+
+def test_transient_error_requeues_the_batch_in_order(engine):
+    buffer = IngestionBuffer(engine, TABLE, retry_backoff=60)
+    rows = [reading(minute=minute) for minute in range(3)]
+    for row in rows:
+        buffer.submit(row)
+    buffer._write = _failing_write
+    asyncio.run(buffer.flush())
+    assert list(buffer._queue) == rows
+    assert buffer.flush_errors == 1 and buffer.dead_lettered == 0
+
+    asyncio.run(buffer.flush())  # still backing off: nothing is tried
+    assert buffer.flush_errors == 1
+
+    del buffer._write  # the database is back
+    asyncio.run(buffer.flush(force=True))
+    assert stored_rows(engine) == 3 and not buffer._queue
+
+
+def test_transient_error_dead_letters_after_max_attempts(engine):
+    buffer = IngestionBuffer(engine, TABLE, max_attempts=3, retry_backoff=0)
+    buffer._write = _failing_write
+    for minute in range(2):
+        buffer.submit(reading(minute=minute))
+    asyncio.run(buffer.flush())
+
+    assert buffer.flush_errors == 3
+    assert buffer.dead_lettered == 2
+    assert not buffer._queue
+
+
+def test_seq_resend_with_a_new_receive_time_is_stored_once(engine):
+    # No recent-key cache: only the database lookup can catch it
+    buffer = IngestionBuffer(engine, TABLE, dedup_cache_size=0)
+    original = reading(seq=41, minute=0)
+    resend = reading(seq=41, minute=2)  # same seq, re-stamped on arrival
+    assert asyncio.run(buffer.write_batch([original])) == [original]
+    assert asyncio.run(buffer.write_batch([resend])) == []
+    assert stored_rows(engine) == 1
+
+
+def test_seq_repeated_within_one_batch_is_stored_once(engine):
+    buffer = IngestionBuffer(engine, TABLE, dedup_cache_size=0)
+    rows = [reading(seq=7, minute=0), reading(seq=8, minute=0), reading(seq=7, minute=1)]
+    assert asyncio.run(buffer.write_batch(rows)) == rows[:2]
+
+
+def test_seq_outside_the_window_is_a_new_reading(engine):
+    buffer = IngestionBuffer(engine, TABLE, dedup_cache_size=0, seq_window=60)
+    asyncio.run(buffer.write_batch([reading(seq=3, minute=0)]))
+    assert len(asyncio.run(buffer.write_batch([reading(seq=3, minute=5)]))) == 1
+    assert stored_rows(engine) == 2
+
+
+def test_seq_resend_hits_the_recent_key_cache(engine):
+    buffer = IngestionBuffer(engine, TABLE)
+    buffer.submit(reading(seq=9, minute=0))
+    with pytest.raises(DuplicateReadingError):
+        buffer.submit(reading(seq=9, minute=1))
@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.gemini_client import FakeGeminiModel
+from services.llm_gateway import CLOSED, OPEN, LLMGateway, LLMUnavailableError, TransientLLMError
+
+
+class FlakyModel:
+    """Fails the first `failures` calls with a transient error, then answers."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise TransientLLMError("503 overloaded")
+        return SimpleNamespace(text=" answer ", usage_metadata=None)
+
+
+def unavailable_reason(gateway, prompt="prompt"):
+    with pytest.raises(LLMUnavailableError) as raised:
+        asyncio.run(gateway.generate(prompt))
+    return raised.value.reason
+
+
+def test_answer_is_returned_stripped():
+    gateway = LLMGateway(FlakyModel(failures=0))
+    assert asyncio.run(gateway.generate("prompt")) == "answer"
+    assert gateway.stats()["succeeded"] == 1
+
+
+def test_transient_errors_are_retried():
+    model = FlakyModel(failures=2)
+    gateway = LLMGateway(model, retries=2, backoff=0)
+    assert asyncio.run(gateway.generate("prompt")) == "answer"
+    assert model.calls == 3 and gateway.retried == 2
+
+
+def test_slow_model_falls_back_with_reason_timeout():
+    gateway = LLMGateway(FakeGeminiModel(latency=1.0), timeout=0.1, retries=0)
+    assert unavailable_reason(gateway) == "timeout"
+    assert gateway.failed["timeout"] == 1
+
+
+def test_circuit_opens_after_threshold_then_probe_closes_it():
+    model = FakeGeminiModel(latency=0, failure_rate=1.0, seed=1)
+    gateway = LLMGateway(model, retries=0, failure_threshold=3, reset_timeout=0.05)
+    for _ in range(3):
+        assert unavailable_reason(gateway) == "error"
+    assert gateway.state == OPEN
+
+    # Open: fails at once, without reaching the model
+    assert unavailable_reason(gateway) == "circuit_open"
+    assert model.calls == 3
+
+    asyncio.run(asyncio.sleep(0.06))
+    model.failure_rate = 0.0
+    asyncio.run(gateway.generate("probe"))
+    assert gateway.state == CLOSED and gateway.circuit_opened == 1
+
+
+def test_failed_probe_reopens_the_circuit():
+    model = FakeGeminiModel(latency=0, failure_rate=1.0, seed=1)
+    gateway = LLMGateway(model, retries=0, failure_threshold=1, reset_timeout=0.05)
+    assert unavailable_reason(gateway) == "error"
+    asyncio.run(asyncio.sleep(0.06))
+    assert unavailable_reason(gateway) == "error"  # the probe
+    assert gateway.state == OPEN
+
+
+def test_caller_without_a_slot_is_overloaded():
+    gateway = LLMGateway(FakeGeminiModel(latency=0.5), max_concurrency=1, timeout=2.0, queue_timeout=0.05)
+
+    async def two_calls():
+        return await asyncio.gather(gateway.generate("first"), gateway.generate("second"), return_exceptions=True)
+
+    first, second = asyncio.run(two_calls())
+    assert isinstance(first, str)
+    assert isinstance(second, LLMUnavailableError) and second.reason == "overloaded"
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+import main
+
+RECEIVED = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+
+def test_plausible_device_time_is_kept():
+    assert main.reading_time("2026-10-18T11:59:50Z", RECEIVED) == RECEIVED - timedelta(seconds=10)
+    assert main.reading_time("2026-10-10T08:00:00", RECEIVED) == datetime(2026, 10, 10, 8, tzinfo=timezone.utc)  # offline backlog
+
+
+def test_implausible_device_time_falls_back_to_receive_time():
+    assert main.reading_time("2023-10-27T10:00:00Z", RECEIVED) == RECEIVED  # firmware placeholder
+    assert main.reading_time("1970-01-01T00:00:05Z", RECEIVED) == RECEIVED  # RTC lost its time
+    assert main.reading_time("2026-10-21T12:00:00Z", RECEIVED) == RECEIVED  # days ahead
+    assert main.reading_time("not a time", RECEIVED) == RECEIVED
+
+
+def test_row_keeps_the_raw_device_string():
+    data = main.SoilData(farmer_id=1, moisture=40, temp=20, humidity=50, timestamp="2023-10-27T10:00:00Z", seq=1)
+    row = main.reading_to_row(data)
+    assert row["timestamp"] == "2023-10-27T10:00:00Z"
+    assert datetime.now(timezone.utc) - row["ts"] < timedelta(seconds=5)
+
+
+def test_placeholder_readings_do_not_hide_the_newest_one():
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as client:
+        real = datetime.now(timezone.utc) - timedelta(minutes=5)
+        client.post("/api/soil-data", json={"farmer_id": 1101, "moisture": 10, "temp": 20, "humidity": 50,
+                                            "timestamp": real.isoformat()})
+        for seq, moisture in ((1, 11), (2, 12)):
+            client.post("/api/soil-data", json={"farmer_id": 1101, "moisture": moisture, "temp": 20, "humidity": 50,
+                                                "timestamp": "2023-10-27T10:00:00Z", "seq": seq})
+    with TestClient(main.app) as client:
+        rows = client.get("/api/soil-data", params={"farmer_id": 1101}).json()
+    assert [row["moisture"] for row in rows] == [10, 11, 12]
+    with main.database.SessionLocal() as db:
+        assert main.query_latest_reading(db, 1101).moisture == 12
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+import database
+import main
+import models
+import telemetry_storage
+
+TABLE = models.SoilDataDB.__table__
+PLACEHOLDER = "2023-10-27T10:00:00Z"  # what hardware/esp32_firmware.ino sends without NTP
+
+
+def firmware_reading(farmer_id, seq):
+    return {"farmer_id": farmer_id, "moisture": 40.0 + seq % 10, "temp": 25.0, "humidity": 55.0, "timestamp": PLACEHOLDER, "seq": seq}
+
+
+def test_placeholder_timestamp_readings_survive_maintenance():
+    with TestClient(main.app) as client:
+        for seq in (100, 101, 102):
+            assert client.post("/api/soil-data", json=firmware_reading(1201, seq)).status_code == 201
+
+    summary = telemetry_storage.run_maintenance(database.engine, **telemetry_storage.maintenance_settings())
+    assert summary["retention"]["deleted_rows"] == 0
+
+    with database.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(TABLE).where(TABLE.c.farmer_id == 1201)).scalar() == 3
+    with TestClient(main.app) as client:
+        history = client.get("/api/soil-data/history", params={"farmer_id": 1201, "resolution": "1h"}).json()
+    assert sum(bucket["samples"] for bucket in history["buckets"]) == 3
+
+
+def test_readings_older_than_raw_retention_are_stored_at_receive_time():
+    received = datetime.now(timezone.utc)
+    too_old = (received - timedelta(days=main.RAW_RETENTION_DAYS, hours=1)).isoformat()
+    assert main.reading_time(too_old, received) == received
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+import database
+import main
+import telemetry_storage
+
+
+@pytest.fixture
+def old_engine(tmp_path):
+    # soil_data as created before ts / dedup_key and their indexes existed
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE soil_data (id INTEGER PRIMARY KEY, farmer_id INTEGER, moisture FLOAT NOT NULL, temp FLOAT NOT NULL, "
+            "humidity FLOAT NOT NULL, ph FLOAT, nitrogen FLOAT, phosphorus FLOAT, potassium FLOAT, rainfall FLOAT, soil_temp FLOAT, "
+            "soil_ec FLOAT, air_pressure FLOAT, light_intensity FLOAT, water_level FLOAT, flow_rate FLOAT, battery_voltage FLOAT, "
+            "timestamp VARCHAR NOT NULL)"
+        ))
+    yield engine
+    engine.dispose()
+
+
+def test_current_schema_has_no_problems(engine):
+    assert telemetry_storage.schema_problems(engine) == []
+
+
+def test_old_schema_is_reported(old_engine):
+    assert telemetry_storage.schema_problems(old_engine) == ["column ts", "column dedup_key", f"index {telemetry_storage.DEDUP_INDEX}"]
+
+
+def test_setup_fixes_what_is_reported(old_engine):
+    telemetry_storage.sync_columns(old_engine)
+    telemetry_storage.ensure_dedup_index(old_engine)
+    assert telemetry_storage.schema_problems(old_engine) == []
+
+
+def test_app_refuses_to_start_on_an_old_schema(old_engine, monkeypatch):
+    monkeypatch.setattr(database, "engine", old_engine)
+    with pytest.raises(RuntimeError, match="manage_soil_data.py setup"):
+        with TestClient(main.app):
+            pass
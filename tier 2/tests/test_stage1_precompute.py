@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+import database
+import main
+import models
+
+FARMER_ID = 1301
+
+
+def test_precomputed_decision_is_served_for_a_reading_still_in_the_cache(monkeypatch):
+    reading = {"farmer_id": FARMER_ID, "moisture": 40.0, "temp": 25.0, "humidity": 60.0,
+               "timestamp": datetime.now(timezone.utc).isoformat()}
+    with TestClient(main.app) as client:
+        assert client.post("/api/soil-data", json=reading).status_code == 201
+        client.portal.call(main.ingestion_buffer.flush)
+        cached = client.portal.call(main.latest_cache.get, FARMER_ID)
+        assert "id" not in cached  # written through at queue time
+
+        # What dss_precompute.py stores for that reading (read back from the database)
+        with database.SessionLocal() as db:
+            stored = main.query_latest_reading(db, FARMER_ID)
+            db.merge(models.DssRecommendationDB(
+                farmer_id=FARMER_ID, region="Central", month=6, reading_id=stored.id, reading_ts=stored.ts,
+                decision={"recommended_crop": "Precomputed"}, prompt_inputs=None, computed_at=datetime.now(timezone.utc),
+            ))
+            db.commit()
+
+        async def must_not_recompute(*args):
+            raise AssertionError("decision recomputed although the precomputed one is current")
+
+        monkeypatch.setattr(main, "compute_stage1_decision", must_not_recompute)
+
+        async def decision():
+            with database.SessionLocal() as db:
+                latest = await main.get_latest_reading(db, FARMER_ID)
+                return await main.get_stage1_decision(db, latest, "Central", 6)
+
+        assert client.portal.call(decision)[0] == {"recommended_crop": "Precomputed"}
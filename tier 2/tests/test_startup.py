@@ -0,0 +1,18 @@
+"""Startup budget (benchmarks/startup.py) as a test: fresh interpreters, medians of a few runs."""
+import statistics
+
+from benchmarks.startup import time_first_request, time_import
+
+RUNS = 3
+MAX_IMPORT = 2.0          # s, median `import main`
+MAX_FIRST_REQUEST = 3.0   # s, median uvicorn spawn -> first 200
+
+
+def test_import_main_within_budget_without_db_or_gemini():
+    probes = [time_import() for _ in range(RUNS)]
+    assert not any(probe["genai_loaded"] for probe in probes), "google.generativeai was imported at module import time"
+    assert statistics.median(probe["seconds"] for probe in probes) <= MAX_IMPORT
+
+
+def test_first_request_within_budget():
+    assert statistics.median(time_first_request() for _ in range(RUNS)) <= MAX_FIRST_REQUEST
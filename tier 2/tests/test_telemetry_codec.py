@@ -0,0 +1,34 @@
+import msgpack
+import pytest
+
+from services.telemetry_codec import FrameError, decode_frame, encode_frame
+
+
+def test_round_trip_keeps_values_to_their_scale():
+    readings = [
+        {"farmer_id": 42, "timestamp": "2024-06-01T00:00:00Z", "moisture": 45.12, "temp": -3.5, "humidity": 60.12,
+         "ph": 6.5, "battery_voltage": 3.712, "seq": 7},
+        {"farmer_id": 42, "timestamp": "2024-06-01T00:00:10Z", "moisture": 45.0, "temp": 24.37, "humidity": 60.0, "seq": 8},
+    ]
+    assert decode_frame(encode_frame(readings)) == readings
+
+
+def test_single_reading_frame_is_a_map():
+    frame = encode_frame([{"farmer_id": 1, "timestamp": "2024-06-01T00:00:00Z", "moisture": 1.0, "temp": 2.0, "humidity": 3.0}])
+    assert isinstance(msgpack.unpackb(frame, strict_map_key=False), dict)
+
+
+def test_unknown_field_ids_are_ignored():
+    frame = msgpack.packb({1: 1, 2: 1717200000, 3: 100, 4: 200, 5: 300, 99: 12345})
+    assert decode_frame(frame) == [{"farmer_id": 1, "timestamp": "2024-06-01T00:00:00Z", "moisture": 1.0, "temp": 2.0, "humidity": 3.0}]
+
+
+@pytest.mark.parametrize("frame", [
+    b"\xc1",                                  # not MessagePack
+    msgpack.packb([1, 2, 3]),                 # not maps
+    msgpack.packb({1: 1, 3: 45.5}),           # values must be scaled integers
+    msgpack.packb({1: 1, 2: 10 ** 15}),       # timestamp out of range
+])
+def test_malformed_frames_are_rejected(frame):
+    with pytest.raises(FrameError):
+        decode_frame(frame)
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+import models
+import telemetry_reads
+
+
+def test_naive_ts_is_written_as_utc():
+    naive = datetime(2026, 10, 17, 14, 32, 32, 942177)
+    rows = telemetry_reads.encode_rows([(naive, 1.0)], ("ts", "moisture"))
+    columnar = telemetry_reads.encode_columnar([(naive, 1.0)], ("ts", "moisture"))
+    assert orjson.loads(rows) == [{"ts": "2026-10-17T14:32:32.942177+00:00", "moisture": 1.0}]
+    assert orjson.loads(columnar)["columns"]["ts"] == ["2026-10-17T14:32:32.942177+00:00"]
+    assert models.format_utc(naive.replace(tzinfo=timezone(timedelta(hours=2)))) == "2026-10-17T12:32:32.942177+00:00"
+
+
+def test_api_and_export_agree_on_ts(client):
+    timestamp = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(minutes=5)
+    reading = {"farmer_id": 1401, "moisture": 33.0, "temp": 21.0, "humidity": 55.0, "timestamp": timestamp.isoformat()}
+    assert client.post("/api/soil-data/batch", json=[reading]).status_code == 200
+
+    rows = client.get("/api/soil-data", params={"farmer_id": 1401, "fields": "ts"}).json()
+    columnar = client.get("/api/soil-data", params={"farmer_id": 1401, "fields": "ts", "format": "columnar"}).json()
+    export = client.get("/api/soil-data/export", params={"farmer_ids": "1401", "fields": "ts"}).text.split()
+    assert rows == [{"ts": timestamp.isoformat()}]
+    assert columnar["columns"]["ts"] == [timestamp.isoformat()]
+    assert export == ["ts", timestamp.isoformat()]